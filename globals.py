@@ -44,7 +44,14 @@
 # Tkinter packages.
 
 # Local packages.
+from src import StartupProfiler as profiler
+from src import AppLog
+from src import Metrics
+from src import Tracer
 from src.ConfigFile import ConfigFile
+from src.RigState import RigState
+from src.RigctldClient import RIG_NET, close_pools
+from src.PortBridge import close_bridges
 from PyRigCat.PyRigCat import PyRigCat, RigName
 
 
@@ -62,25 +69,44 @@ NUM_CAT_PRESETS = 4       # Number of CAT interface presets
 root = None           # The root window
 config = None         # The config file object
 rig_cat = PyRigCat()  # The rig CAT control object
+port_inventory = None # The serial port inventory object
+rig_state = RigState() # The transceiver shadow state
+cat_process = None    # The optional child process CAT server
+control_server = None # The local control socket server
+rigctld_server = None # The optional rigctld compatible server
+pty_splitter = None   # The optional virtual serial port splitter
+state_broadcaster = None # The optional rig state multicast sender
+shared_state = None   # The optional shared memory rig state writer
+cat_recorder = None   # The optional CAT traffic recorder
 
 # The list of supported transceivers.
-RIG_LIST = RigName.RIG_LIST[1:]  # Assumes index 0 == NONE
+RIG_LIST = RigName.RIG_LIST[1:] + [RIG_NET]  # Assumes index 0 == NONE
 
 ##############################################################################
 # Functions.
 ##############################################################################
 
 # ------------------------------------------------------------------------
-def init():
+def init(ini_file=''):
     """
     Initialize global settings.
+    
+    Parameters
+    ----------
+    ini_file : str
+        Optional config file name.  Defaults to the .INI file named after
+        the application script.
     """
     global root
     global config
 
     # Read the configuration file.
-    config = ConfigFile()
-    config.read()
+    config = ConfigFile(ini_file)
+    with profiler.phase('ConfigFile.read'):
+        config.read()
+    
+    # Start logging.
+    AppLog.configure(config)
 
 # ------------------------------------------------------------------------
 def close():
@@ -90,5 +116,50 @@ def close():
     global root
     global config
     
+    # Stop the serial port inventory.
+    if port_inventory is not None:
+        port_inventory.stop()
+    
+    # Write the event trace.
+    Tracer.finish()
+    
+    # Stop the metrics server.
+    Metrics.stop()
+    
+    # Remove the shared memory rig state.
+    if shared_state is not None:
+        shared_state.stop()
+    
+    # Stop the rig state broadcast.
+    if state_broadcaster is not None:
+        state_broadcaster.stop()
+    
+    # Remove the virtual serial ports.
+    if pty_splitter is not None:
+        pty_splitter.stop()
+    
+    # Stop the rigctld compatible server.
+    if rigctld_server is not None:
+        rigctld_server.stop()
+    
+    # Stop the local control socket server.
+    if control_server is not None:
+        control_server.stop()
+    
+    # Stop the child process CAT server.
+    if cat_process is not None:
+        cat_process.stop()
+    
+    # Stop recording CAT traffic.
+    if cat_recorder is not None:
+        cat_recorder.stop()
+    
+    # Close any rigctld and serial over TCP connections.
+    close_pools()
+    close_bridges()
+    
     # Write the configuration file.
     config.write()
+    
+    # Write any queued log records.
+    AppLog.stop()
@@ -40,45 +40,83 @@
 ###############################################################################
 
 # System level packages.
+import sys
+
+# Optional startup profiler.
+# Started before anything else is imported so the whole startup is measured.
+from src import StartupProfiler as profiler
+profiler.init(sys.argv)
+
+# Optional event tracer.
+from src import Tracer
+Tracer.init(sys.argv)
 
 # Tkinter packages.
-import tkinter as tk
+with profiler.phase('import tkinter'):
+    import tkinter as tk
 
 # Local environment init.
-import _env_init
+with profiler.phase('_env_init'):
+    import _env_init
 
 # Local packages.
-import globals
-from src.pyRigPresetUtils import app_close, set_geometry
-from src.AppMenu import AppMenu
-from src.ConfigFile import ConfigFile
-from src.WidgetCatPreset import WidgetCatPreset
-from src.WidgetCommandEntry import WidgetCommandEntry
-from src.WidgetConfigPreset import WidgetConfigPreset
-from src.WidgetMemoryPreset import WidgetMemoryPreset
-from src.WidgetFrequencyEntry import WidgetFrequencyEntry
-from src.WidgetTxRx import WidgetTxRx
-
-from PyRigCat import *
-from PyRigCat.PyRigCat_ft817 import PyRigCat_ft817
-from PyRigCat.PyRigCat_ft991 import PyRigCat_ft991
-from PyRigCat.PyRigCat_ic7000 import PyRigCat_ic7000
+with profiler.phase('imports'):
+    import globals
+    from src.pyRigPresetUtils import app_close, set_geometry, to_float, to_int
+    from src.AppMenu import AppMenu
+    from src.DlgConfigCat import get_dlg_config_cat
+    from src.DlgConfigPreset import get_dlg_config_preset
+    from src.DlgMemoryPreset import get_dlg_memory_preset
+    from src.SerialPortInventory import SerialPortInventory
+    from src.CatProcess import CatProcess
+    from src.ControlServer import ControlServer
+    from src.RigctldServer import RigctldServer, RIGCTLD_PORT
+    from src.PtySplitter import PtySplitter
+    from src import StateBroadcast
+    from src.SharedState import SharedStateWriter
+    from src import Metrics
+    from src.CatRecorder import CatRecorder
+    from src.ConfigFile import ConfigFile
+    from src.WidgetCatPreset import WidgetCatPreset
+    from src.WidgetCommandEntry import WidgetCommandEntry
+    from src.WidgetConfigPreset import WidgetConfigPreset
+    from src.WidgetMemoryPreset import WidgetMemoryPreset
+    from src.WidgetFrequencyEntry import WidgetFrequencyEntry
+    from src.WidgetTxRx import WidgetTxRx
+
+    from PyRigCat import *
+    from PyRigCat.PyRigCat_ft817 import PyRigCat_ft817
+    from PyRigCat.PyRigCat_ft991 import PyRigCat_ft991
+    from PyRigCat.PyRigCat_ic7000 import PyRigCat_ic7000
 
 
 ##############################################################################
 # Globals.
 ############################################################################## 
 window_width = 0
+MEMORY_PRESET_CHUNK = 8  # Number of memory preset widgets created at a time
 
 ##############################################################################
 # Functions.
 ############################################################################## 
 
+# ------------------------------------------------------------------------
 def create_memory_preset_frame():
     """
     Create a scrollable frame of memory preset widgets.
     This is a rather complicated procedure in Tkinter and requires several 
     frames and a canvas.
+    Only the first chunk of memory preset widgets is created here.  The rest
+    are created during idle time by fill_memory_presets() so the window can
+    be shown and used without waiting for all of them.
+    
+    Returns
+    -------
+    (mem_frame_outer, mem_frame_inner) : tuple
+        mem_frame_outer : tk.Frame
+            The outer frame to place in the main window.
+        mem_frame_inner : tk.Frame
+            The inner frame holding the memory preset widgets.
     """
     # See the following references: 
     # https://stackoverflow.com/questions/16188420/tkinter-scrollbar-for-frame
@@ -114,13 +152,16 @@ def create_memory_preset_frame():
     # This holds the widgets inside the scrollable canvas.
     mem_frame_inner = tk.Frame(mem_canvas)
     
-    # Create a set of memory preset widgets.
-    for idx in range(globals.NUM_MEMORY_PRESETS):
-        wcp = WidgetMemoryPreset(mem_frame_inner, idx+1)
-        wcp.frame.grid(row=idx, column=0, padx=6, pady=1)
+    # Create the first chunk of memory preset widgets.
+    add_memory_presets(mem_frame_inner, 0)
         
     # Attach the inner frame to the canvas.
     interior_id = mem_canvas.create_window(0, 0, window=mem_frame_inner, anchor=tk.NW)
+    
+    # Size the canvas to fit the memory preset widgets.
+    # All memory preset widgets are the same width, so the first chunk is enough.
+    mem_frame_inner.update_idletasks()
+    mem_canvas.config(width=mem_frame_inner.winfo_reqwidth())
 
     def _configure_interior(event):
         # Update the scrollbars to match the size of the inner frame.
@@ -137,7 +178,83 @@ def create_memory_preset_frame():
             mem_canvas.itemconfigure(interior_id, width=mem_canvas.winfo_width())
     mem_canvas.bind('<Configure>', _configure_canvas)
     
-    return mem_frame_outer
+    return (mem_frame_outer, mem_frame_inner)
+
+# ------------------------------------------------------------------------
+def add_memory_presets(frame, start):
+    """
+    Create a chunk of memory preset widgets.
+    
+    Parameters
+    ----------
+    frame : tk.Frame
+        The inner frame holding the memory preset widgets.
+    start : int
+        Index of the first memory preset widget to create.
+        
+    Returns
+    -------
+    stop : int
+        Index of the next memory preset widget to create.
+    """
+    stop = min(start + MEMORY_PRESET_CHUNK, globals.NUM_MEMORY_PRESETS)
+    for idx in range(start, stop):
+        with profiler.phase('WidgetMemoryPreset({})'.format(idx+1)):
+            wmp = WidgetMemoryPreset(frame, idx+1)
+        wmp.frame.grid(row=idx, column=0, padx=6, pady=1)
+    return stop
+
+# ------------------------------------------------------------------------
+def fill_memory_presets(frame, start):
+    """
+    Create the remaining memory preset widgets, one chunk per idle callback.
+    Lets the event loop run between chunks so the window stays responsive.
+    
+    Parameters
+    ----------
+    frame : tk.Frame
+        The inner frame holding the memory preset widgets.
+    start : int
+        Index of the first memory preset widget to create.
+        
+    Returns
+    -------
+    None.
+    """
+    if (start < globals.NUM_MEMORY_PRESETS):
+        start = add_memory_presets(frame, start)
+        frame.after_idle(fill_memory_presets, frame, start)
+    else:
+        # Startup is complete.
+        profiler.mark('memory presets complete')
+        profiler.finish()
+        
+        # Build the edit dialog boxes ahead of time so they open immediately.
+        frame.after_idle(prebuild_dialogs)
+
+# ------------------------------------------------------------------------
+def start_metrics_gauges():
+    """
+    Add the queue depth gauges to the metrics.
+    """
+    Metrics.add_gauge('pyrigpreset_cat_process_pending',
+        'Requests waiting for the CAT child process.',
+        lambda: globals.cat_process.pending() if globals.cat_process else 0)
+    Metrics.add_gauge('pyrigpreset_rigctld_queue_depth',
+        'rigctld commands waiting to run.',
+        lambda: globals.rigctld_server.commands.pending() if globals.rigctld_server else 0)
+    Metrics.add_gauge('pyrigpreset_splitter_queue_depth',
+        'Virtual serial port commands waiting for the real port.',
+        lambda: globals.pty_splitter.pending() if globals.pty_splitter else 0)
+
+# ------------------------------------------------------------------------
+def prebuild_dialogs():
+    """
+    Build the shared, hidden edit dialog boxes during idle time.
+    """
+    get_dlg_config_preset(globals.root)
+    get_dlg_memory_preset(globals.root)
+    get_dlg_config_cat(globals.root)
 
 
 ##############################################################################
@@ -152,16 +269,82 @@ if __name__ == "__main__":
     print('Starting ' + globals.APP_NAME)
     
     # Initialize the application configuration.
-    globals.init()
+    with profiler.phase('globals.init'):
+        globals.init()
+    
+    # Enumerate serial ports in the background and track hotplug events.
+    globals.port_inventory = SerialPortInventory()
+    globals.port_inventory.start()
+    
+    # Optionally run the CAT interface in a child process.
+    if (str(globals.config.get('CAT', 'PROCESS')).upper() == 'ON'):
+        globals.cat_process = CatProcess()
+        globals.cat_process.start()
+    
+    # Accept commands from the command line interface.
+    if (str(globals.config.get('CONTROL', 'SERVER')).upper() != 'OFF'):
+        globals.control_server = ControlServer()
+        globals.control_server.start()
+    
+    # Optionally share the transceiver with Hamlib rigctld clients.
+    if (str(globals.config.get('RIGCTLD', 'SERVER')).upper() == 'ON'):
+        port = to_int(globals.config.get('RIGCTLD', 'PORT')) or RIGCTLD_PORT
+        globals.rigctld_server = RigctldServer(port=port)
+        globals.rigctld_server.start()
+    
+    # Optionally share the transceiver with programs that need a serial port.
+    # The splitter uses the CAT lock in this process, so it cannot be used
+    # with the child process CAT server.
+    num_ports = to_int(globals.config.get('SPLITTER', 'PORTS'))
+    if (num_ports > 0):
+        if globals.cat_process is not None:
+            print('Virtual serial ports are not available with CAT PROCESS = ON.')
+        else:
+            globals.pty_splitter = PtySplitter(num_ports, str(globals.config.get('SPLITTER', 'LINK')))
+            globals.pty_splitter.start()
+    
+    # Optionally multicast rig state changes.
+    if (str(globals.config.get('BROADCAST', 'ENABLE')).upper() == 'ON'):
+        section = 'BROADCAST'
+        group = str(globals.config.get(section, 'GROUP')) or StateBroadcast.DEFAULT_GROUP
+        port = to_int(globals.config.get(section, 'PORT')) or StateBroadcast.DEFAULT_PORT
+        ttl = to_int(globals.config.get(section, 'TTL'))
+        interval = to_float(globals.config.get(section, 'INTERVAL')) or StateBroadcast.DEFAULT_INTERVAL
+        binary = (str(globals.config.get(section, 'FORMAT')).upper() == 'BINARY')
+        globals.state_broadcaster = StateBroadcast.StateBroadcaster(group, port, ttl, interval, binary)
+        globals.state_broadcaster.start()
+    
+    # Optionally publish the rig state in shared memory.
+    if (str(globals.config.get('SHARED_STATE', 'ENABLE')).upper() == 'ON'):
+        globals.shared_state = SharedStateWriter(str(globals.config.get('SHARED_STATE', 'NAME')))
+        globals.shared_state.start()
+    
+    # Optionally record the CAT traffic.  The recorder taps the port bridge in
+    # this process, so it cannot be used with the child process CAT server.
+    record_file = str(globals.config.get('RECORD', 'FILE'))
+    if (len(record_file) > 0):
+        if globals.cat_process is not None:
+            print('CAT recording is not available with CAT PROCESS = ON.')
+        else:
+            globals.cat_recorder = CatRecorder(record_file, str(globals.config.get('CAT', 'RIG')))
+            globals.cat_recorder.start()
+    
+    # Optionally serve performance metrics.
+    if (str(globals.config.get('METRICS', 'ENABLE')).upper() == 'ON'):
+        port = to_int(globals.config.get('METRICS', 'PORT')) or Metrics.METRICS_PORT
+        if Metrics.start(port):
+            start_metrics_gauges()
     
     # Create and initialize the root window.
-    globals.root = tk.Tk()
+    with profiler.phase('tk.Tk'):
+        globals.root = tk.Tk()
     globals.root.minsize(app_width, app_height)
     globals.root.title(globals.APP_NAME + ' - Python Rig Configuration Presets')
     globals.root.protocol("WM_DELETE_WINDOW", lambda: app_close())
     
     # Create the main menu.
-    globals.app_menu = AppMenu(globals.root)
+    with profiler.phase('AppMenu'):
+        globals.app_menu = AppMenu(globals.root)
     
     # Frame for configuration preset widgets.
     cfg_frame = tk.Frame(globals.root,
@@ -173,42 +356,53 @@ if __name__ == "__main__":
         
     # Configuration preset widgets.
     for idx in range(globals.NUM_CONFIG_PRESETS):
-        cfg_btn = WidgetConfigPreset(cfg_frame, idx+1)
+        with profiler.phase('WidgetConfigPreset({})'.format(idx+1)):
+            cfg_btn = WidgetConfigPreset(cfg_frame, idx+1)
         cfg_btn.frame.grid(row=0, column=idx, padx=6, pady=6)
     cfg_frame.grid(row=row, column=0, columnspan=3, padx=9, pady=6)
     row += 1
     
     # Match the memory preset widget canvas width to the configuration preset width.
-    cfg_frame.update()
-    window_width = cfg_frame.winfo_width()
+    cfg_frame.update_idletasks()
+    window_width = cfg_frame.winfo_reqwidth()
     
     # Create a scrollable frame of memory preset widgets.
     # This is a rather complicated procedure in Tkinter and requires several 
     # frames and a canvas.
-    mem_frame = create_memory_preset_frame()
+    with profiler.phase('create_memory_preset_frame'):
+        (mem_frame, mem_frame_inner) = create_memory_preset_frame()
     mem_frame.grid(row=row, column=0, columnspan=3, padx=9, pady=6)
     row += 1
     
     # Frequency entry widget.
-    wfe = WidgetFrequencyEntry(globals.root)
+    with profiler.phase('WidgetFrequencyEntry'):
+        wfe = WidgetFrequencyEntry(globals.root)
     wfe.frame.grid(row=row, column=0, sticky='W', padx=9, pady=(6, 6))
     
     # Command entry widget.
-    wce = WidgetCommandEntry(globals.root)
+    with profiler.phase('WidgetCommandEntry'):
+        wce = WidgetCommandEntry(globals.root)
     wce.frame.grid(row=row, column=1, sticky='EW', padx=9, pady=(6, 6))
     
     # TX/RX buttons.
-    ptt = WidgetTxRx(globals.root)
+    with profiler.phase('WidgetTxRx'):
+        ptt = WidgetTxRx(globals.root)
     ptt.frame.grid(row=row, column=2, sticky='E', padx=9, pady=(6, 6))
     row += 1
     
     # CAT interface selector.
-    wcp = WidgetCatPreset(globals.root)
+    with profiler.phase('WidgetCatPreset'):
+        wcp = WidgetCatPreset(globals.root)
     wcp.frame.grid(row=row, column=0, columnspan=3, sticky='W', padx=9, pady=(3, 12))
     row += 1
 
     # Set the proper window size and center it on the screen.
-    set_geometry(globals.root)
+    with profiler.phase('set_geometry'):
+        set_geometry(globals.root)
+    globals.root.after_idle(profiler.mark, 'first idle')
+    
+    # Create the rest of the memory preset widgets once the window is up.
+    globals.root.after_idle(fill_memory_presets, mem_frame_inner, MEMORY_PRESET_CHUNK)
 
     # Loop forever.
     globals.root.mainloop()
@@ -0,0 +1,122 @@
+###############################################################################
+# pyRigPresetCli.py
+# Author: Tom Kerr AB3GY
+#
+# Command line interface for the pyRigPreset application.
+# Applies presets without loading the GUI.  If pyRigPreset is already
+# running, the command is forwarded to it over the local control socket.
+# Otherwise the command is run here, using the pyRigPreset config file.
+#
+# Usage:
+#   python pyRigPresetCli.py [--local] <command> [args]
+#
+#   apply memory <n>     Apply memory preset n
+#   apply config <n>     Apply configuration preset n
+#   freq <MHz>           Set the VFO-A frequency
+#   ptt on|off           Turn PTT on or off
+#   cmd <command>        Send a transceiver command
+#   state                Show the transceiver state
+#
+#   --local              Do not forward to a running instance
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import json
+import os
+import sys
+
+# Local packages.
+from src.ControlClient import send_request
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# The config file shared with the GUI application.
+INI_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'pyRigPreset.ini')
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def print_result(ok, result):
+    """
+    Print a command result.
+    """
+    if isinstance(result, dict):
+        print(json.dumps(result, indent=2))
+    else:
+        print(result)
+
+# ------------------------------------------------------------------------
+def main(argv):
+    """
+    Run a command line interface command.
+    Returns the process exit status.
+    """
+    args = list(argv[1:])
+    local = False
+    if '--local' in args:
+        args.remove('--local')
+        local = True
+
+    # Forward to a running instance if there is one.
+    if not local and (len(args) > 0):
+        reply = send_request(args)
+        if reply is not None:
+            print_result(*reply)
+            return 0 if reply[0] else 1
+
+    # Run the command here.  Imported only when needed so that forwarding
+    # stays fast.
+    import _env_init
+    import globals
+    from src.ControlServer import run_command
+    globals.init(INI_FILE)
+    (ok, result) = run_command(args)
+    print_result(ok, result)
+    return 0 if ok else 1
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,283 @@
+###############################################################################
+# AppLog.py
+# Author: Tom Kerr AB3GY
+#
+# Logging for the pyRigPreset application.
+# Log records are put on a queue and written by a background thread, so a
+# slow console or disk never holds up a CAT command.  Records go to the
+# console and, optionally, to a rotating log file with one JSON object per
+# line.
+#
+# The last CAT frames (command, response and time) are kept in memory, and
+# are written to the log with the error message when something goes wrong.
+#
+# The level can be changed while running with set_level().  Messages below
+# the level are dropped before they are formatted.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+from collections import deque
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+
+##############################################################################
+# Globals.
+##############################################################################
+LOGGER_NAME = 'pyRigPreset'
+DEFAULT_LEVEL = 'INFO'
+DEFAULT_FRAMES = 200          # CAT frames kept in memory
+DEFAULT_MAX_BYTES = 1000000   # Log file size before it is rotated
+DEFAULT_BACKUPS = 3           # Number of rotated log files kept
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+log = logging.getLogger(LOGGER_NAME)          # Application messages
+cat_log = logging.getLogger(LOGGER_NAME + '.cat')  # CAT commands and responses
+
+_listener = None     # The QueueListener writing the log records
+_frames = deque(maxlen=DEFAULT_FRAMES)  # (time, thread, rig, command, response)
+_frames_lock = threading.Lock()
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def init(level=DEFAULT_LEVEL, log_file='', frames=DEFAULT_FRAMES,
+         max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+    """
+    Start the logging thread.
+
+    Parameters
+    ----------
+    level : str
+        The log level name, such as 'INFO' or 'DEBUG'.
+    log_file : str
+        Optional log file name.  The file is rotated when it reaches
+        max_bytes, and backups old files are kept.
+    frames : int
+        Number of CAT frames kept in memory.
+
+    Returns
+    -------
+    None.
+    """
+    global _listener
+    global _frames
+    stop()
+
+    handlers = []
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter('%(message)s'))
+    handlers.append(console)
+    if (len(log_file) > 0):
+        try:
+            file_handler = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+        except OSError as err:
+            print('Log file error: ' + str(err))
+
+    log_queue = queue.SimpleQueue()
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    log.propagate = False
+    set_level(level)
+
+    with _frames_lock:
+        _frames = deque(_frames, maxlen=max(1, frames))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop)
+
+# ------------------------------------------------------------------------
+def configure(config, console_only=False):
+    """
+    Start the logging thread using the [LOG] section of a config file:
+    LEVEL, FILE, FRAMES, MAX_BYTES and BACKUPS.
+
+    Parameters
+    ----------
+    config : ConfigFile object
+        The application config file.
+    console_only : bool
+        True to ignore FILE, for processes that share the log file owner's
+        console.
+    """
+    section = 'LOG'
+    level = str(config.get(section, 'LEVEL')).upper()
+    if level not in LEVELS:
+        level = DEFAULT_LEVEL
+    log_file = '' if console_only else str(config.get(section, 'FILE'))
+    init(level,
+        log_file,
+        _to_int(config.get(section, 'FRAMES'), DEFAULT_FRAMES),
+        _to_int(config.get(section, 'MAX_BYTES'), DEFAULT_MAX_BYTES),
+        _to_int(config.get(section, 'BACKUPS'), DEFAULT_BACKUPS))
+
+# ------------------------------------------------------------------------
+def _to_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+# ------------------------------------------------------------------------
+def stop():
+    """
+    Write any queued records and stop the logging thread.
+    """
+    global _listener
+    atexit.unregister(stop)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+# ------------------------------------------------------------------------
+def set_level(level, name=LOGGER_NAME):
+    """
+    Set the level of the application logger, or of a child logger such as
+    'pyRigPreset.cat'.  Returns the level name, or raises ValueError if the
+    level is not known.
+    """
+    level = str(level).upper()
+    if level not in LEVELS:
+        raise ValueError('Unknown log level: ' + level)
+    if not str(name).startswith(LOGGER_NAME):
+        raise ValueError('Unknown logger: ' + str(name))
+    logging.getLogger(name).setLevel(level)
+    return level
+
+# ------------------------------------------------------------------------
+def get_level(name=LOGGER_NAME):
+    """
+    Return the effective level name of a logger.
+    """
+    return logging.getLevelName(logging.getLogger(name).getEffectiveLevel())
+
+# ------------------------------------------------------------------------
+def record_frame(rig, cmd, resp):
+    """
+    Record a CAT command and its response.
+    The frame is always kept in memory, and logged at INFO level.
+    """
+    with _frames_lock:
+        _frames.append((time.time(), threading.current_thread().name, rig, cmd, resp))
+    if cat_log.isEnabledFor(logging.INFO):
+        cat_log.info('Command: "%s" Response: "%s"', cmd, resp,
+            extra={'rig': rig, 'cmd': cmd, 'resp': resp})
+
+# ------------------------------------------------------------------------
+def frames():
+    """
+    Return a list of the CAT frames kept in memory, oldest first.
+    Each frame is a (time, thread, rig, command, response) tuple.
+    """
+    with _frames_lock:
+        return list(_frames)
+
+# ------------------------------------------------------------------------
+def error(msg, *args):
+    """
+    Log an error followed by the CAT frames that led up to it.
+    The frames are cleared, so the next error shows only new frames.
+    """
+    with _frames_lock:
+        recent = list(_frames)
+        _frames.clear()
+    lines = []
+    for (t, thread, rig, cmd, resp) in recent:
+        stamp = time.strftime('%H:%M:%S', time.localtime(t)) + '.{:03d}'.format(int(t * 1000) % 1000)
+        lines.append('  {} {} {} "{}" -> "{}"'.format(stamp, thread, rig, cmd, resp))
+    if (len(lines) > 0):
+        msg = str(msg) + '\nLast {} CAT frames:\n'.format(len(lines)) + '\n'.join(lines)
+    log.error(msg, *args, extra={'frames': [list(f) for f in recent]})
+
+
+##############################################################################
+# JsonFormatter class.
+##############################################################################
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a log record as a single line JSON object.
+    """
+    # Record attributes copied to the JSON object when present.
+    EXTRA = ('rig', 'cmd', 'resp', 'frames')
+
+    # ------------------------------------------------------------------------
+    def format(self, record):
+        obj = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage(),
+        }
+        for key in self.EXTRA:
+            if hasattr(record, key):
+                obj[key] = getattr(record, key)
+        if record.exc_info:
+            obj['exc'] = self.formatException(record.exc_info)
+        return json.dumps(obj, default=str)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('AppLog test program.')
+    init('DEBUG')
+    log.info('Logging started')
+    record_frame('FT991', 'FREQA 14074000', 'OK')
+    record_frame('FT991', 'MODE XYZ', 'ERROR: invalid mode')
+    error('Error setting VFO and split parameters')
+    set_level('WARNING')
+    log.info('Not shown')
+    stop()
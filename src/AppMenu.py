@@ -51,7 +51,7 @@ from tkinter.messagebox import showinfo, showwarning, askyesnocancel
 # Local packages.
 import globals
 from src.pyRigPresetUtils import app_close, set_geometry
-from src.DlgConfigCat import DlgConfigCat
+from src.DlgConfigCat import get_dlg_config_cat
 
 
 ##############################################################################
@@ -140,8 +140,7 @@ class AppMenu(object):
         """
         CAT dialog box for managing the Computer Aided Transceiver (CAT) interface.
         """
-        dlg = DlgConfigCat(self.root, pnum)
-        pass
+        get_dlg_config_cat(self.root).show(pnum)
 
     
 
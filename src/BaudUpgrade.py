@@ -0,0 +1,209 @@
+###############################################################################
+# BaudUpgrade.py
+# Author: Tom Kerr AB3GY
+#
+# CAT baud rate negotiation for the pyRigPreset application.
+# Switches the rig and serial port to the fastest CAT baud rate supported by
+# the rig that passes a verification round trip, falling back to the
+# original baud rate on failure.
+#
+# Must be called while the serial port is not open by the rig CAT object.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import time
+
+import serial
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src import AppLog
+from src.RigAutoDetect import probe, RESPONSE_TIMEOUT, RESPONSE_BYTES
+from src.RigProtocol import get_protocol
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Number of identify round trips needed to pass verification.
+VERIFY_COUNT = 3
+
+# Seconds to wait for the rig to switch baud rates after a change command.
+SETTLE_TIME = 0.1
+
+# Config file parameters to pyserial parameters.
+BYTESIZE = {'5': serial.FIVEBITS, '6': serial.SIXBITS, '7': serial.SEVENBITS, '8': serial.EIGHTBITS}
+PARITY = {'NONE': serial.PARITY_NONE, 'EVEN': serial.PARITY_EVEN, 'ODD': serial.PARITY_ODD}
+STOPBITS = {'1': serial.STOPBITS_ONE, '1.5': serial.STOPBITS_ONE_POINT_FIVE, '2': serial.STOPBITS_TWO}
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def verify_link(ser, protocol, count=VERIFY_COUNT):
+    """
+    Return True if the rig answers count identify commands in a row at the
+    serial port's current baud rate.
+    """
+    timeout = RESPONSE_TIMEOUT + (RESPONSE_BYTES * 10.0 / ser.baudrate)
+    for i in range(count):
+        if not probe(ser, protocol, timeout):
+            return False
+    return True
+
+# ------------------------------------------------------------------------
+def set_rig_baud(ser, protocol, baud):
+    """
+    Send the rig's baud rate change command at the serial port's current
+    baud rate, then switch the serial port to the new baud rate.
+    """
+    cmd = protocol.baud_cmd(baud)
+    if cmd is not None:
+        ser.write(cmd)
+        ser.flush()
+        time.sleep(SETTLE_TIME)
+    ser.baudrate = baud
+    ser.reset_input_buffer()
+
+# ------------------------------------------------------------------------
+def restore_baud(ser, protocol, baud):
+    """
+    Return the rig and serial port to the original baud rate after a failed
+    upgrade.  The rig may or may not have switched, so the change command
+    is sent at both the failed rate and the original rate.
+
+    Returns
+    -------
+    status : bool
+        True if the link passes verification at the original baud rate,
+        False otherwise.
+    """
+    for rate in (ser.baudrate, baud):
+        ser.baudrate = rate
+        set_rig_baud(ser, protocol, baud)
+        if verify_link(ser, protocol):
+            return True
+    return False
+
+# ------------------------------------------------------------------------
+def negotiate_baud(port, rig, baud, data='8', parity='NONE', stop='1'):
+    """
+    Switch the rig and serial port to the fastest supported CAT baud rate.
+
+    Parameters
+    ----------
+    port : str
+        The serial port device name.
+    rig : str
+        The rig name, one of the RigName values.
+    baud : int
+        The current CAT baud rate.
+    data : str
+        The number of data bits, as stored in the config file.
+    parity : str
+        The parity, as stored in the config file.
+    stop : str
+        The number of stop bits, as stored in the config file.
+
+    Returns
+    -------
+    baud : int
+        The new baud rate, or the original baud rate if the rate could not
+        be upgraded.
+    """
+    baud = int(baud)
+    protocol = get_protocol(rig)
+    if (protocol is None) or not protocol.can_change_baud():
+        return baud
+    rates = sorted([b for b in protocol.cat_bauds if b > baud], reverse=True)
+    if (len(rates) == 0):
+        return baud
+
+    try:
+        ser = serial.Serial(
+            port=port,
+            baudrate=baud,
+            bytesize=BYTESIZE.get(str(data), serial.EIGHTBITS),
+            parity=PARITY.get(str(parity).upper(), serial.PARITY_NONE),
+            stopbits=STOPBITS.get(str(stop), serial.STOPBITS_ONE),
+            timeout=RESPONSE_TIMEOUT,
+            write_timeout=0.5)
+    except Exception as err:
+        AppLog.log.error('Baud rate negotiation: %s', err)
+        return baud
+
+    new_baud = baud
+    try:
+        # Make sure the link works before changing anything.
+        if verify_link(ser, protocol):
+            for rate in rates:
+                set_rig_baud(ser, protocol, rate)
+                if verify_link(ser, protocol):
+                    new_baud = rate
+                    break
+                if not restore_baud(ser, protocol, baud):
+                    AppLog.log.error('Baud rate negotiation: rig not responding at %s baud.', baud)
+                    break
+    except Exception as err:
+        AppLog.log.error('Baud rate negotiation: %s', err)
+        try:
+            restore_baud(ser, protocol, baud)
+        except Exception:
+            pass
+        new_baud = baud
+    try:
+        ser.close()
+    except Exception:
+        pass
+    return new_baud
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('BaudUpgrade test program.')
+    if (len(sys.argv) < 4):
+        print('Usage: BaudUpgrade.py <port> <rig> <baud>')
+        sys.exit(1)
+    print('New baud rate: {}'.format(negotiate_baud(sys.argv[1], sys.argv[2], sys.argv[3])))
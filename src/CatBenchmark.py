@@ -0,0 +1,385 @@
+###############################################################################
+# CatBenchmark.py
+# Author: Tom Kerr AB3GY
+#
+# End-to-end CAT latency benchmark for the pyRigPreset application.
+# Runs repeatable scenarios through the same preset functions the widgets
+# use, against simulated rigs on pseudo-terminals:
+#
+#   frequency           Set the VFO-A frequency
+#   memory_preset       Apply a memory preset with split, tone and 6 commands
+#   config_preset       Apply a configuration preset of 10 commands
+#   ptt_round_trip      PTT on, then PTT off
+#   preset_browsing     Apply memory presets back to back, like scrolling
+#                       through them
+#   cat_preset_switch   Switch to another CAT preset (rig) and set the
+#                       frequency
+#
+# The p50, p95 and p99 latency and the throughput of each scenario are
+# written as JSON, and compared against a stored baseline file if given.
+# Run it before and after a change to RigCat.py or a widget handler.
+#
+# The benchmark uses its own temporary config file, so the application's
+# config file is not touched.  Requires a POSIX operating system.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import json
+import math
+import os
+import platform
+import shutil
+import tempfile
+import time
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+from src import AppLog
+from src import PresetEngine
+from src.RigCat import select_cat_preset
+from src.RigSimulator import DEFAULT_LATENCY, create_simulator
+from PyRigCat.PyRigCat import RigName
+
+
+##############################################################################
+# Globals.
+##############################################################################
+SCENARIOS = (
+    'frequency',
+    'memory_preset',
+    'config_preset',
+    'ptt_round_trip',
+    'preset_browsing',
+    'cat_preset_switch',
+)
+RESULTS_VERSION = 1
+
+DEFAULT_ITERATIONS = 50
+WARMUP = 2                # Iterations run before measuring
+BROWSE_PRESETS = 8        # Memory presets stepped through when browsing
+TOLERANCE = 0.10          # Slowdown against the baseline that is reported
+
+# The rig used by the second CAT preset for each rig.
+_OTHER_RIG = {
+    RigName.FT817: RigName.FT991,
+    RigName.FT991: RigName.IC7000,
+    RigName.IC7000: RigName.FT991,
+}
+
+# Serial settings by rig: (baud, stop bits).
+_RIG_SERIAL = {
+    RigName.FT817: (9600, '2'),
+    RigName.FT991: (38400, '1'),
+    RigName.IC7000: (19200, '1'),
+}
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def percentile(values, pct):
+    """
+    Return the nearest-rank percentile of a sorted list.
+    """
+    if (len(values) == 0):
+        return 0.0
+    rank = int(math.ceil(pct / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+# ------------------------------------------------------------------------
+def summarize(samples, errors, wall_seconds):
+    """
+    Return the statistics of a scenario's latency samples, in milliseconds.
+    """
+    ms = sorted([s * 1000.0 for s in samples])
+    return {
+        'count': len(ms),
+        'errors': errors,
+        'mean_ms': round(sum(ms) / len(ms), 3) if (len(ms) > 0) else 0.0,
+        'min_ms': round(ms[0], 3) if (len(ms) > 0) else 0.0,
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+        'max_ms': round(ms[-1], 3) if (len(ms) > 0) else 0.0,
+        'throughput_per_s': round(len(ms) / wall_seconds, 2) if (wall_seconds > 0) else 0.0,
+    }
+
+# ------------------------------------------------------------------------
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Compare results against a baseline.
+
+    Returns
+    -------
+    rows : list
+        A (scenario, metric, baseline, result, change, regressed) tuple
+        for each latency percentile and the throughput.  change is the
+        fractional change, positive when slower.
+    """
+    rows = []
+    base_scenarios = baseline.get('scenarios', {})
+    for (name, stats) in results.get('scenarios', {}).items():
+        base = base_scenarios.get(name)
+        if base is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_per_s'):
+            old = float(base.get(metric, 0.0))
+            new = float(stats.get(metric, 0.0))
+            if (old <= 0) or (new <= 0):
+                continue
+            if (metric == 'throughput_per_s'):
+                change = (old / new) - 1.0
+            else:
+                change = (new / old) - 1.0
+            rows.append((name, metric, old, new, change, change > tolerance))
+    return rows
+
+# ------------------------------------------------------------------------
+def load_results(filename):
+    with open(filename, 'r') as file_in:
+        return json.load(file_in)
+
+# ------------------------------------------------------------------------
+def save_results(results, filename):
+    with open(filename, 'w') as file_out:
+        json.dump(results, file_out, indent=2)
+
+
+##############################################################################
+# CatBenchmark class.
+##############################################################################
+class CatBenchmark(object):
+    """
+    Runs the benchmark scenarios against simulated rigs.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, rig=RigName.FT991, iterations=DEFAULT_ITERATIONS,
+                 latency=DEFAULT_LATENCY, pace=True):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        rig : str
+            The simulated rig used by CAT preset 1.
+        iterations : int
+            Measured iterations per scenario.
+        latency : float or dict
+            Simulator response latency, as used by RigSimulator.
+        pace : bool
+            True to simulate the serial baud rate.
+        """
+        self.rig = str(rig).upper()
+        self.other_rig = _OTHER_RIG.get(self.rig, RigName.FT991)
+        self.iterations = int(iterations)
+        self.latency = latency
+        self.pace = pace
+        self.sims = []
+        self._dir = ''
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Start the simulators and create the benchmark config file.
+        """
+        self._dir = tempfile.mkdtemp(prefix='pyRigPreset-bench-')
+        globals.init(os.path.join(self._dir, 'benchmark.ini'))
+        AppLog.set_level('WARNING')   # Keep CAT frames off the console
+        for (pnum, rig) in ((1, self.rig), (2, self.other_rig)):
+            (baud, stop) = _RIG_SERIAL[rig]
+            sim = create_simulator(rig, baud=baud, latency=self.latency, pace=self.pace)
+            sim.start()
+            self.sims.append(sim)
+            section = 'CAT_PRESET{:03d}'.format(pnum)
+            self._set_section(section, NAME=rig, RIG=rig, PORT=sim.name, SERIAL='',
+                BAUD=baud, DATA='8', PARITY='NONE', STOP=stop)
+        self._set_section('CAT', AUTO_BAUD='OFF', LOW_LATENCY='OFF')
+        for pnum in range(1, BROWSE_PRESETS + 1):
+            vfoa = 14.074 + (pnum * 0.001)
+            split = (pnum % 2 == 0)
+            self._set_section('MEMORY_PRESET{:03d}'.format(pnum),
+                PRESET_DESC='Bench {}'.format(pnum),
+                VFOA_FREQ_MHZ=vfoa, VFOB_FREQ_MHZ=vfoa + 0.002,
+                SPLIT='ON' if split else 'OFF', MODEA='USB', MODEB='USB',
+                CTCSS_CONFIG='OFF', CTCSS_TONE=0,
+                COMMAND1='MODEB USB', COMMAND2='FREQB {}'.format(int((vfoa + 0.002) * 1E6)),
+                COMMAND3='SPLIT ON' if split else 'SPLIT OFF', COMMAND4='PTT OFF',
+                COMMAND5='MODE USB', COMMAND6='FREQA {}'.format(int(vfoa * 1E6)))
+        config_cmds = [
+            'FREQA 7074000', 'MODE USB', 'FREQB 7076000', 'MODEB USB', 'SPLIT OFF',
+            'TONE OFF', 'PTT OFF', 'FREQA 7075000', 'MODE LSB', 'MODE USB']
+        config_cmds = config_cmds[:globals.NUM_CONFIG_COMMANDS]
+        self._set_section('CONFIG_PRESET001', PRESET_NAME='Bench',
+            **dict(('CMD{:03d}'.format(idx + 1), cmd) for (idx, cmd) in enumerate(config_cmds)))
+        select_cat_preset(1)
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop the simulators and remove the benchmark config file.
+        """
+        for sim in self.sims:
+            sim.stop()
+        self.sims = []
+        globals.close()
+        if (len(self._dir) > 0):
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = ''
+
+    # ------------------------------------------------------------------------
+    def _set_section(self, section, **values):
+        if not globals.config.has_section(section):
+            globals.config.add_section(section)
+        for (key, value) in values.items():
+            globals.config.set(section, key, value)
+        globals.config.write()
+
+    # ------------------------------------------------------------------------
+    def run(self, scenarios=SCENARIOS):
+        """
+        Run the scenarios and return the results dictionary.
+        """
+        results = {
+            'version': RESULTS_VERSION,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rig': self.rig,
+            'other_rig': self.other_rig,
+            'iterations': self.iterations,
+            'latency': self.latency,
+            'pace': self.pace,
+            'scenarios': {},
+        }
+        for name in scenarios:
+            step = getattr(self, '_step_' + name)
+            results['scenarios'][name] = self._measure(step)
+        return results
+
+    # ------------------------------------------------------------------------
+    def _measure(self, step):
+        """
+        Run one scenario step repeatedly and return its statistics.
+        """
+        for idx in range(WARMUP):
+            step(idx)
+        samples = []
+        errors = 0
+        t_start = time.perf_counter()
+        for idx in range(self.iterations):
+            t0 = time.perf_counter()
+            ok = step(idx)
+            samples.append(time.perf_counter() - t0)
+            if not ok:
+                errors += 1
+        return summarize(samples, errors, time.perf_counter() - t_start)
+
+    # ------------------------------------------------------------------------
+    def _step_frequency(self, idx):
+        return PresetEngine.set_frequency(14074000 + (idx % 10) * 100)
+
+    # ------------------------------------------------------------------------
+    def _step_memory_preset(self, idx):
+        return PresetEngine.apply_memory_preset(2)
+
+    # ------------------------------------------------------------------------
+    def _step_config_preset(self, idx):
+        return PresetEngine.apply_config_preset(1)
+
+    # ------------------------------------------------------------------------
+    def _step_ptt_round_trip(self, idx):
+        on = PresetEngine.set_ptt(True)
+        off = PresetEngine.set_ptt(False)
+        return on and off
+
+    # ------------------------------------------------------------------------
+    def _step_preset_browsing(self, idx):
+        return PresetEngine.apply_memory_preset((idx % BROWSE_PRESETS) + 1)
+
+    # ------------------------------------------------------------------------
+    def _step_cat_preset_switch(self, idx):
+        select_cat_preset(2 if (idx % 2 == 0) else 1)
+        status = PresetEngine.set_frequency(7074000)
+        if (idx == self.iterations - 1):
+            select_cat_preset(1)
+        return status
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('CatBenchmark test program.')
+    if (len(sys.argv) > 1) and (sys.argv[1] in ('-h', '--help')):
+        print('Usage: CatBenchmark.py [rig] [iterations] [results.json] [baseline.json]')
+        sys.exit(0)
+    rig = sys.argv[1] if (len(sys.argv) > 1) else RigName.FT991
+    iterations = int(sys.argv[2]) if (len(sys.argv) > 2) else DEFAULT_ITERATIONS
+    results_file = sys.argv[3] if (len(sys.argv) > 3) else ''
+    baseline_file = sys.argv[4] if (len(sys.argv) > 4) else ''
+
+    bench = CatBenchmark(rig, iterations)
+    bench.start()
+    try:
+        results = bench.run()
+    finally:
+        bench.stop()
+
+    print('{:20s} {:>9s} {:>9s} {:>9s} {:>9s} {:>7s}'.format(
+        'Scenario', 'p50 ms', 'p95 ms', 'p99 ms', 'ops/s', 'errors'))
+    for (name, stats) in results['scenarios'].items():
+        print('{:20s} {:9.2f} {:9.2f} {:9.2f} {:9.1f} {:7d}'.format(name,
+            stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+            stats['throughput_per_s'], stats['errors']))
+    if (len(results_file) > 0):
+        save_results(results, results_file)
+        print('Results written to ' + results_file)
+
+    regressed = False
+    if (len(baseline_file) > 0):
+        print('Compared with ' + baseline_file + ':')
+        for (name, metric, old, new, change, slower) in compare(results, load_results(baseline_file)):
+            print('{:20s} {:18s} {:10.2f} -> {:10.2f} {:+7.1%}{}'.format(
+                name, metric, old, new, change, '  SLOWER' if slower else ''))
+            regressed = regressed or slower
+    sys.exit(1 if regressed else 0)
@@ -0,0 +1,542 @@
+###############################################################################
+# CatIoLoop.py
+# Author: Tom Kerr AB3GY
+#
+# Event driven serial I/O for the pyRigPreset application.
+# A single thread multiplexes reads and writes for any number of open serial
+# ports using the selectors module.  Each port speaks a rig's native CAT
+# protocol, described by a RigProtocol object.  Requests are queued per port
+# and completed through concurrent.futures.Future objects, with a deadline
+# per request instead of a blocking read timeout.
+#
+# Requires a POSIX operating system, since serial ports are not selectable
+# on Windows.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+from collections import deque
+from concurrent.futures import Future
+import os
+import selectors
+import threading
+import time
+
+import serial
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src import AppLog
+from src import Metrics
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Default request deadline in seconds.
+DEFAULT_DEADLINE = 0.5
+
+# Maximum bytes read per readable event.
+READ_SIZE = 4096
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def supported():
+    """
+    Return True if the event driven I/O loop is supported on this
+    operating system.
+    """
+    return (os.name == 'posix')
+
+
+##############################################################################
+# CatRequest class.
+##############################################################################
+class CatRequest(object):
+    """
+    A single CAT command and its pending response.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, data, expect, deadline, protocol=None):
+        self.data = bytes(data)      # Command bytes to send
+        self.expect = expect         # Number of response frames expected
+        self.protocol = protocol     # Response framing, None for the port's
+        self.deadline = deadline     # Completion deadline, time.monotonic()
+        self.frames = []             # Response frames received so far
+        self.future = Future()       # Completed with the list of frames
+        self.sent = False            # True once the command is queued for writing
+        self.written = False         # True once all command bytes are written
+
+
+##############################################################################
+# CatChannel class.
+##############################################################################
+class CatChannel(object):
+    """
+    An open serial port managed by the I/O loop.
+    Only the I/O loop thread may touch the serial port and buffers.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, ser, protocol):
+        self.ser = ser               # The pyserial object
+        self.protocol = protocol     # The RigProtocol object
+        self.name = ser.port         # The serial port device name
+        self.requests = deque()      # Pending requests, head is in flight
+        self.inbuf = b''             # Received bytes not yet framed
+        self.outbuf = b''            # Bytes waiting to be written
+        self.on_frame = None         # Callback for unsolicited frames
+        self.closed = False
+
+    # ------------------------------------------------------------------------
+    def fileno(self):
+        return self.ser.fileno()
+
+
+##############################################################################
+# CatIoLoop class.
+##############################################################################
+class CatIoLoop(object):
+    """
+    Single thread serial I/O multiplexer.
+    All public methods are thread safe.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self):
+        self._selector = None
+        self._thread = None
+        self._running = False
+        self._calls = deque()        # Calls to run on the loop thread
+        self._lock = threading.Lock()
+        self._wake_r = -1            # Wakeup pipe read end
+        self._wake_w = -1            # Wakeup pipe write end
+        self._channels = []
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Start the I/O loop thread.
+        """
+        if self._running:
+            return
+        self._selector = selectors.DefaultSelector()
+        (self._wake_r, self._wake_w) = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='CatIoLoop', daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop the I/O loop thread and close all ports.
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup()
+        if (self._thread is not None) and (self._thread is not threading.current_thread()):
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    # ------------------------------------------------------------------------
+    def in_loop_thread(self):
+        """
+        Return True if called from the I/O loop thread.
+        """
+        return (self._thread is threading.current_thread())
+
+    # ------------------------------------------------------------------------
+    def call_soon(self, fn, *args):
+        """
+        Run a function on the I/O loop thread.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed with the function's return value.
+        """
+        future = Future()
+        with self._lock:
+            self._calls.append((future, fn, args))
+        self._wakeup()
+        return future
+
+    # ------------------------------------------------------------------------
+    def open_port(self, protocol, port, baudrate, **kwargs):
+        """
+        Open a serial port and add it to the I/O loop.
+
+        Parameters
+        ----------
+        protocol : RigProtocol object
+            The rig protocol used to frame responses.
+        port : str
+            The serial port device name.
+        baudrate : int
+            The baud rate.
+        kwargs : dict
+            Other pyserial parameters, such as bytesize, parity or stopbits.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed with a CatChannel object, or with the exception raised
+            while opening the port.
+        """
+        return self.call_soon(self._open_port, protocol, port, baudrate, kwargs)
+
+    # ------------------------------------------------------------------------
+    def close_port(self, channel):
+        """
+        Close a serial port.  Pending requests fail with ConnectionError.
+        """
+        return self.call_soon(self._close_port, channel)
+
+    # ------------------------------------------------------------------------
+    def configure(self, channel, **kwargs):
+        """
+        Change serial port parameters, such as baudrate or stopbits.
+        """
+        return self.call_soon(self._configure, channel, kwargs)
+
+    # ------------------------------------------------------------------------
+    def request(self, channel, data, expect=1, timeout=DEFAULT_DEADLINE, protocol=None):
+        """
+        Queue a CAT command on a port.
+
+        Parameters
+        ----------
+        channel : CatChannel object
+            The port returned by open_port().
+        data : bytes
+            The command bytes.
+        expect : int
+            The number of response frames expected.  Use 0 for commands
+            with no response; the request completes once it is written and
+            the protocol's error window has passed.  An error reply that
+            arrives within the window completes it early, with the reply as
+            its only frame.
+        timeout : float
+            Seconds from now until the request must complete.
+        protocol : RigProtocol object
+            Optional protocol used to frame this request's response, for
+            rigs whose response format depends on the command.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed with the list of response frames, or with TimeoutError
+            if the deadline passes first.
+        """
+        req = CatRequest(data, expect, time.monotonic() + timeout, protocol)
+        self.call_soon(self._queue_request, channel, req)
+        return req.future
+
+    # ------------------------------------------------------------------------
+    def _wakeup(self):
+        try:
+            os.write(self._wake_w, b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    # ------------------------------------------------------------------------
+    def _run(self):
+        """
+        I/O loop thread.
+        """
+        while self._running:
+            for (key, events) in self._selector.select(self._next_timeout()):
+                if key.data is None:
+                    self._drain_wakeup()
+                    continue
+                channel = key.data
+                if (events & selectors.EVENT_READ):
+                    self._on_readable(channel)
+                if (events & selectors.EVENT_WRITE) and not channel.closed:
+                    self._on_writable(channel)
+            self._run_calls()
+            self._check_deadlines()
+
+        # Shut down.
+        self._run_calls()
+        for channel in list(self._channels):
+            self._close_port(channel)
+        self._selector.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+
+    # ------------------------------------------------------------------------
+    def _next_timeout(self):
+        """
+        Return the select timeout, which is the time to the next deadline.
+        """
+        if (len(self._calls) > 0):
+            return 0
+        deadline = None
+        for channel in self._channels:
+            if (len(channel.requests) > 0):
+                d = channel.requests[0].deadline
+                if (deadline is None) or (d < deadline):
+                    deadline = d
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    # ------------------------------------------------------------------------
+    def _drain_wakeup(self):
+        try:
+            while os.read(self._wake_r, 512):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    # ------------------------------------------------------------------------
+    def _run_calls(self):
+        while True:
+            with self._lock:
+                if (len(self._calls) == 0):
+                    return
+                (future, fn, args) = self._calls.popleft()
+            try:
+                future.set_result(fn(*args))
+            except Exception as err:
+                future.set_exception(err)
+
+    # ------------------------------------------------------------------------
+    def _open_port(self, protocol, port, baudrate, kwargs):
+        ser = serial.Serial(port=port, baudrate=baudrate, timeout=0, write_timeout=0, **kwargs)
+        channel = CatChannel(ser, protocol)
+        self._selector.register(ser.fileno(), selectors.EVENT_READ, channel)
+        self._channels.append(channel)
+        return channel
+
+    # ------------------------------------------------------------------------
+    def _close_port(self, channel):
+        if channel.closed:
+            return
+        channel.closed = True
+        try:
+            self._selector.unregister(channel.ser.fileno())
+        except Exception:
+            pass
+        try:
+            channel.ser.close()
+        except Exception:
+            pass
+        if channel in self._channels:
+            self._channels.remove(channel)
+        while (len(channel.requests) > 0):
+            req = channel.requests.popleft()
+            if not req.future.done():
+                req.future.set_exception(ConnectionError('Port closed: ' + channel.name))
+
+    # ------------------------------------------------------------------------
+    def _configure(self, channel, kwargs):
+        for (key, value) in kwargs.items():
+            setattr(channel.ser, key, value)
+
+    # ------------------------------------------------------------------------
+    def _queue_request(self, channel, req):
+        if channel.closed:
+            req.future.set_exception(ConnectionError('Port closed: ' + channel.name))
+            return
+        channel.requests.append(req)
+        if (len(channel.requests) == 1):
+            self._send_head(channel)
+
+    # ------------------------------------------------------------------------
+    def _send_head(self, channel):
+        """
+        Start sending the request at the head of a port's queue.
+        """
+        if channel.closed:
+            return
+        # Requests that expired while queued are not sent.
+        now = time.monotonic()
+        while (len(channel.requests) > 0) and (channel.requests[0].deadline <= now):
+            req = channel.requests.popleft()
+            if not req.future.done():
+                req.future.set_exception(TimeoutError('CAT request timeout: ' + channel.name))
+        if (len(channel.requests) == 0):
+            return
+        req = channel.requests[0]
+        # Stale bytes belong to an earlier, abandoned request.
+        channel.inbuf = b''
+        try:
+            channel.ser.reset_input_buffer()
+        except Exception:
+            pass
+        channel.outbuf = req.data
+        req.sent = True
+        self._on_writable(channel)
+
+    # ------------------------------------------------------------------------
+    def _complete_head(self, channel, err=None):
+        """
+        Complete the request at the head of a port's queue and start the next.
+        """
+        req = channel.requests.popleft()
+        channel.outbuf = b''
+        self._set_events(channel)
+        if not req.future.done():
+            if err is None:
+                req.future.set_result(req.frames)
+            else:
+                req.future.set_exception(err)
+        self._send_head(channel)
+
+    # ------------------------------------------------------------------------
+    def _set_events(self, channel):
+        events = selectors.EVENT_READ
+        if (len(channel.outbuf) > 0):
+            events |= selectors.EVENT_WRITE
+        try:
+            self._selector.modify(channel.ser.fileno(), events, channel)
+        except Exception:
+            pass
+
+    # ------------------------------------------------------------------------
+    def _on_writable(self, channel):
+        try:
+            n = os.write(channel.ser.fileno(), channel.outbuf)
+        except BlockingIOError:
+            n = 0
+        except OSError as err:
+            self._fail_port(channel, err)
+            return
+        Metrics.bytes_out.inc('serial', amount=n)
+        channel.outbuf = channel.outbuf[n:]
+        self._set_events(channel)
+        if (len(channel.outbuf) == 0) and (len(channel.requests) > 0) and channel.requests[0].sent:
+            req = channel.requests[0]
+            req.written = True
+            if (req.expect == 0):
+                # Wait for a late error reply before starting the next
+                # request, so the reply is not credited to it.
+                window = channel.protocol.error_window
+                if (window > 0):
+                    req.deadline = time.monotonic() + window
+                else:
+                    self._complete_head(channel)
+
+    # ------------------------------------------------------------------------
+    def _on_readable(self, channel):
+        try:
+            data = os.read(channel.ser.fileno(), READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as err:
+            self._fail_port(channel, err)
+            return
+        if (len(data) == 0):
+            # End of file, such as a closed pty or unplugged adapter.
+            self._fail_port(channel, ConnectionError('Port disconnected: ' + channel.name))
+            return
+        Metrics.bytes_in.inc('serial', amount=len(data))
+        channel.inbuf += data
+        protocol = channel.protocol
+        if (len(channel.requests) > 0) and (channel.requests[0].protocol is not None):
+            protocol = channel.requests[0].protocol
+        (frames, channel.inbuf) = protocol.split_frames(channel.inbuf)
+        # Frames are credited only to the request that was in flight when
+        # they were read.  Once it completes, the next request is sent and
+        # any frames left over from this read are not its response.
+        req = None
+        if (len(channel.requests) > 0) and channel.requests[0].sent:
+            req = channel.requests[0]
+        for frame in frames:
+            if channel.protocol.is_echo(frame):
+                continue
+            if (req is not None) and (len(channel.requests) > 0) and (channel.requests[0] is req):
+                req.frames.append(frame)
+                if (len(req.frames) >= max(req.expect, 1)):
+                    self._complete_head(channel)
+            elif channel.on_frame is not None:
+                try:
+                    channel.on_frame(channel, frame)
+                except Exception as err:
+                    AppLog.log.error('CatIoLoop frame callback error: %s', err)
+
+    # ------------------------------------------------------------------------
+    def _fail_port(self, channel, err):
+        AppLog.error('CatIoLoop {}: {}'.format(channel.name, str(err)))
+        self._close_port(channel)
+
+    # ------------------------------------------------------------------------
+    def _check_deadlines(self):
+        now = time.monotonic()
+        for channel in list(self._channels):
+            while (len(channel.requests) > 0) and (channel.requests[0].deadline <= now):
+                req = channel.requests[0]
+                if (req.expect == 0) and req.written:
+                    # The error window passed without a reply.
+                    self._complete_head(channel)
+                else:
+                    self._complete_head(channel, TimeoutError('CAT request timeout: ' + channel.name))
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    from src.RigProtocol import get_protocol
+    print('CatIoLoop test program.')
+    if (len(sys.argv) < 4):
+        print('Usage: CatIoLoop.py <port> <rig> <baud>')
+        sys.exit(1)
+    protocol = get_protocol(sys.argv[2])
+    loop = CatIoLoop()
+    loop.start()
+    channel = loop.open_port(protocol, sys.argv[1], int(sys.argv[3]), stopbits=protocol.stopbits).result()
+    t0 = time.monotonic()
+    futures = [loop.request(channel, protocol.identify_cmd) for i in range(10)]
+    for f in futures:
+        try:
+            print(f.result())
+        except Exception as err:
+            print(str(err))
+    print('10 requests in {:0.3f} seconds.'.format(time.monotonic() - t0))
+    loop.stop()
@@ -49,6 +49,7 @@ import _env_init
 # Local packages.
 import globals
 from src.pyRigPresetUtils import *
+from src import StartupProfiler as profiler
 from src.ConfigFile import ConfigFile
 
 
@@ -95,12 +96,14 @@ class CatPresetStore(object):
         self._preset_name = ''  # Preset name on button
         self._rig = ''          # Transceiver name
         self._port = ''         # COM port name
+        self._serial = ''       # USB serial number of the COM port
         self._baud = ''         # Baud rate
         self._data = ''         # Data bits size
         self._parity = ''       # COM port parity
         self._stop = ''         # Stop bits size
 
-        self.init()
+        with profiler.phase('{}({}).init'.format(self.__class__.__name__, self._id)):
+            self.init()
 
     # ------------------------------------------------------------------------
     def get_id(self):
@@ -134,6 +137,14 @@ class CatPresetStore(object):
     def set_port(self, val):
         self._port = str(val)
     
+    # ------------------------------------------------------------------------
+    def get_serial(self):
+       return self._serial
+       
+    # ------------------------------------------------------------------------
+    def set_serial(self, val):
+        self._serial = str(val)
+    
     # ------------------------------------------------------------------------
     def get_baud(self):
        return self._baud
@@ -177,6 +188,7 @@ class CatPresetStore(object):
             self._preset_name = str(globals.config.get(section, 'PRESET_NAME'))
             self._rig = str(globals.config.get(section, 'RIG'))
             self._port = str(globals.config.get(section, 'PORT'))
+            self._serial = str(globals.config.get(section, 'SERIAL'))
             self._baud = str(globals.config.get(section, 'BAUD'))
             self._data = str(globals.config.get(section, 'DATA'))
             self._parity = str(globals.config.get(section, 'PARITY'))
@@ -193,6 +205,7 @@ class CatPresetStore(object):
             globals.config.set(section, 'PRESET_NAME', self._preset_name)
             globals.config.set(section, 'RIG', self._rig)
             globals.config.set(section, 'PORT', self._port)
+            globals.config.set(section, 'SERIAL', self._serial)
             globals.config.set(section, 'BAUD', self._baud)
             globals.config.set(section, 'DATA', self._data)
             globals.config.set(section, 'PARITY', self._parity)
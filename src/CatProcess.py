@@ -0,0 +1,582 @@
+###############################################################################
+# CatProcess.py
+# Author: Tom Kerr AB3GY
+#
+# Child process CAT server for the pyRigPreset application.
+# Optionally runs the preset engine and rig CAT object in a child process,
+# so that a wedged serial port or a slow rig initialization cannot hang the
+# GUI.  A request that does not complete in time kills the child process
+# and starts a new one.
+#
+# The processes talk over a multiprocessing pipe using struct framed binary
+# messages.  Each message is a header followed by a payload:
+#
+#   header:  <BI   message type, request ID
+#   payload: depends on the message type, see below
+#
+# The child pushes a STATE message whenever the rig state changes, which
+# the parent copies into its own globals.rig_state.  Config file settings
+# changed by a request, such as a new port name or baud rate, are pushed in
+# CONFIG messages, so the parent does not overwrite them when it exits.
+#
+# GUI requests made with a callback do not wait for the child.  They are
+# checked from the Tk main loop, and the callback gets the real result.
+# The child is restarted if it makes no progress for REQUEST_TIMEOUT
+# seconds, however many requests are queued behind the slow one.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import json
+import multiprocessing
+import struct
+import threading
+import time
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+from src import AppLog
+from src import Metrics
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Message header.
+HEADER = struct.Struct('<BI')
+
+# Message types and payloads.
+MSG_APPLY_MEMORY = 1   # <I preset ID
+MSG_APPLY_CONFIG = 2   # <I preset ID
+MSG_SET_FREQ = 3       # <Q frequency in Hz
+MSG_SET_PTT = 4        # <B 1 = on, 0 = off
+MSG_SEND_CMD = 5       # UTF-8 command string
+MSG_PING = 6           # No payload
+MSG_QUIT = 7           # No payload
+MSG_SET_MODE = 8       # UTF-8 mode string
+MSG_SET_SPLIT = 9      # SPLIT struct, followed by a UTF-8 mode string
+MSG_READ_STATE = 10    # No payload
+MSG_RESULT = 64        # <B status, followed by a UTF-8 response string
+MSG_STATE = 65         # STATE struct, followed by NUL separated UTF-8 strings
+MSG_METRICS = 66       # JSON encoded Metrics.take() data
+MSG_CONFIG = 67        # NUL separated UTF-8 section, key and value
+
+PRESET = struct.Struct('<I')
+FREQ = struct.Struct('<Q')
+FLAG = struct.Struct('<B')
+SPLIT = struct.Struct('<BQ')  # 1 = on, 0 = off; VFO-B frequency in Hz
+
+# seq, vfoa_hz, vfob_hz, split, ptt, memory_preset, config_preset
+# followed by rig, modea and modeb strings.
+STATE = struct.Struct('<IQQBBII')
+
+# Seconds the child may work on one request before it is restarted.
+REQUEST_TIMEOUT = 10.0
+
+# Seconds between progress checks while waiting for a request.
+CHECK_INTERVAL = 0.1
+
+# Seconds to wait for the child to start.
+START_TIMEOUT = 10.0
+
+# Milliseconds between checks of requests made from the GUI.
+TK_POLL_MS = 20
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def pack_state(snap):
+    """
+    Pack a rig state snapshot into a STATE message payload.
+    """
+    strings = '\0'.join([str(snap['rig']), str(snap['modea']), str(snap['modeb'])])
+    return STATE.pack(
+        snap['seq'] & 0xFFFFFFFF,
+        int(snap['vfoa_hz']),
+        int(snap['vfob_hz']),
+        int(bool(snap['split'])),
+        int(bool(snap['ptt'])),
+        int(snap['memory_preset']),
+        int(snap['config_preset'])) + strings.encode('utf-8')
+
+# ------------------------------------------------------------------------
+def unpack_state(payload):
+    """
+    Unpack a STATE message payload into a rig state dictionary.
+    The sequence number is not included, since the receiver keeps its own.
+    """
+    (seq, vfoa_hz, vfob_hz, split, ptt, mem, cfg) = STATE.unpack_from(payload)
+    strings = bytes(payload[STATE.size:]).decode('utf-8').split('\0')
+    strings += [''] * (3 - len(strings))
+    return {
+        'rig': strings[0],
+        'vfoa_hz': vfoa_hz,
+        'vfob_hz': vfob_hz,
+        'modea': strings[1],
+        'modeb': strings[2],
+        'split': bool(split),
+        'ptt': bool(ptt),
+        'memory_preset': mem,
+        'config_preset': cfg,
+    }
+
+# ------------------------------------------------------------------------
+def _config_items():
+    """
+    Return all config file settings as a {(section, key): value} dictionary.
+    """
+    cfg = globals.config.config
+    return {(s, k): v for s in cfg.sections() for (k, v) in cfg.items(s)}
+
+# ------------------------------------------------------------------------
+def _child_main(conn, ini_file):
+    """
+    Child process entry point.  Serves requests until told to quit or the
+    pipe is closed.
+    """
+    from src.ConfigFile import ConfigFile
+    from src import PresetEngine
+
+    globals.config = ConfigFile(ini_file)
+    globals.config.read()
+    AppLog.configure(globals.config, console_only=True)
+    send_lock = threading.Lock()
+
+    # Collect metrics here and forward them to the GUI process, which serves
+    # them.
+    if (str(globals.config.get('METRICS', 'ENABLE')).upper() == 'ON'):
+        Metrics.enable()
+
+    def send(msg_type, req_id, payload=b''):
+        with send_lock:
+            conn.send_bytes(HEADER.pack(msg_type, req_id) + payload)
+
+    globals.rig_state.add_listener(lambda snap: send(MSG_STATE, 0, pack_state(snap)))
+
+    while True:
+        try:
+            msg = conn.recv_bytes()
+        except (EOFError, OSError):
+            break
+        (msg_type, req_id) = HEADER.unpack_from(msg)
+        payload = msg[HEADER.size:]
+        status = False
+        resp = ''
+        try:
+            # Pick up config changes made by the GUI process.
+            globals.config.read(create=False)
+            config_before = _config_items()
+            if (msg_type == MSG_APPLY_MEMORY):
+                status = PresetEngine.apply_memory_preset(PRESET.unpack(payload)[0])
+            elif (msg_type == MSG_APPLY_CONFIG):
+                status = PresetEngine.apply_config_preset(PRESET.unpack(payload)[0])
+            elif (msg_type == MSG_SET_FREQ):
+                status = PresetEngine.set_frequency(FREQ.unpack(payload)[0])
+            elif (msg_type == MSG_SET_PTT):
+                status = PresetEngine.set_ptt(bool(FLAG.unpack(payload)[0]))
+            elif (msg_type == MSG_SET_MODE):
+                status = PresetEngine.set_mode(payload.decode('utf-8'))
+            elif (msg_type == MSG_SET_SPLIT):
+                (split, vfob_hz) = SPLIT.unpack_from(payload)
+                modeb = bytes(payload[SPLIT.size:]).decode('utf-8')
+                status = PresetEngine.set_split(bool(split), vfob_hz, modeb)
+            elif (msg_type == MSG_READ_STATE):
+                status = PresetEngine.read_rig_state()
+            elif (msg_type == MSG_SEND_CMD):
+                resp = PresetEngine.send_command(payload.decode('utf-8'))
+                status = ('ERROR' not in resp)
+            elif (msg_type == MSG_PING):
+                status = True
+            elif (msg_type == MSG_QUIT):
+                send(MSG_RESULT, req_id, FLAG.pack(1))
+                break
+            else:
+                resp = 'Unknown message type: {}'.format(msg_type)
+        except Exception as err:
+            resp = str(err)
+        try:
+            for ((section, key), value) in _config_items().items():
+                if (config_before.get((section, key)) != value):
+                    send(MSG_CONFIG, 0, '\0'.join([section, key, value]).encode('utf-8'))
+        except Exception as err:
+            AppLog.log.error('CAT process config error: %s', err)
+        if Metrics.enabled():
+            # Before the result, so the request is counted when it returns.
+            # The GUI process times the presets itself.
+            data = Metrics.take(exclude=(Metrics.preset_seconds,))
+            if (len(data) > 0):
+                send(MSG_METRICS, 0, json.dumps(data).encode('utf-8'))
+        send(MSG_RESULT, req_id, FLAG.pack(int(bool(status))) + str(resp).encode('utf-8'))
+    conn.close()
+
+
+##############################################################################
+# CatProcess class.
+##############################################################################
+class CatProcess(object):
+    """
+    Parent side of the child process CAT server.
+    Provides the same functions as the preset engine.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, ini_file=''):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        ini_file : str
+            The config file used by the child process.  Defaults to the
+            current config file.
+        """
+        self.ini_file = ini_file
+        self._ctx = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._reader = None
+        self._send_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._req_id = 0
+        self._pending = {}
+        self._progress = time.monotonic()  # When the child last finished a request
+        self._restart_lock = threading.Lock()
+        self._tk_pending = []              # (Future, callback) made from the GUI
+        self._tk_polling = False
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Start the child process.
+        """
+        with self._lock:
+            if (self._process is not None) and self._process.is_alive():
+                return
+            if (len(self.ini_file) == 0):
+                self.ini_file = globals.config.ini_file
+            (parent_conn, child_conn) = self._ctx.Pipe(duplex=True)
+            self._process = self._ctx.Process(
+                target=_child_main,
+                args=(child_conn, self.ini_file),
+                name='CatProcess',
+                daemon=True)
+            self._process.start()
+            child_conn.close()
+            self._conn = parent_conn
+            self._reader = threading.Thread(
+                target=self._read_loop,
+                args=(parent_conn,),
+                name='CatProcessReader',
+                daemon=True)
+            self._reader.start()
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop the child process.
+        """
+        if (self._process is None):
+            return
+        if self._process.is_alive():
+            try:
+                self._request(MSG_QUIT, b'').result(timeout=1.0)
+            except Exception:
+                pass
+        self._kill()
+
+    # ------------------------------------------------------------------------
+    def restart(self):
+        """
+        Kill the child process and start a new one.
+        """
+        self._kill()
+        self.start()
+
+    # ------------------------------------------------------------------------
+    def _kill(self):
+        with self._lock:
+            process = self._process
+            conn = self._conn
+            self._process = None
+            self._conn = None
+        if process is not None:
+            process.join(timeout=0.5)
+            if process.is_alive():
+                process.kill()
+                process.join(timeout=1.0)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._fail_pending(ConnectionError('CAT process stopped'))
+
+    # ------------------------------------------------------------------------
+    def pending(self):
+        """
+        Return the number of requests waiting for the child process.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    # ------------------------------------------------------------------------
+    def _fail_pending(self, err):
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(err)
+
+    # ------------------------------------------------------------------------
+    def _read_loop(self, conn):
+        """
+        Reader thread.  Completes requests and copies pushed state, config
+        settings and metrics.
+        """
+        while True:
+            try:
+                msg = conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            (msg_type, req_id) = HEADER.unpack_from(msg)
+            payload = msg[HEADER.size:]
+            if (msg_type == MSG_STATE):
+                globals.rig_state.update(**unpack_state(payload))
+            elif (msg_type == MSG_CONFIG):
+                (section, key, value) = bytes(payload).decode('utf-8').split('\0', 2)
+                globals.config.set(section, key, value)
+            elif (msg_type == MSG_METRICS):
+                Metrics.merge(json.loads(bytes(payload).decode('utf-8')))
+            elif (msg_type == MSG_RESULT):
+                with self._lock:
+                    future = self._pending.pop(req_id, None)
+                    self._progress = time.monotonic()
+                if (future is not None) and not future.done():
+                    status = bool(FLAG.unpack_from(payload)[0])
+                    resp = bytes(payload[FLAG.size:]).decode('utf-8')
+                    future.set_result((status, resp))
+        if conn is self._conn:
+            self._fail_pending(ConnectionError('CAT process exited'))
+
+    # ------------------------------------------------------------------------
+    def _request(self, msg_type, payload):
+        """
+        Send a request to the child process.
+        Returns a Future completed with a (status, response) tuple.
+        """
+        self.start()
+        future = Future()
+        with self._lock:
+            self._req_id = (self._req_id + 1) & 0xFFFFFFFF
+            req_id = self._req_id
+            if (len(self._pending) == 0):
+                # The child starts on this request now.
+                self._progress = time.monotonic()
+            self._pending[req_id] = future
+            conn = self._conn
+        try:
+            with self._send_lock:
+                conn.send_bytes(HEADER.pack(msg_type, req_id) + payload)
+        except Exception as err:
+            with self._lock:
+                self._pending.pop(req_id, None)
+            future.set_exception(ConnectionError(str(err)))
+        return future
+
+    # ------------------------------------------------------------------------
+    def _restart_if_stalled(self, timeout):
+        """
+        Restart the child if requests are pending and it has not finished
+        one for timeout seconds.  Returns True if it was restarted.
+        """
+        with self._restart_lock:
+            with self._lock:
+                stalled = (len(self._pending) > 0) and \
+                    ((time.monotonic() - self._progress) > timeout)
+            if not stalled:
+                return False
+            AppLog.error('CAT process not responding, restarting.')
+            self.restart()
+            return True
+
+    # ------------------------------------------------------------------------
+    def call(self, msg_type, payload=b'', timeout=REQUEST_TIMEOUT):
+        """
+        Send a request and wait for the result.  If the child makes no
+        progress for timeout seconds, it is killed and restarted.
+
+        Returns
+        -------
+        (status, resp) : tuple
+            status : bool
+                True if successful, False otherwise.
+            resp : str
+                The response string.
+        """
+        future = self._request(msg_type, payload)
+        while True:
+            try:
+                return future.result(timeout=CHECK_INTERVAL)
+            except FutureTimeoutError:
+                if self._restart_if_stalled(timeout):
+                    return (False, 'ERROR: CAT process timeout')
+            except Exception as err:
+                AppLog.log.error('CAT process error: %s', err)
+                return (False, 'ERROR: ' + str(err))
+
+    # ------------------------------------------------------------------------
+    def submit(self, msg_type, payload=b'', callback=None):
+        """
+        Send a request without waiting for it.  Call from the Tk main
+        thread.  The request is checked from the Tk main loop, and the child
+        is restarted if it stalls.
+
+        Parameters
+        ----------
+        callback : function
+            Optional function called from the Tk main loop with the
+            (status, resp) result once the request completes or fails.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed with the (status, resp) result.
+        """
+        future = self._request(msg_type, payload)
+        self._tk_pending.append((future, callback))
+        if not self._tk_polling:
+            self._tk_polling = True
+            globals.root.after(TK_POLL_MS, self._tk_poll)
+        return future
+
+    # ------------------------------------------------------------------------
+    def _tk_poll(self):
+        """
+        Deliver the results of requests made with submit().
+        """
+        self._restart_if_stalled(REQUEST_TIMEOUT)
+        waiting = []
+        for (future, callback) in self._tk_pending:
+            if not future.done():
+                waiting.append((future, callback))
+                continue
+            try:
+                (status, resp) = future.result()
+            except Exception as err:
+                AppLog.log.error('CAT process error: %s', err)
+                (status, resp) = (False, 'ERROR: ' + str(err))
+            if callback is not None:
+                callback(status, resp)
+        self._tk_pending = waiting
+        if (len(waiting) > 0):
+            globals.root.after(TK_POLL_MS, self._tk_poll)
+        else:
+            self._tk_polling = False
+
+    # ------------------------------------------------------------------------
+    def _run(self, msg_type, payload, callback, want_resp=False):
+        """
+        Make a request.  Without a callback, wait for it and return its
+        status, or its response if want_resp is True.  With a callback,
+        return None at once; the callback is called from the Tk main loop
+        with the status or response.
+        """
+        idx = 1 if want_resp else 0
+        if callback is None:
+            return self.call(msg_type, payload)[idx]
+        self.submit(msg_type, payload, lambda status, resp: callback((status, resp)[idx]))
+        return None
+
+    # ------------------------------------------------------------------------
+    def apply_memory_preset(self, pnum, callback=None):
+        return self._run(MSG_APPLY_MEMORY, PRESET.pack(int(pnum)), callback)
+
+    # ------------------------------------------------------------------------
+    def apply_config_preset(self, pnum, callback=None):
+        return self._run(MSG_APPLY_CONFIG, PRESET.pack(int(pnum)), callback)
+
+    # ------------------------------------------------------------------------
+    def set_frequency(self, freq_hz, callback=None):
+        return self._run(MSG_SET_FREQ, FREQ.pack(int(freq_hz)), callback)
+
+    # ------------------------------------------------------------------------
+    def set_ptt(self, on, callback=None):
+        return self._run(MSG_SET_PTT, FLAG.pack(int(bool(on))), callback)
+
+    # ------------------------------------------------------------------------
+    def set_mode(self, mode, callback=None):
+        return self._run(MSG_SET_MODE, str(mode).encode('utf-8'), callback)
+
+    # ------------------------------------------------------------------------
+    def set_split(self, split, vfob_hz, modeb, callback=None):
+        payload = SPLIT.pack(int(bool(split)), int(vfob_hz)) + str(modeb).encode('utf-8')
+        return self._run(MSG_SET_SPLIT, payload, callback)
+
+    # ------------------------------------------------------------------------
+    def read_rig_state(self):
+        return self.call(MSG_READ_STATE)[0]
+
+    # ------------------------------------------------------------------------
+    def send_command(self, cmd, callback=None):
+        return self._run(MSG_SEND_CMD, str(cmd).encode('utf-8'), callback, want_resp=True)
+
+    # ------------------------------------------------------------------------
+    def ping(self, timeout=START_TIMEOUT):
+        return self.call(MSG_PING, timeout=timeout)[0]
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('CatProcess test program.')
+    globals.init()
+    proc = CatProcess()
+    t0 = time.monotonic()
+    print('Ping: {} ({:0.3f} seconds)'.format(proc.ping(), time.monotonic() - t0))
+    if (len(sys.argv) > 1):
+        print(proc.apply_memory_preset(sys.argv[1]))
+        print(globals.rig_state.snapshot())
+    proc.stop()
@@ -0,0 +1,202 @@
+###############################################################################
+# CatRecorder.py
+# Author: Tom Kerr AB3GY
+#
+# CAT traffic recorder for the pyRigPreset application.
+# Records every byte sent to and received from the rig, with timestamps, to
+# a compact binary file.  Recordings can be played back by CatReplay.py to
+# stand in for the rig.
+#
+# File layout, little endian:
+#
+#   '<4sHd16s'  magic b'PRCR', format version, start time (seconds since the
+#               epoch), rig name (NUL padded)
+#   Then one record per chunk of bytes:
+#   '<QBH'      nanoseconds since the start, direction (0 to the rig, 1 from
+#               the rig), length
+#   bytes       the data
+#
+# The traffic is taken from the port bridge, so the CAT port is opened
+# through a local pseudo-terminal while recording.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import struct
+import threading
+import time
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src import PortBridge
+
+
+##############################################################################
+# Globals.
+##############################################################################
+FILE_HEADER = struct.Struct('<4sHd16s')
+RECORD = struct.Struct('<QBH')
+MAGIC = b'PRCR'
+VERSION = 1
+
+# Record directions.
+TO_RIG = PortBridge.TAP_TX
+FROM_RIG = PortBridge.TAP_RX
+
+# Largest data chunk in one record.
+MAX_CHUNK = 0xFFFF
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def read_recording(filename):
+    """
+    Read a recording file.
+
+    Returns
+    -------
+    (rig, start, records) : tuple
+        rig : str
+            The rig name.
+        start : float
+            The start time in seconds since the epoch.
+        records : list
+            A (seconds since the start, direction, data) tuple for each
+            record.  direction is TO_RIG or FROM_RIG.
+    Raises ValueError if the file is not a recording.
+    """
+    with open(filename, 'rb') as file_in:
+        data = file_in.read()
+    if (len(data) < FILE_HEADER.size):
+        raise ValueError('Not a CAT recording: ' + filename)
+    (magic, version, start, rig) = FILE_HEADER.unpack_from(data)
+    if (magic != MAGIC) or (version != VERSION):
+        raise ValueError('Not a CAT recording: ' + filename)
+    records = []
+    offset = FILE_HEADER.size
+    while (offset + RECORD.size <= len(data)):
+        (t_ns, direction, length) = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        chunk = data[offset:offset+length]
+        if (len(chunk) < length):
+            break   # Truncated by a crash; keep what is complete
+        offset += length
+        records.append((t_ns / 1E9, direction, chunk))
+    return (rig.rstrip(b'\0').decode('utf-8', 'replace'), start, records)
+
+
+##############################################################################
+# CatRecorder class.
+##############################################################################
+class CatRecorder(object):
+    """
+    Records CAT traffic to a file.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, filename, rig=''):
+        self.filename = filename
+        self.rig = str(rig)
+        self.file_out = None
+        self.count = 0       # Number of records written
+        self._lock = threading.Lock()
+        self._t0 = 0
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Create the file and start recording.  Returns True if successful.
+        """
+        if self.file_out is not None:
+            return True
+        try:
+            self.file_out = open(self.filename, 'wb')
+            self.file_out.write(FILE_HEADER.pack(MAGIC, VERSION, time.time(), self.rig.encode('utf-8')[:16]))
+        except OSError as err:
+            print('CAT recorder error: ' + str(err))
+            self.file_out = None
+            return False
+        self._t0 = time.perf_counter_ns()
+        PortBridge.add_tap(self.write)
+        return True
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop recording and close the file.
+        """
+        if self.file_out is None:
+            return
+        PortBridge.remove_tap(self.write)
+        with self._lock:
+            self.file_out.close()
+            self.file_out = None
+
+    # ------------------------------------------------------------------------
+    def write(self, direction, data):
+        """
+        Write a record.  Called on the port bridge threads.
+        """
+        t_ns = time.perf_counter_ns() - self._t0
+        with self._lock:
+            if self.file_out is None:
+                return
+            for idx in range(0, len(data), MAX_CHUNK):
+                chunk = data[idx:idx+MAX_CHUNK]
+                self.file_out.write(RECORD.pack(t_ns, direction, len(chunk)))
+                self.file_out.write(chunk)
+                self.count += 1
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    # Print a recording.
+    import sys
+    if (len(sys.argv) < 2):
+        print('Usage: CatRecorder.py <recording>')
+        sys.exit(1)
+    (rig, start, records) = read_recording(sys.argv[1])
+    print('Rig: {}  Start: {}  Records: {}'.format(
+        rig, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start)), len(records)))
+    for (t, direction, data) in records:
+        arrow = '->' if (direction == TO_RIG) else '<-'
+        print('{:12.6f} {} {} {!r}'.format(t, arrow, data.hex(' '), data))
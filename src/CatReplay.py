@@ -0,0 +1,233 @@
+###############################################################################
+# CatReplay.py
+# Author: Tom Kerr AB3GY
+#
+# CAT replay transport for the pyRigPreset application.
+# Impersonates a rig on a pseudo-terminal by playing back a recording made by
+# CatRecorder.py.  Each command received is matched against the next command
+# in the recording, and the responses that followed it are sent back with
+# their recorded timing, optionally scaled.  Set the CAT port to the
+# pseudo-terminal or its link to use the recording in place of the rig.
+#
+# Requires a POSIX operating system.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import os
+import select
+import threading
+import time
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src.CatRecorder import FROM_RIG, TO_RIG, read_recording
+from src.PtySplitter import VirtualPort
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Seconds between reads while idle.
+POLL_TIME = 0.1
+
+
+##############################################################################
+# ReplayPort class.
+##############################################################################
+class ReplayPort(object):
+    """
+    Plays back a CAT recording on a pseudo-terminal.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, filename, scale=1.0, link='', loop=False):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        filename : str
+            The recording file.
+        scale : float
+            Response delay multiplier.  1.0 replays the original timing,
+            0.5 replays twice as fast and 0 responds immediately.
+        link : str
+            Optional symbolic link to the pseudo-terminal.
+        loop : bool
+            True to start again from the beginning at the end of the
+            recording, False to stop responding.
+        """
+        (self.rig, self.start_time, self.records) = read_recording(filename)
+        self.scale = max(0.0, float(scale))
+        self.loop = loop
+        self.port = VirtualPort(link)
+        self.name = self.port.name   # The device name to open
+        self.matched = 0             # Commands matched in order
+        self.resyncs = 0             # Commands found out of order
+        self.unmatched = 0           # Commands not in the recording
+        self._idx = 0
+        self._inbuf = b''
+        self._running = False
+        self._thread = None
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='CatReplay', daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.port.close()
+
+    # ------------------------------------------------------------------------
+    def _run(self):
+        # Data the rig sent before the first command, such as a CI-V
+        # transceive frame.
+        self._respond(0.0)
+        while self._running:
+            try:
+                (r, w, x) = select.select([self.port.master], [], [], POLL_TIME)
+                if not r:
+                    continue
+                data = os.read(self.port.master, 4096)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                break
+            self._inbuf += data
+            self._match()
+
+    # ------------------------------------------------------------------------
+    def _match(self):
+        """
+        Consume recorded commands found at the start of the input buffer.
+        """
+        while (len(self._inbuf) > 0) and self._running:
+            if (self._idx >= len(self.records)):
+                if not self.loop or (len(self.records) == 0):
+                    self.unmatched += 1
+                    self._inbuf = b''
+                    return
+                self._idx = 0
+            (t, direction, data) = self.records[self._idx]
+            if (direction != TO_RIG):
+                self._idx += 1
+                continue
+            if self._inbuf.startswith(data):
+                self._inbuf = self._inbuf[len(data):]
+                self._idx += 1
+                self.matched += 1
+                self._respond(t)
+            elif data.startswith(self._inbuf):
+                return   # Wait for the rest of the command
+            elif not self._resync():
+                self.unmatched += 1
+                self._inbuf = b''
+                return
+
+    # ------------------------------------------------------------------------
+    def _resync(self):
+        """
+        Find the next recorded command that matches the input buffer.
+        Returns True if found.
+        """
+        count = len(self.records)
+        for n in range(1, count):
+            idx = self._idx + n
+            if (idx >= count):
+                if not self.loop:
+                    return False
+                idx -= count
+            (t, direction, data) = self.records[idx]
+            if (direction == TO_RIG) and \
+                    (self._inbuf.startswith(data) or data.startswith(self._inbuf)):
+                self._idx = idx
+                self.resyncs += 1
+                return True
+        return False
+
+    # ------------------------------------------------------------------------
+    def _respond(self, t_cmd):
+        """
+        Send the responses that follow the current position, with their
+        recorded delays.
+        """
+        t_prev = t_cmd
+        while (self._idx < len(self.records)) and self._running:
+            (t, direction, data) = self.records[self._idx]
+            if (direction != FROM_RIG):
+                break
+            delay = (t - t_prev) * self.scale
+            if (delay > 0):
+                time.sleep(delay)
+            t_prev = t
+            self.port.write(data)
+            self._idx += 1
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('CatReplay test program.')
+    if (len(sys.argv) < 2):
+        print('Usage: CatReplay.py <recording> [scale] [link]')
+        sys.exit(1)
+    scale = float(sys.argv[2]) if (len(sys.argv) > 2) else 1.0
+    link = sys.argv[3] if (len(sys.argv) > 3) else ''
+    replay = ReplayPort(sys.argv[1], scale, link, loop=True)
+    print('Replaying {} ({}, {} records) on {}'.format(
+        sys.argv[1], replay.rig, len(replay.records), link or replay.name))
+    replay.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    replay.stop()
+    print('Matched: {}  Resynced: {}  Unmatched: {}'.format(
+        replay.matched, replay.resyncs, replay.unmatched))
@@ -49,6 +49,8 @@ import configparser
 import datetime
 
 # Local packages.
+from src import Metrics
+from src import Tracer
 
 
 ##############################################################################
@@ -260,14 +262,15 @@ class ConfigFile(object):
                 return (status, err_msg)
 
         # Write the file.
-        try:
-            file_out = open(self.ini_file, 'w')
-            self.config.write(file_out)
-            status = True
-        except Exception as err:
-            status = False
-            err_msg = str(err)
-        self._close(file_out)
+        with Metrics.config_write_seconds.time(), Tracer.span('ConfigFile.write', 'config'):
+            try:
+                file_out = open(self.ini_file, 'w')
+                self.config.write(file_out)
+                status = True
+            except Exception as err:
+                status = False
+                err_msg = str(err)
+            self._close(file_out)
         
         return (status, err_msg)
         
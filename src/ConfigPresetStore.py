@@ -49,6 +49,7 @@ import _env_init
 # Local packages.
 import globals
 from src.pyRigPresetUtils import *
+from src import StartupProfiler as profiler
 from src.ConfigFile import ConfigFile
 
 
@@ -95,7 +96,8 @@ class ConfigPresetStore(object):
         self._preset_name = ''  # Preset description
         self._cmd = [''] * globals.NUM_CONFIG_COMMANDS  # List of configuration commands
 
-        self.init()
+        with profiler.phase('{}({}).init'.format(self.__class__.__name__, self._id)):
+            self.init()
 
     # ------------------------------------------------------------------------
     def get_id(self):
@@ -0,0 +1,314 @@
+###############################################################################
+# ControlClient.py
+# Author: Tom Kerr AB3GY
+#
+# Control socket client for the pyRigPreset application.
+# Sends commands to a running pyRigPreset instance.  Kept free of other
+# application imports so that forwarding a command is fast.
+#
+# Uses a Unix domain socket, or a TCP socket bound to localhost on Windows.
+# Messages are JSON-RPC 2.0, one JSON object or batch array per line:
+#
+#   --> {"jsonrpc": "2.0", "method": "apply_memory", "params": [12], "id": 1}
+#   <-- {"jsonrpc": "2.0", "result": true, "id": 1}
+#
+# Methods:
+#   list_presets()           Memory and configuration preset lists
+#   apply_memory(preset)     Apply a memory preset
+#   apply_config(preset)     Apply a configuration preset
+#   set_frequency(freq_hz)   Set the VFO-A frequency
+#   set_ptt(on)              Turn PTT on or off
+#   send(cmd)                Send a transceiver command, returns the response
+#   get_state()              The transceiver state
+#   subscribe()              Send a "state" notification on every change
+#   unsubscribe()            Stop state notifications
+#   run(args)                Run a command line interface command
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+from collections import deque
+import json
+import os
+import socket
+import stat
+import tempfile
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Control socket name prefix.
+SOCKET_NAME = 'pyRigPreset'
+
+# TCP port used where Unix domain sockets are not available.
+CONTROL_TCP_PORT = 45321
+
+# Seconds to wait for a running instance to reply.
+CLIENT_TIMEOUT = 30.0
+
+# Seconds to wait when checking for a running instance.
+CONNECT_TIMEOUT = 0.25
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def use_unix_socket():
+    """
+    Return True if Unix domain sockets are used on this operating system.
+    """
+    return hasattr(socket, 'AF_UNIX')
+
+# ------------------------------------------------------------------------
+def socket_dir():
+    """
+    Return a directory only this user can write, for the control socket:
+    $XDG_RUNTIME_DIR, or a private directory in the temporary directory.
+    Raises OSError if the private directory belongs to another user or can
+    be written by others.
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR', '')
+    if (len(runtime_dir) > 0) and os.path.isdir(runtime_dir):
+        st = os.stat(runtime_dir)
+        if (st.st_uid == os.getuid()) and ((st.st_mode & 0o077) == 0):
+            return runtime_dir
+    path = os.path.join(tempfile.gettempdir(), '{}-{}'.format(SOCKET_NAME, os.getuid()))
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    # Do not follow a link, and do not trust a directory made by someone else.
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or (st.st_uid != os.getuid()):
+        raise OSError('Control socket directory not owned by this user: ' + path)
+    if ((st.st_mode & 0o077) != 0):
+        os.chmod(path, 0o700)
+    return path
+
+# ------------------------------------------------------------------------
+def server_address():
+    """
+    Return the control socket address, a path for a Unix domain socket or
+    a (host, port) tuple for TCP.  Raises OSError if there is no safe
+    directory for the socket.
+    """
+    if use_unix_socket():
+        return os.path.join(socket_dir(), SOCKET_NAME + '.sock')
+    return ('127.0.0.1', CONTROL_TCP_PORT)
+
+# ------------------------------------------------------------------------
+def connect(timeout=CONNECT_TIMEOUT):
+    """
+    Connect to a running pyRigPreset instance.
+
+    Returns
+    -------
+    conn : ControlConnection object
+        The connection, or None if no instance is running.
+    """
+    family = socket.AF_UNIX if use_unix_socket() else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        # OSError also covers an unsafe socket directory.
+        sock.connect(server_address())
+    except OSError:
+        sock.close()
+        return None
+    return ControlConnection(sock)
+
+# ------------------------------------------------------------------------
+def send_request(args, timeout=CLIENT_TIMEOUT):
+    """
+    Send a command line interface command to a running pyRigPreset instance.
+
+    Parameters
+    ----------
+    args : list
+        The command and its arguments.
+    timeout : float
+        Seconds to wait for the reply.
+
+    Returns
+    -------
+    reply : tuple
+        An (ok, result) tuple, or None if no instance is running.
+    """
+    conn = connect()
+    if conn is None:
+        return None
+    try:
+        conn.sock.settimeout(timeout)
+        reply = conn.call('run', {'args': list(args)})
+        return (bool(reply.get('ok')), reply.get('result'))
+    except (OSError, ValueError, RpcError) as err:
+        return (False, str(err))
+    finally:
+        conn.close()
+
+
+##############################################################################
+# RpcError class.
+##############################################################################
+class RpcError(Exception):
+    """
+    Error returned by a JSON-RPC call.
+    """
+    def __init__(self, code, message):
+        Exception.__init__(self, '{} ({})'.format(message, code))
+        self.code = code
+        self.message = message
+
+
+##############################################################################
+# ControlConnection class.
+##############################################################################
+class ControlConnection(object):
+    """
+    Persistent JSON-RPC 2.0 connection to a running pyRigPreset instance.
+    Many requests may be sent over one connection.  State notifications
+    received while waiting for a reply are queued, see notification().
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, sock):
+        self.sock = sock
+        self.file_in = sock.makefile('rb')
+        self.next_id = 1
+        self.notifications = deque()
+
+    # ------------------------------------------------------------------------
+    def close(self):
+        try:
+            self.file_in.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------------
+    def _send(self, obj):
+        self.sock.sendall(json.dumps(obj).encode('utf-8') + b'\n')
+
+    # ------------------------------------------------------------------------
+    def _read(self):
+        """
+        Read the next reply, queueing any notifications.
+        """
+        while True:
+            line = self.file_in.readline()
+            if (len(line) == 0):
+                raise ConnectionError('Connection closed by ' + SOCKET_NAME)
+            msg = json.loads(line.decode('utf-8'))
+            if isinstance(msg, dict) and ('method' in msg) and ('id' not in msg):
+                self.notifications.append(msg)
+                continue
+            return msg
+
+    # ------------------------------------------------------------------------
+    def _request(self, method, params):
+        req = {'jsonrpc': '2.0', 'method': method, 'id': self.next_id}
+        if params is not None:
+            req['params'] = params
+        self.next_id += 1
+        return req
+
+    # ------------------------------------------------------------------------
+    def call(self, method, params=None):
+        """
+        Call a method and return its result.  Raises RpcError on error.
+        """
+        self._send(self._request(method, params))
+        reply = self._read()
+        if 'error' in reply:
+            raise RpcError(reply['error'].get('code'), reply['error'].get('message'))
+        return reply.get('result')
+
+    # ------------------------------------------------------------------------
+    def batch(self, calls):
+        """
+        Call several methods in one batch request.
+
+        Parameters
+        ----------
+        calls : list
+            A list of (method, params) tuples.
+
+        Returns
+        -------
+        results : list
+            The result of each call, in order, or an RpcError object for
+            each call that failed.
+        """
+        reqs = [self._request(method, params) for (method, params) in calls]
+        self._send(reqs)
+        replies = self._read()
+        by_id = {r.get('id'): r for r in replies}
+        results = []
+        for req in reqs:
+            reply = by_id.get(req['id'], {})
+            if 'error' in reply:
+                results.append(RpcError(reply['error'].get('code'), reply['error'].get('message')))
+            else:
+                results.append(reply.get('result'))
+        return results
+
+    # ------------------------------------------------------------------------
+    def notification(self):
+        """
+        Return the state snapshot from the next state notification,
+        waiting for one if none are queued.
+        """
+        while (len(self.notifications) == 0):
+            # Any reply read here has no outstanding request and is dropped.
+            self._read()
+        return self.notifications.popleft().get('params')
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('ControlClient test program.')
+    conn = connect()
+    if conn is None:
+        print('No running instance.')
+        sys.exit(1)
+    print(conn.call('list_presets'))
+    print(conn.batch([('get_state', None), ('no_such_method', None)]))
+    conn.close()
@@ -0,0 +1,462 @@
+###############################################################################
+# ControlServer.py
+# Author: Tom Kerr AB3GY
+#
+# Local control socket for the pyRigPreset application.
+# Lets the command line interface and other local programs apply presets
+# through a running pyRigPreset instance, which already has the config file
+# loaded, instead of opening the serial port themselves.
+#
+# See ControlClient.py for the socket address and the JSON-RPC methods.
+# Requests go through the same preset engine and CAT lock as the GUI widgets.
+# A connection may stay open for any number of requests, and a client that
+# subscribes receives a notification on every transceiver state change.
+#
+# This module does not use tkinter.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+from src import AppLog
+from src import PresetEngine
+from src.pyRigPresetUtils import to_int
+from src.ConfigPresetStore import ConfigPresetStore
+from src.MemoryPresetStore import MemoryPresetStore
+from src.ControlClient import CONNECT_TIMEOUT, send_request, server_address, use_unix_socket
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Command line usage.
+USAGE = '''Commands:
+  apply memory <n>     Apply memory preset n
+  apply config <n>     Apply configuration preset n
+  freq <MHz>           Set the VFO-A frequency
+  ptt on|off           Turn PTT on or off
+  cmd <command>        Send a transceiver command
+  state                Show the transceiver state
+  log <level> [logger] Set the log level, such as DEBUG or WARNING'''
+
+# JSON-RPC 2.0 error codes.
+PARSE_ERROR      = -32700
+INVALID_REQUEST  = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS   = -32602
+INTERNAL_ERROR   = -32603
+
+# Messages waiting to be sent to one client.  A subscriber that falls this
+# far behind is dropped.
+SEND_QUEUE_MAX = 100
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def run_command(args):
+    """
+    Run a command line interface command.
+
+    Parameters
+    ----------
+    args : list
+        The command and its arguments, such as ['apply', 'memory', '12'].
+
+    Returns
+    -------
+    (ok, result) : tuple
+        ok : bool
+            True if successful, False otherwise.
+        result : str or dict
+            The command result or an error message.
+    """
+    args = [str(a) for a in args]
+    if (len(args) == 0):
+        return (False, USAGE)
+    cmd = args[0].lower()
+    try:
+        if (cmd == 'apply') and (len(args) == 3):
+            kind = args[1].lower()
+            pnum = to_int(args[2])
+            if (kind in ('memory', 'mem', 'm')):
+                if (pnum < 1) or (pnum > globals.NUM_MEMORY_PRESETS):
+                    return (False, 'Invalid memory preset: ' + args[2])
+                ok = PresetEngine.apply_memory_preset(pnum)
+            elif (kind in ('config', 'cfg', 'c')):
+                if (pnum < 1) or (pnum > globals.NUM_CONFIG_PRESETS):
+                    return (False, 'Invalid configuration preset: ' + args[2])
+                ok = PresetEngine.apply_config_preset(pnum)
+            else:
+                return (False, 'Unknown preset type: ' + args[1])
+            return (ok, 'OK' if ok else 'ERROR')
+        elif (cmd == 'freq') and (len(args) == 2):
+            freq_hz = int(round(float(args[1]) * 1E6))
+            ok = PresetEngine.set_frequency(freq_hz)
+            return (ok, 'OK' if ok else 'ERROR')
+        elif (cmd == 'ptt') and (len(args) == 2) and (args[1].lower() in ('on', 'off')):
+            ok = PresetEngine.set_ptt(args[1].lower() == 'on')
+            return (ok, 'OK' if ok else 'ERROR')
+        elif (cmd == 'cmd') and (len(args) > 1):
+            resp = PresetEngine.send_command(' '.join(args[1:]))
+            return (('ERROR' not in resp), resp)
+        elif (cmd == 'state'):
+            return (True, globals.rig_state.snapshot())
+        elif (cmd == 'log') and (len(args) in (2, 3)):
+            return (True, AppLog.set_level(*args[1:]))
+    except ValueError as err:
+        return (False, str(err))
+    return (False, USAGE)
+
+# ------------------------------------------------------------------------
+def list_presets():
+    """
+    Return the memory and configuration preset lists.
+    """
+    memory = []
+    for pnum in range(1, globals.NUM_MEMORY_PRESETS + 1):
+        preset = MemoryPresetStore(pnum)
+        memory.append({
+            'id': pnum,
+            'desc': preset.get_preset_desc(),
+            'vfoa_mhz': preset.get_vfoa_freq_mhz(),
+            'vfob_mhz': preset.get_vfob_freq_mhz(),
+            'modea': preset.get_modea(),
+            'modeb': preset.get_modeb(),
+            'split': preset.get_split()})
+    config = []
+    for pnum in range(1, globals.NUM_CONFIG_PRESETS + 1):
+        preset = ConfigPresetStore(pnum)
+        config.append({'id': pnum, 'name': preset.get_preset_name()})
+    return {'memory': memory, 'config': config}
+
+# ------------------------------------------------------------------------
+def _rpc_apply_memory(preset):
+    pnum = to_int(preset)
+    if (pnum < 1) or (pnum > globals.NUM_MEMORY_PRESETS):
+        raise ValueError('Invalid memory preset: ' + str(preset))
+    return PresetEngine.apply_memory_preset(pnum)
+
+# ------------------------------------------------------------------------
+def _rpc_apply_config(preset):
+    pnum = to_int(preset)
+    if (pnum < 1) or (pnum > globals.NUM_CONFIG_PRESETS):
+        raise ValueError('Invalid configuration preset: ' + str(preset))
+    return PresetEngine.apply_config_preset(pnum)
+
+# ------------------------------------------------------------------------
+def _rpc_run(args):
+    (ok, result) = run_command(args)
+    return {'ok': ok, 'result': result}
+
+# ------------------------------------------------------------------------
+def _rpc_error(req_id, code, message):
+    return {'jsonrpc': '2.0', 'error': {'code': code, 'message': message}, 'id': req_id}
+
+# Methods that do not depend on the connection.
+RPC_METHODS = {
+    'list_presets':  list_presets,
+    'apply_memory':  _rpc_apply_memory,
+    'apply_config':  _rpc_apply_config,
+    'set_frequency': lambda freq_hz: PresetEngine.set_frequency(int(freq_hz)),
+    'set_ptt':       lambda on: PresetEngine.set_ptt(bool(on)),
+    'send':          lambda cmd: PresetEngine.send_command(str(cmd)),
+    'get_state':     lambda: globals.rig_state.snapshot(),
+    'set_log_level': AppLog.set_level,
+    'run':           _rpc_run,
+}
+
+
+##############################################################################
+# ControlServer class.
+##############################################################################
+class ControlServer(object):
+    """
+    Serves control socket requests on a background thread.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self):
+        self.server = None
+        self.thread = None
+        self.address = None
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Start serving requests.
+
+        Returns
+        -------
+        status : bool
+            True if the server started, False otherwise, such as when
+            another instance is already serving.
+        """
+        if self.server is not None:
+            return True
+        try:
+            self.address = server_address()
+            if use_unix_socket():
+                if os.path.exists(self.address):
+                    if (send_request(['state'], timeout=CONNECT_TIMEOUT) is not None):
+                        print('Control socket in use by another instance.')
+                        return False
+                    # Stale socket from an instance that did not shut down.
+                    os.unlink(self.address)
+                self.server = _UnixServer(self.address, _RequestHandler)
+                os.chmod(self.address, 0o600)
+            else:
+                self.server = _TcpServer(self.address, _RequestHandler)
+        except OSError as err:
+            print('Control socket error: ' + str(err))
+            self.server = None
+            return False
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            name='ControlServer',
+            daemon=True)
+        self.thread.start()
+        return True
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop serving requests.
+        """
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        if use_unix_socket():
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+
+
+##############################################################################
+# Server classes.
+##############################################################################
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one client connection, one JSON-RPC request or batch per line.
+    """
+    # ------------------------------------------------------------------------
+    def setup(self):
+        socketserver.StreamRequestHandler.setup(self)
+        self.listener = None
+        # Replies and state notifications are written by their own thread,
+        # so a client that stops reading never blocks a rig state update.
+        self.send_queue = queue.Queue(maxsize=SEND_QUEUE_MAX)
+        self.writer = threading.Thread(target=self._writer, name='ControlWriter', daemon=True)
+        self.writer.start()
+
+    # ------------------------------------------------------------------------
+    def handle(self):
+        try:
+            for line in self.rfile:
+                if (len(line.strip()) == 0):
+                    continue
+                reply = self._handle_line(line)
+                if reply is not None:
+                    self._send(reply)
+        except OSError:
+            pass
+        finally:
+            self._unsubscribe()
+            self._close_writer()
+
+    # ------------------------------------------------------------------------
+    def _send(self, obj):
+        """
+        Queue a reply.  Waits if the client is behind.
+        """
+        self.send_queue.put(json.dumps(obj).encode('utf-8') + b'\n')
+
+    # ------------------------------------------------------------------------
+    def _writer(self):
+        """
+        Client writer thread.
+        """
+        while True:
+            data = self.send_queue.get()
+            if data is None:
+                break
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except (OSError, ValueError):
+                self._drop()
+                break
+
+    # ------------------------------------------------------------------------
+    def _close_writer(self):
+        try:
+            self.send_queue.put(None, timeout=1.0)
+        except queue.Full:
+            self._drop()
+        self.writer.join(timeout=1.0)
+
+    # ------------------------------------------------------------------------
+    def _drop(self):
+        """
+        Disconnect the client.  Unblocks the reader and writer threads.
+        """
+        self._unsubscribe()
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------------
+    def _handle_line(self, line):
+        """
+        Handle one request or batch.  Returns the reply, or None if there
+        is nothing to send.
+        """
+        try:
+            req = json.loads(line.decode('utf-8'))
+        except ValueError:
+            return _rpc_error(None, PARSE_ERROR, 'Parse error')
+        if isinstance(req, list):
+            if (len(req) == 0):
+                return _rpc_error(None, INVALID_REQUEST, 'Invalid request')
+            replies = [self._handle_request(r) for r in req]
+            replies = [r for r in replies if r is not None]
+            return replies if (len(replies) > 0) else None
+        return self._handle_request(req)
+
+    # ------------------------------------------------------------------------
+    def _handle_request(self, req):
+        """
+        Handle one request.  Returns the reply, or None for a notification.
+        """
+        if not isinstance(req, dict):
+            return _rpc_error(None, INVALID_REQUEST, 'Invalid request')
+        req_id = req.get('id')
+        method = req.get('method')
+        params = req.get('params', [])
+        if (req.get('jsonrpc') != '2.0') or not isinstance(method, str) or \
+                not isinstance(params, (list, dict)):
+            return _rpc_error(req_id, INVALID_REQUEST, 'Invalid request')
+
+        if (method == 'subscribe'):
+            fn = self._subscribe
+        elif (method == 'unsubscribe'):
+            fn = self._unsubscribe
+        else:
+            fn = RPC_METHODS.get(method)
+        if fn is None:
+            reply = _rpc_error(req_id, METHOD_NOT_FOUND, 'Method not found: ' + method)
+        else:
+            try:
+                if isinstance(params, dict):
+                    result = fn(**params)
+                else:
+                    result = fn(*params)
+                reply = {'jsonrpc': '2.0', 'result': result, 'id': req_id}
+            except (TypeError, ValueError) as err:
+                reply = _rpc_error(req_id, INVALID_PARAMS, str(err))
+            except Exception as err:
+                reply = _rpc_error(req_id, INTERNAL_ERROR, str(err))
+
+        if 'id' not in req:
+            return None  # Notification, no reply
+        return reply
+
+    # ------------------------------------------------------------------------
+    def _subscribe(self):
+        """
+        Send a state notification on every transceiver state change.
+        Returns the current state.
+        """
+        if self.listener is None:
+            self.listener = self._on_state_change
+            globals.rig_state.add_listener(self.listener)
+        return globals.rig_state.snapshot()
+
+    # ------------------------------------------------------------------------
+    def _unsubscribe(self):
+        if self.listener is not None:
+            globals.rig_state.remove_listener(self.listener)
+            self.listener = None
+        return True
+
+    # ------------------------------------------------------------------------
+    def _on_state_change(self, snap):
+        # Called on the thread that changed the state, which may hold the
+        # CAT lock, so never wait here.
+        data = json.dumps({'jsonrpc': '2.0', 'method': 'state', 'params': snap}).encode('utf-8') + b'\n'
+        try:
+            self.send_queue.put_nowait(data)
+        except queue.Full:
+            AppLog.log.warning('Control client not reading; dropped')
+            self._drop()
+
+
+if hasattr(socketserver, 'ThreadingUnixStreamServer'):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:
+    _UnixServer = None
+
+
+class _TcpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = False
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('ControlServer test program.')
+    print(send_request(sys.argv[1:] or ['state']))
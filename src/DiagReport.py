@@ -0,0 +1,157 @@
+###############################################################################
+# DiagReport.py
+# Author: Tom Kerr AB3GY
+#
+# Shared option parsing and report writing for the pyRigPreset diagnostic
+# modules, such as the startup profiler and the event tracer.
+#
+# A diagnostic is enabled by environment variable or command line argument:
+#   <ENV_VAR>=1 or <ENV_VAR>=<file>
+#   --<flag> or --<flag>=<file>
+#
+# Diagnostics are never enabled in a multiprocessing child process, such as
+# the CAT process.  The child re-imports the application script, so it would
+# otherwise start its own profiler or tracer and write the same file.
+#
+# This module must not import any other application modules, since the
+# startup profiler uses it before anything else is imported.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import json
+import os
+import sys
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def in_child_process():
+    """
+    Return True if running in a multiprocessing child process.
+    A child process has always imported multiprocessing, so it is not
+    imported here just to check.
+    """
+    mp = sys.modules.get('multiprocessing')
+    return (mp is not None) and (mp.current_process().name != 'MainProcess')
+
+# ------------------------------------------------------------------------
+def option_file(argv, env_var, arg, default_file):
+    """
+    Return the report file selected by environment variable or command
+    line argument.
+
+    Parameters
+    ----------
+    argv : list
+        The command line argument list.
+    env_var : str
+        The environment variable name, such as 'PYRIGPRESET_TRACE'.
+    arg : str
+        The command line argument, such as '--trace'.
+    default_file : str
+        The file name used when no file is given.  The default file is in
+        the same directory as the application script.
+
+    Returns
+    -------
+    file_name : str
+        The report file name, or an empty string if the diagnostic is not
+        enabled.
+    """
+    if in_child_process():
+        return ''
+    file_name = ''
+    env = os.environ.get(env_var, '').strip()
+    if (len(env) > 0) and (env != '0'):
+        file_name = env
+    for a in argv[1:]:
+        if (a == arg):
+            file_name = '1'
+        elif a.startswith(arg + '='):
+            file_name = a[len(arg)+1:]
+    if (file_name == '1'):
+        script_path = os.path.dirname(os.path.realpath(argv[0]))
+        file_name = os.path.join(script_path, default_file)
+    return file_name
+
+# ------------------------------------------------------------------------
+def write_json(file_name, data, what, indent=None):
+    """
+    Write a report as a JSON file and print where it went.
+
+    Parameters
+    ----------
+    file_name : str
+        The report file name.
+    data : dict
+        The report data.
+    what : str
+        The report description used in messages, such as 'Trace'.
+    indent : int
+        Optional JSON indent level.
+
+    Returns
+    -------
+    (status, err_msg) : tuple
+        status : bool
+            True if the report was written, False otherwise.
+        err_msg : str
+            Error message if an error occurred.
+    """
+    status = True
+    err_msg = ''
+    try:
+        with open(file_name, 'w') as file_out:
+            json.dump(data, file_out, indent=indent)
+        print('{} written to {}'.format(what, file_name))
+    except Exception as err:
+        status = False
+        err_msg = str(err)
+        print('{} write error: {}'.format(what, err_msg))
+    return (status, err_msg)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('DiagReport test program.')
+    file_name = option_file([sys.argv[0], '--report'], 'PYRIGPRESET_REPORT', '--report', 'DiagReport.json')
+    print('Report file: ' + file_name)
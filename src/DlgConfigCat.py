@@ -41,16 +41,20 @@
 ###############################################################################
 
 # System level packages.
+import threading
 from serial.tools import list_ports as lp
 
 # Tkinter packages.
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk
+from tkinter.messagebox import showinfo
 
 # Local packages.
 import globals
-from src.pyRigPresetUtils import set_geometry
+from src.pyRigPresetUtils import get_font, set_geometry
+from src.RigAutoDetect import detect_rigs
+from src import PortBridge
+from src.RigCat import exclusive_port
 
 
 ##############################################################################
@@ -91,6 +95,8 @@ stop_list = (
     '2',
 )
 
+_dlg = None  # The shared dialog box object
+
 
 ##############################################################################
 # Functions.
@@ -100,13 +106,51 @@ stop_list = (
 def get_serial_ports():
     """
     Return a list of serial ports on this machine.
+    Uses the cached serial port inventory if it is running.
     """
+    if globals.port_inventory is not None:
+        return globals.port_inventory.get_devices()
     port_list = []
     ports = lp.comports()
     for p in ports:
         port_list.append(p.device)
     return port_list
 
+# ------------------------------------------------------------------------
+def get_serial_number(port):
+    """
+    Return the USB serial number of a serial port, or an empty string if
+    it is not known.
+    """
+    if globals.port_inventory is not None:
+        return globals.port_inventory.get_serial_number(port)
+    for p in lp.comports():
+        if (p.device == port):
+            return str(p.serial_number or '')
+    return ''
+
+# ------------------------------------------------------------------------
+def get_dlg_config_cat(root):
+    """
+    Return the shared CAT interface dialog box object.
+    The dialog box is built on first use and reused for every CAT interface.
+    
+    Parameters
+    ----------
+    root : Tk object
+        Any widget in the application.  The dialog box is created as a child
+        of its top level window.
+    
+    Returns
+    -------
+    dlg : DlgConfigCat object
+        The shared dialog box object.
+    """
+    global _dlg
+    if (_dlg is None) or not _dlg.exists():
+        _dlg = DlgConfigCat(root.winfo_toplevel())
+    return _dlg
+
 
 ##############################################################################
 # DlgConfigCat class.
@@ -119,26 +163,31 @@ class DlgConfigCat(object):
     """
 
     # ------------------------------------------------------------------------
-    def __init__(self, root, id):
+    def __init__(self, root):
         """
         Class constructor.
+        The dialog box is created hidden.  Use show() to display it.
     
         Parameters
         ----------
         root : Tk object
             The pySatCat application root window.
-        id : int
-            The CAT interface ID.
         
         Returns
         -------
         None.
         """
         self.root = root            # The root window
-        self.id = id                # The CAT interface ID
+        self.id = 0                 # The CAT interface ID
         self.dlg_config_cat = tk.Toplevel(self.root)
-        self.dlg_config_cat.title('CAT Interface {} Configuration'.format(id))
-        self.section = 'CAT_PRESET{:03d}'.format(id)  # CAT interface preset section in config file
+        self.dlg_config_cat.withdraw()
+        self.dlg_config_cat.protocol('WM_DELETE_WINDOW', self._dlg_config_cat_cancel)
+        self.section = ''           # CAT interface preset section in config file
+        self.mnu_rig = None         # Rig selection menu
+        self.cmb_port = None        # Port selection combo box
+        self.btn_detect = None      # Auto-detect button
+        self.detect_thread = None   # Auto-detect background thread
+        self.detect_results = []    # Auto-detect results
         
         # Control variables.
         self.name_text      = tk.StringVar(self.root)
@@ -148,9 +197,45 @@ class DlgConfigCat(object):
         self.parity_text    = tk.StringVar(self.root)
         self.stop_bits_text = tk.StringVar(self.root)
         self.data_bits_text = tk.StringVar(self.root)
+        self.closed         = tk.BooleanVar(self.root)  # Set when the dialog box is closed
 
         self._dlg_init()
 
+    # ------------------------------------------------------------------------
+    def exists(self):
+        """
+        Return True if the dialog box window still exists, False otherwise.
+        """
+        try:
+            return bool(self.dlg_config_cat.winfo_exists())
+        except tk.TclError:
+            return False
+
+    # ------------------------------------------------------------------------
+    def show(self, id):
+        """
+        Display the dialog box for the specified CAT interface and wait for
+        it to be closed.
+    
+        Parameters
+        ----------
+        id : int
+            The CAT interface ID.
+        
+        Returns
+        -------
+        None.
+        """
+        self.id = id
+        self.section = 'CAT_PRESET{:03d}'.format(id)
+        self.dlg_config_cat.title('CAT Interface {} Configuration'.format(id))
+        self._dlg_load()
+        self.closed.set(False)
+        self.dlg_config_cat.deiconify()
+        self.mnu_rig.focus_set()
+        self.dlg_config_cat.grab_set() # Make the dialog modal
+        self.dlg_config_cat.wait_variable(self.closed)
+
     # ------------------------------------------------------------------------
     def _dlg_init(self):
         """
@@ -161,41 +246,6 @@ class DlgConfigCat(object):
         global parity_list
         global stop_list
         
-        # Initialize parameters.
-        
-        # Build the list of serial ports on this machine.
-        port_list = ['NONE']
-        serial_list = get_serial_ports()
-        for s in serial_list:
-            port_list.append(s)
-        
-        # Get existing config settings.
-        name = str(globals.config.get(self.section, 'NAME'))
-        if (len(name) > 0): self.name_text.set(name)
-        else: self.name_text.set('Rig {}'.format(self.id))
-        
-        rig = str(globals.config.get(self.section, 'RIG'))
-        if (len(rig) > 0): self.rig_text.set(rig)
-        else: self.rig_text.set(globals.RIG_LIST[0])
-        
-        port = str(globals.config.get(self.section, 'PORT'))
-        if (len(port) > 0): self.port_text.set(port)
-        else: self.port_text.set(port_list[0])
-        
-        self.baud_text.set(str(globals.config.get(self.section, 'BAUD')))
-        
-        data = str(globals.config.get(self.section, 'DATA'))
-        if (len(data) > 0): self.data_bits_text.set(data)
-        else: self.data_bits_text.set('8')
-        
-        parity = str(globals.config.get(self.section, 'PARITY'))
-        if (len(parity) > 0): self.parity_text.set(parity)
-        else: self.parity_text.set('NONE')
-        
-        stop = str(globals.config.get(self.section, 'STOP'))
-        if (len(stop) > 0): self.stop_bits_text.set(stop)
-        else: self.stop_bits_text.set('1')
-        
         row = 0
         
         # Configuration name.
@@ -204,28 +254,31 @@ class DlgConfigCat(object):
             self.dlg_config_cat,
             width=12,
             textvariable=self.name_text,
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         tb_name.grid(row=row, column=1, padx=6, pady=3, sticky='W')
         row += 1
         
         # Rig selection menu.
         ttk.Label(self.dlg_config_cat, text='Rig:  ').grid(row=row, column=0, padx=3, pady=6, sticky='E')
-        mnu_rig = tk.OptionMenu(
+        self.mnu_rig = tk.OptionMenu(
             self.dlg_config_cat,
             self.rig_text,
             *globals.RIG_LIST)
-        mnu_rig.config(width=10)
-        mnu_rig.grid(row=row, column=1, padx=6, pady=3, sticky='W')
+        self.mnu_rig.config(width=10)
+        self.mnu_rig.grid(row=row, column=1, padx=6, pady=3, sticky='W')
         row += 1
         
         # Port selection menu.
+        # Editable, so that a serial over TCP URL, or a rigctld host:port
+        # address for the NET rig, can be entered.
         ttk.Label(self.dlg_config_cat, text='Port:  ').grid(row=row, column=0, padx=3, pady=6, sticky='E')
-        mnu_port = tk.OptionMenu(
+        # The port list is filled in each time the dialog box is shown.
+        self.cmb_port = ttk.Combobox(
             self.dlg_config_cat,
-            self.port_text,
-            *port_list)
-        mnu_port.config(width=10)
-        mnu_port.grid(row=row, column=1, padx=6, pady=3, sticky='W')
+            textvariable=self.port_text,
+            values=('NONE',),
+            width=16)
+        self.cmb_port.grid(row=row, column=1, padx=6, pady=3, sticky='W')
         row += 1
         
         # Baud rate selection menu.
@@ -282,28 +335,167 @@ class DlgConfigCat(object):
         btn_cancel = tk.Button(btn_frm, 
             text='Cancel', 
             width=10, 
-            command=self.dlg_config_cat.destroy)
+            command=self._dlg_config_cat_cancel)
         btn_cancel.grid(row=0, column=1, padx=6, pady=6)
         
+        # Auto-detect button.
+        self.btn_detect = tk.Button(btn_frm, 
+            text='Detect', 
+            width=10, 
+            command=self._dlg_config_cat_detect)
+        self.btn_detect.grid(row=0, column=2, padx=6, pady=6)
+        
         # Center the buttons at the bottom of the dialog box.
         btn_frm.grid(row=row, column=0, columnspan=4, padx=6, pady=6)
-    
-        mnu_rig.focus_set()
-        self.dlg_config_cat.grab_set() # Make the dialog modal
         
         # Set the proper window size and center it on the screen.
         set_geometry(self.dlg_config_cat)
 
+    # ------------------------------------------------------------------------
+    def _dlg_load(self):
+        """
+        Internal method to load the dialog variables from the config file.
+        """
+        # Build the list of serial ports on this machine.
+        port_list = ['NONE']
+        serial_list = get_serial_ports()
+        for s in serial_list:
+            port_list.append(s)
+        
+        # Update the port selection menu.
+        self.cmb_port['values'] = port_list
+        
+        # Get existing config settings.
+        name = str(globals.config.get(self.section, 'NAME'))
+        if (len(name) > 0): self.name_text.set(name)
+        else: self.name_text.set('Rig {}'.format(self.id))
+        
+        rig = str(globals.config.get(self.section, 'RIG'))
+        if (len(rig) > 0): self.rig_text.set(rig)
+        else: self.rig_text.set(globals.RIG_LIST[0])
+        
+        port = str(globals.config.get(self.section, 'PORT'))
+        if (len(port) > 0): self.port_text.set(port)
+        else: self.port_text.set(port_list[0])
+        
+        self.baud_text.set(str(globals.config.get(self.section, 'BAUD')))
+        
+        data = str(globals.config.get(self.section, 'DATA'))
+        if (len(data) > 0): self.data_bits_text.set(data)
+        else: self.data_bits_text.set('8')
+        
+        parity = str(globals.config.get(self.section, 'PARITY'))
+        if (len(parity) > 0): self.parity_text.set(parity)
+        else: self.parity_text.set('NONE')
+        
+        stop = str(globals.config.get(self.section, 'STOP'))
+        if (len(stop) > 0): self.stop_bits_text.set(stop)
+        else: self.stop_bits_text.set('1')
+
+    # ------------------------------------------------------------------------
+    def _dlg_config_cat_cancel(self):
+        """
+        Dialog box Cancel button handler.
+        """
+        self._dlg_config_cat_close()
+
+    # ------------------------------------------------------------------------
+    def _dlg_config_cat_detect(self):
+        """
+        Dialog box Detect button handler.
+        Probes all serial ports for a supported transceiver in the background.
+        Ports held open by a port bridge are skipped.  Not available while
+        the CAT process owns the rig port.
+        """
+        if self.detect_thread is not None:
+            return
+        if globals.cat_process is not None:
+            showinfo(
+                title='Detect',
+                message='Detect is not available while CAT PROCESS is ON.\n'
+                        'Turn it off and restart pyRigPreset to detect transceivers.',
+                parent=self.dlg_config_cat)
+            return
+        bridged = PortBridge.bridged_devices()
+        ports = [p for p in get_serial_ports() if p not in bridged]
+        self.btn_detect.config(text='Detecting...', state='disabled')
+        self.detect_results = []
+        self.detect_thread = threading.Thread(
+            target=self._detect_worker,
+            args=(ports,),
+            daemon=True)
+        self.detect_thread.start()
+        self.dlg_config_cat.after(100, self._detect_poll)
+
+    # ------------------------------------------------------------------------
+    def _detect_worker(self, ports):
+        """
+        Auto-detect background thread.  Holds the port exclusively, so no
+        CAT session, virtual port or rigctld client uses a port while it is
+        probed.
+        """
+        with exclusive_port():
+            self.detect_results = detect_rigs(ports, baud_list)
+
+    # ------------------------------------------------------------------------
+    def _detect_poll(self):
+        """
+        Wait for auto-detect to finish, then fill in the results.
+        """
+        if self.detect_thread.is_alive():
+            self.dlg_config_cat.after(100, self._detect_poll)
+            return
+        self.detect_thread = None
+        self.btn_detect.config(text='Detect', state='normal')
+        
+        if (len(self.detect_results) == 0):
+            showinfo(
+                title='Detect',
+                message='No supported transceiver found.',
+                parent=self.dlg_config_cat)
+            return
+        
+        # Prefer a rig on the currently selected port.
+        result = self.detect_results[0]
+        for r in self.detect_results:
+            if (r['port'] == self.port_text.get()):
+                result = r
+        self.rig_text.set(result['rig'])
+        self.port_text.set(result['port'])
+        self.baud_text.set(result['baud'])
+        self.data_bits_text.set('8')
+        self.parity_text.set('NONE')
+        self.stop_bits_text.set(result['stop'])
+
+    # ------------------------------------------------------------------------
+    def _dlg_config_cat_close(self):
+        """
+        Hide the dialog box so it can be reused.
+        """
+        self.dlg_config_cat.grab_release()
+        self.dlg_config_cat.withdraw()
+        self.closed.set(True)
+
     # ------------------------------------------------------------------------
     def _dlg_config_cat_ok(self):
         """
         Dialog box OK button handler.
         """
+        port = self.port_text.get().strip()
+        if PortBridge.is_url(port) and not PortBridge.is_supported_url(port):
+            showinfo(
+                title='Port',
+                message='Supported port URLs are rfc2217://host:port and socket://host:port.',
+                parent=self.dlg_config_cat)
+            return
+        self.port_text.set(port)
+        
         if not globals.config.has_section(self.section):
             globals.config.add_section(self.section)
         globals.config.set(self.section, 'NAME', self.name_text.get())
         globals.config.set(self.section, 'RIG', self.rig_text.get())
         globals.config.set(self.section, 'PORT', self.port_text.get())
+        globals.config.set(self.section, 'SERIAL', get_serial_number(self.port_text.get()))
         globals.config.set(self.section, 'BAUD', self.baud_text.get())
         globals.config.set(self.section, 'DATA', str(self.data_bits_text.get()))
         globals.config.set(self.section, 'PARITY', self.parity_text.get())
@@ -312,7 +504,7 @@ class DlgConfigCat(object):
         # Save parameters to .INI file.
         globals.config.write()
 
-        self.dlg_config_cat.destroy()
+        self._dlg_config_cat_close()
 
 
 ##############################################################################
@@ -45,7 +45,6 @@
 
 # Tkinter packages.
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk
 
 # Local environment init.
@@ -62,11 +61,36 @@ from PyRigCat.PyRigCat import OperatingMode
 ##############################################################################
 ALLOWED_TEXT = ' ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.+-?'
 
+_dlg = None  # The shared dialog box object
+
 
 ##############################################################################
 # Functions.
 ##############################################################################
 
+# ------------------------------------------------------------------------
+def get_dlg_config_preset(root):
+    """
+    Return the shared configuration preset dialog box object.
+    The dialog box is built on first use and reused for every configuration
+    preset.
+    
+    Parameters
+    ----------
+    root : Tk object
+        Any widget in the application.  The dialog box is created as a child
+        of its top level window.
+    
+    Returns
+    -------
+    dlg : DlgConfigPreset object
+        The shared dialog box object.
+    """
+    global _dlg
+    if (_dlg is None) or not _dlg.exists():
+        _dlg = DlgConfigPreset(root.winfo_toplevel())
+    return _dlg
+
 
 ##############################################################################
 # DlgConfigPreset class.
@@ -79,16 +103,15 @@ class DlgConfigPreset(object):
     """
 
     # ------------------------------------------------------------------------
-    def __init__(self, root, config):
+    def __init__(self, root):
         """
         Class constructor.
+        The dialog box is created hidden.  Use show() to display it.
     
         Parameters
         ----------
         root : Tk object
             The parent object root window.
-        config : ConfigPresetStore object
-            The ConfigPresetStore object storing the configuration data.
         
         Returns
         -------
@@ -96,8 +119,10 @@ class DlgConfigPreset(object):
         """
         self.root = root # The root window
         self.dlg_config_preset = tk.Toplevel(root)  # The dialog box
+        self.dlg_config_preset.withdraw()
         self.dlg_config_preset.title('Transceiver Preset Configuration')
-        self.config = config  # ConfigPresetStore object
+        self.dlg_config_preset.protocol('WM_DELETE_WINDOW', self._dlg_config_preset_cancel)
+        self.config = None  # ConfigPresetStore object
         
         self.PADX = 3
         self.PADY = 1
@@ -107,8 +132,41 @@ class DlgConfigPreset(object):
         self.cmd = []
         for idx in range(globals.NUM_CONFIG_COMMANDS):
             self.cmd.append(tk.StringVar(self.root))
+        self.closed = tk.BooleanVar(self.root)  # Set when the dialog box is closed
         self._dlg_init()
 
+    # ------------------------------------------------------------------------
+    def exists(self):
+        """
+        Return True if the dialog box window still exists, False otherwise.
+        """
+        try:
+            return bool(self.dlg_config_preset.winfo_exists())
+        except tk.TclError:
+            return False
+
+    # ------------------------------------------------------------------------
+    def show(self, config):
+        """
+        Display the dialog box for the specified configuration preset and
+        wait for it to be closed.
+    
+        Parameters
+        ----------
+        config : ConfigPresetStore object
+            The ConfigPresetStore object storing the configuration data.
+        
+        Returns
+        -------
+        None.
+        """
+        self.config = config
+        self._dlg_load()
+        self.closed.set(False)
+        self.dlg_config_preset.deiconify()
+        self.dlg_config_preset.grab_set() # Make the dialog modal
+        self.dlg_config_preset.wait_variable(self.closed)
+
     # ------------------------------------------------------------------------
     def _dlg_init(self):
         """
@@ -123,7 +181,7 @@ class DlgConfigPreset(object):
         # Preset name.
         lbl = tk.Label(self.dlg_config_preset, 
             text='Name:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -133,7 +191,7 @@ class DlgConfigPreset(object):
         tb = tk.Entry(self.dlg_config_preset,
             width=32,
             textvariable=self.preset_name_text,
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         tb.grid(
             row=row, 
             column=1,
@@ -146,7 +204,7 @@ class DlgConfigPreset(object):
         for idx in range(globals.NUM_CONFIG_COMMANDS):
             lbl = tk.Label(self.dlg_config_preset, 
                 text='Command {}:'.format(idx+1),
-                font=tkFont.Font(size=10))
+                font=get_font(size=10))
             lbl.grid(
                 row=row, 
                 column=0,
@@ -158,7 +216,7 @@ class DlgConfigPreset(object):
                 textvariable=self.cmd[idx],
                 validate='key', 
                 validatecommand=(validateTextCommand, '%d', '%i', '%S', '%P'),
-                font=tkFont.Font(size=10))
+                font=get_font(size=10))
             tb.grid(
                 row=row, 
                 column=1,
@@ -194,25 +252,34 @@ class DlgConfigPreset(object):
         # Center the buttons at the bottom of the dialog box.
         btn_frm.grid(row=row, column=0, columnspan=2, padx=6, pady=6)
         
-        # Initialize dialog variables.
+        # Set the proper window size and center it on the screen.
+        set_geometry(self.dlg_config_preset)
+
+    # ------------------------------------------------------------------------
+    def _dlg_load(self):
+        """
+        Internal method to load the dialog variables from the configuration preset.
+        """
         #self.config.init()  # Do not init or default name could be lost.
         self.preset_name_text.set(self.config.get_preset_name())
         for idx in range(globals.NUM_CONFIG_COMMANDS):
             self.cmd[idx].set(self.config.get_config_cmd(idx))
 
-        # Make the dialog modal.
-        self.dlg_config_preset.grab_set() 
-        
-        # Set the proper window size and center it on the screen.
-        set_geometry(self.dlg_config_preset)
-
     # ------------------------------------------------------------------------
     def _dlg_config_preset_cancel(self):
         """
         Dialog box Cancel button handler.
         """
+        self._dlg_config_preset_close()
+
+    # ------------------------------------------------------------------------
+    def _dlg_config_preset_close(self):
+        """
+        Hide the dialog box so it can be reused.
+        """
         self.dlg_config_preset.grab_release()
-        self.dlg_config_preset.destroy()
+        self.dlg_config_preset.withdraw()
+        self.closed.set(True)
         
     # ------------------------------------------------------------------------
     def _dlg_config_preset_ok(self):
@@ -225,8 +292,7 @@ class DlgConfigPreset(object):
             self.config.set_config_cmd(idx, cmd)
  
         self.config.write_config()
-        self.dlg_config_preset.grab_release()
-        self.dlg_config_preset.destroy()
+        self._dlg_config_preset_close()
         
     # ------------------------------------------------------------------------     
     def _dlg_config_preset_clear(self):
@@ -274,5 +340,5 @@ if __name__ == "__main__":
     root = tk.Tk()
     id = 1
     pc = ConfigPresetStore(id)
-    dlg = DlgConfigPreset(root, pc)
-    root.mainloop()
+    dlg = DlgConfigPreset(root)
+    dlg.show(pc)
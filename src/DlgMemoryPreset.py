@@ -44,7 +44,6 @@
 
 # Tkinter packages.
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk
 
 # Local environment init.
@@ -77,11 +76,35 @@ CTCSS_TONES = [
 
 ALLOWED_TEXT = ' ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.+-?'
 
+_dlg = None  # The shared dialog box object
+
 
 ##############################################################################
 # Functions.
 ##############################################################################
 
+# ------------------------------------------------------------------------
+def get_dlg_memory_preset(root):
+    """
+    Return the shared memory preset dialog box object.
+    The dialog box is built on first use and reused for every memory preset.
+    
+    Parameters
+    ----------
+    root : Tk object
+        Any widget in the application.  The dialog box is created as a child
+        of its top level window.
+    
+    Returns
+    -------
+    dlg : DlgMemoryPreset object
+        The shared dialog box object.
+    """
+    global _dlg
+    if (_dlg is None) or not _dlg.exists():
+        _dlg = DlgMemoryPreset(root.winfo_toplevel())
+    return _dlg
+
 
 ##############################################################################
 # DlgMemoryPreset class.
@@ -93,16 +116,15 @@ class DlgMemoryPreset(object):
     """
 
     # ------------------------------------------------------------------------
-    def __init__(self, root, config):
+    def __init__(self, root):
         """
         Class constructor.
+        The dialog box is created hidden.  Use show() to display it.
     
         Parameters
         ----------
         root : Tk object
             The parent object root window.
-        config : MemoryPresetStore object
-            The MemoryPresetStore object storing the configuration data.
         
         Returns
         -------
@@ -110,8 +132,10 @@ class DlgMemoryPreset(object):
         """
         self.root = root # The root window
         self.dlg_config_preset = tk.Toplevel(root)  # The dialog box
+        self.dlg_config_preset.withdraw()
         self.dlg_config_preset.title('Memory Preset Configuration')
-        self.config = config  # MemoryPresetStore object
+        self.dlg_config_preset.protocol('WM_DELETE_WINDOW', self._dlg_config_preset_cancel)
+        self.config = None    # MemoryPresetStore object
         self.tb_vfob = None   # Text entry box for VFO-B
         self.mnu_modeb = None # Menu for VFO-B operating mode
         
@@ -134,9 +158,42 @@ class DlgMemoryPreset(object):
         self.command4_text = tk.StringVar(self.root)       # Additional text command 4
         self.command5_text = tk.StringVar(self.root)       # Additional text command 5
         self.command6_text = tk.StringVar(self.root)       # Additional text command 6
+        self.closed = tk.BooleanVar(self.root)             # Set when the dialog box is closed
 
         self._dlg_init()
 
+    # ------------------------------------------------------------------------
+    def exists(self):
+        """
+        Return True if the dialog box window still exists, False otherwise.
+        """
+        try:
+            return bool(self.dlg_config_preset.winfo_exists())
+        except tk.TclError:
+            return False
+
+    # ------------------------------------------------------------------------
+    def show(self, config):
+        """
+        Display the dialog box for the specified memory preset and wait for
+        it to be closed.
+    
+        Parameters
+        ----------
+        config : MemoryPresetStore object
+            The MemoryPresetStore object storing the configuration data.
+        
+        Returns
+        -------
+        None.
+        """
+        self.config = config
+        self._dlg_load()
+        self.closed.set(False)
+        self.dlg_config_preset.deiconify()
+        self.dlg_config_preset.grab_set() # Make the dialog modal
+        self.dlg_config_preset.wait_variable(self.closed)
+
     # ------------------------------------------------------------------------
     def _dlg_init(self):
         """
@@ -152,7 +209,7 @@ class DlgMemoryPreset(object):
         # Preset description.
         lbl = tk.Label(self.dlg_config_preset, 
             text='Description:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -162,7 +219,7 @@ class DlgMemoryPreset(object):
         tb = tk.Entry(self.dlg_config_preset,
             width=48,
             textvariable=self.preset_desc_text,
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         tb.grid(
             row=row, 
             column=1,
@@ -174,7 +231,7 @@ class DlgMemoryPreset(object):
         # VFO-A frequency.
         lbl = tk.Label(self.dlg_config_preset, 
             text='VFO-A frequency:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -186,7 +243,7 @@ class DlgMemoryPreset(object):
             textvariable=self.vfoa_freq_mhz_text,
             validate='key', 
             validatecommand=(validateFloatCommand, '%d', '%i', '%S', '%P'),
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         tb.grid(
             row=row, 
             column=1,
@@ -198,7 +255,7 @@ class DlgMemoryPreset(object):
         # VFO-B frequency.
         lbl = tk.Label(self.dlg_config_preset, 
             text='VFO-B frequency:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -210,7 +267,7 @@ class DlgMemoryPreset(object):
             textvariable=self.vfob_freq_mhz_text,
             validate='key', 
             validatecommand=(validateFloatCommand, '%d', '%i', '%S', '%P'),
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         self.tb_vfob.grid(
             row=row, 
             column=1,
@@ -222,7 +279,7 @@ class DlgMemoryPreset(object):
         # Split mode operation menu.
         lbl = tk.Label(self.dlg_config_preset, 
             text='Split:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -245,7 +302,7 @@ class DlgMemoryPreset(object):
         # VFO-A mode selection menu.
         lbl = tk.Label(self.dlg_config_preset, 
             text='VFO-A mode:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -268,7 +325,7 @@ class DlgMemoryPreset(object):
         # VFO-B mode selection menu.
         lbl = tk.Label(self.dlg_config_preset, 
             text='VFO-B mode:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -291,7 +348,7 @@ class DlgMemoryPreset(object):
         # CTCSS configuration menu.
         lbl = tk.Label(self.dlg_config_preset, 
             text='CTCSS:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -314,7 +371,7 @@ class DlgMemoryPreset(object):
         # CTCSS tone selection menu.
         lbl = tk.Label(self.dlg_config_preset, 
             text='CTCSS tone:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=row, 
             column=0,
@@ -335,49 +392,49 @@ class DlgMemoryPreset(object):
         row += 1
         
         # Additional text commands.
-        lbl = tk.Label(self.dlg_config_preset, text='Command 1:', font=tkFont.Font(size=10))
+        lbl = tk.Label(self.dlg_config_preset, text='Command 1:', font=get_font(size=10))
         lbl.grid(row=row, column=0, sticky='E', padx=self.PADX, pady=self.PADY)
-        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command1_text, font=tkFont.Font(size=10),
+        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command1_text, font=get_font(size=10),
             validate='key', 
             validatecommand=(validateTextCommand, '%d', '%i', '%S', '%P'))
         tb.grid(row=row, column=1, sticky='W', padx=self.PADX, pady=self.PADY)
         row += 1
         
-        lbl = tk.Label(self.dlg_config_preset, text='Command 2:', font=tkFont.Font(size=10))
+        lbl = tk.Label(self.dlg_config_preset, text='Command 2:', font=get_font(size=10))
         lbl.grid(row=row, column=0, sticky='E', padx=self.PADX, pady=self.PADY)
-        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command2_text, font=tkFont.Font(size=10),
+        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command2_text, font=get_font(size=10),
             validate='key', 
             validatecommand=(validateTextCommand, '%d', '%i', '%S', '%P'))
         tb.grid(row=row, column=1, sticky='W', padx=self.PADX, pady=self.PADY)
         row += 1
         
-        lbl = tk.Label(self.dlg_config_preset, text='Command 3:', font=tkFont.Font(size=10))
+        lbl = tk.Label(self.dlg_config_preset, text='Command 3:', font=get_font(size=10))
         lbl.grid(row=row, column=0, sticky='E', padx=self.PADX, pady=self.PADY)
-        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command3_text, font=tkFont.Font(size=10),
+        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command3_text, font=get_font(size=10),
             validate='key', 
             validatecommand=(validateTextCommand, '%d', '%i', '%S', '%P'))
         tb.grid(row=row, column=1, sticky='W', padx=self.PADX, pady=self.PADY)
         row += 1
         
-        lbl = tk.Label(self.dlg_config_preset, text='Command 4:', font=tkFont.Font(size=10))
+        lbl = tk.Label(self.dlg_config_preset, text='Command 4:', font=get_font(size=10))
         lbl.grid(row=row, column=0, sticky='E', padx=self.PADX, pady=self.PADY)
-        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command4_text, font=tkFont.Font(size=10),
+        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command4_text, font=get_font(size=10),
             validate='key', 
             validatecommand=(validateTextCommand, '%d', '%i', '%S', '%P'))
         tb.grid(row=row, column=1, sticky='W', padx=self.PADX, pady=self.PADY)
         row += 1
         
-        lbl = tk.Label(self.dlg_config_preset, text='Command 5:', font=tkFont.Font(size=10))
+        lbl = tk.Label(self.dlg_config_preset, text='Command 5:', font=get_font(size=10))
         lbl.grid(row=row, column=0, sticky='E', padx=self.PADX, pady=self.PADY)
-        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command5_text, font=tkFont.Font(size=10),
+        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command5_text, font=get_font(size=10),
             validate='key', 
             validatecommand=(validateTextCommand, '%d', '%i', '%S', '%P'))
         tb.grid(row=row, column=1, sticky='W', padx=self.PADX, pady=self.PADY)
         row += 1
         
-        lbl = tk.Label(self.dlg_config_preset, text='Command 6:', font=tkFont.Font(size=10))
+        lbl = tk.Label(self.dlg_config_preset, text='Command 6:', font=get_font(size=10))
         lbl.grid(row=row, column=0, sticky='E', padx=self.PADX, pady=self.PADY)
-        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command6_text, font=tkFont.Font(size=10),
+        tb = tk.Entry(self.dlg_config_preset, width=32, textvariable=self.command6_text, font=get_font(size=10),
             validate='key', 
             validatecommand=(validateTextCommand, '%d', '%i', '%S', '%P'))
         tb.grid(row=row, column=1, sticky='W', padx=self.PADX, pady=self.PADY)
@@ -410,7 +467,14 @@ class DlgMemoryPreset(object):
         # Center the buttons at the bottom of the dialog box.
         btn_frm.grid(row=row, column=0, columnspan=2, padx=6, pady=6)
         
-        # Initialize dialog variables.
+        # Set the proper window size and center it on the screen.
+        set_geometry(self.dlg_config_preset)
+
+    # ------------------------------------------------------------------------
+    def _dlg_load(self):
+        """
+        Internal method to load the dialog variables from the memory preset.
+        """
         self.config.init()
         self.preset_desc_text.set(self.config.get_preset_desc())
         
@@ -442,19 +506,21 @@ class DlgMemoryPreset(object):
         self.command5_text.set(self.config.get_command5())
         self.command6_text.set(self.config.get_command6())
 
-        # Make the dialog modal.
-        self.dlg_config_preset.grab_set() 
-        
-        # Set the proper window size and center it on the screen.
-        set_geometry(self.dlg_config_preset)
-
     # ------------------------------------------------------------------------
     def _dlg_config_preset_cancel(self):
         """
         Dialog box Cancel button handler.
         """
+        self._dlg_config_preset_close()
+
+    # ------------------------------------------------------------------------
+    def _dlg_config_preset_close(self):
+        """
+        Hide the dialog box so it can be reused.
+        """
         self.dlg_config_preset.grab_release()
-        self.dlg_config_preset.destroy()
+        self.dlg_config_preset.withdraw()
+        self.closed.set(True)
         
     # ------------------------------------------------------------------------
     def _dlg_config_preset_ok(self):
@@ -485,8 +551,7 @@ class DlgMemoryPreset(object):
         self.config.set_command6(self.command6_text.get())
         
         self.config.write_config()
-        self.dlg_config_preset.grab_release()
-        self.dlg_config_preset.destroy()
+        self._dlg_config_preset_close()
         
     # ------------------------------------------------------------------------     
     def _dlg_config_preset_clear(self):
@@ -591,5 +656,5 @@ if __name__ == "__main__":
     root = tk.Tk()
     id = 1
     pc = MemoryPresetStore(id)
-    dlg = DlgMemoryPreset(root, pc)
-    root.mainloop()
+    dlg = DlgMemoryPreset(root)
+    dlg.show(pc)
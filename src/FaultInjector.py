@@ -0,0 +1,580 @@
+###############################################################################
+# FaultInjector.py
+# Author: Tom Kerr AB3GY
+#
+# CAT fault injector for the pyRigPreset application.
+# Sits between pyRigPreset and a rig, real or simulated, on a pseudo-terminal
+# and injects faults into the CAT traffic:
+#
+#   drop        Drop bytes of the response, or of the command with side=tx
+#   garble      Flip a bit in bytes of the response, or of the command
+#   stall       Hold all traffic in both directions for a time
+#   error       Answer the command with an error reply instead of the rig
+#   disconnect  Remove the pseudo-terminal for a time, like an unplugged
+#               USB adapter
+#   slow        Delay the command by a time drawn from a distribution
+#
+# Faults are scripted one per line, for example:
+#
+#   drop match=FA after=3 count=1
+#   garble probability=0.05 size=2
+#   slow dist=lognormal mean=0.05 sd=0.02
+#   disconnect after=20 count=1 seconds=2
+#
+# Every fault accepts match (command prefix; hex:... for binary commands),
+# after (matching commands to let through first), count (maximum times it
+# fires, 0 for no limit) and probability.
+#
+# Requires a POSIX operating system.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import math
+import os
+import random
+import select
+import threading
+import time
+
+import serial
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src import AppLog
+from src import Tracer
+from src.PtySplitter import VirtualPort
+from src.RigProtocol import CIV_CONTROLLER, CIV_EOM, CIV_PREAMBLE, get_protocol
+
+
+##############################################################################
+# Globals.
+##############################################################################
+FAULT_KINDS = ('drop', 'garble', 'stall', 'error', 'disconnect', 'slow')
+DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+# Seconds between reads while idle.
+POLL_TIME = 0.1
+
+# A pause this long ends a response being dropped or garbled.
+RESPONSE_GAP = 0.005
+
+# Parameter types for parse_fault().
+_INT_PARAMS = ('after', 'count', 'size')
+_FLOAT_PARAMS = ('probability', 'seconds', 'mean', 'sd')
+_BYTES_PARAMS = ('match', 'reply')
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def _to_bytes(value):
+    """
+    Convert a script value to bytes.  'hex:fefe70e0' gives binary data.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    value = str(value)
+    if value.startswith('hex:'):
+        return bytes.fromhex(value[4:])
+    return value.encode('ascii')
+
+# ------------------------------------------------------------------------
+def parse_fault(line):
+    """
+    Create a Fault object from one line of a fault script.
+    Raises ValueError if the line is not valid.
+    """
+    tokens = line.split()
+    if (len(tokens) == 0):
+        raise ValueError('Empty fault')
+    params = {}
+    for token in tokens[1:]:
+        (key, sep, value) = token.partition('=')
+        if (len(sep) == 0):
+            raise ValueError('Fault parameter is not key=value: ' + token)
+        key = key.lower()
+        if key in _INT_PARAMS:
+            params[key] = int(value)
+        elif key in _FLOAT_PARAMS:
+            params[key] = float(value)
+        elif key in _BYTES_PARAMS:
+            params[key] = _to_bytes(value)
+        else:
+            params[key] = value
+    return Fault(tokens[0].lower(), **params)
+
+# ------------------------------------------------------------------------
+def load_script(filename):
+    """
+    Read a fault script file.  Blank lines and lines starting with '#' are
+    ignored.  Returns a list of Fault objects.
+    """
+    faults = []
+    with open(filename, 'r') as file_in:
+        for line in file_in:
+            line = line.strip()
+            if (len(line) > 0) and not line.startswith('#'):
+                faults.append(parse_fault(line))
+    return faults
+
+# ------------------------------------------------------------------------
+def error_reply(protocol, cmd):
+    """
+    Return the reply a rig sends when it rejects a command, or b'' if the
+    rig does not reply.
+    """
+    if protocol.bus_echo:
+        # CI-V NG frame, after the echo of the command.
+        frame = bytes(cmd).lstrip(b'\xFE')
+        rig_addr = frame[0] if (len(frame) > 0) else 0
+        return bytes(cmd) + CIV_PREAMBLE + bytes([CIV_CONTROLLER, rig_addr, 0xFA, CIV_EOM])
+    if bytes(cmd).endswith(b';'):
+        return b'?;'
+    return b''
+
+
+##############################################################################
+# Fault class.
+##############################################################################
+class Fault(object):
+    """
+    One scripted fault.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, kind, match=None, after=0, count=0, probability=1.0,
+                 seconds=1.0, size=0, side='rx', dist='fixed', mean=0.1, sd=0.0,
+                 reply=None):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        kind : str
+            One of the FAULT_KINDS.
+        match : bytes
+            Only commands starting with match trigger the fault.  None for
+            all commands.
+        after : int
+            Number of matching commands let through before the fault fires.
+        count : int
+            Maximum number of times the fault fires, 0 for no limit.
+        probability : float
+            Chance that a matching command triggers the fault.
+        seconds : float
+            Stall and disconnect time.
+        size : int
+            Bytes dropped or garbled.  0 drops the whole response or command,
+            and garbles one byte.
+        side : str
+            'rx' to drop or garble the response, 'tx' for the command.
+        dist, mean, sd : str, float, float
+            Distribution of the slow fault delay, in seconds.
+        reply : bytes
+            Error reply.  Defaults to the rig's own error reply.
+        """
+        if kind not in FAULT_KINDS:
+            raise ValueError('Unknown fault: ' + str(kind))
+        if dist not in DISTRIBUTIONS:
+            raise ValueError('Unknown distribution: ' + str(dist))
+        if side not in ('rx', 'tx'):
+            raise ValueError('Fault side must be rx or tx: ' + str(side))
+        self.kind = kind
+        self.match = None if (match is None) else _to_bytes(match)
+        self.after = int(after)
+        self.count = int(count)
+        self.probability = float(probability)
+        self.seconds = float(seconds)
+        self.size = int(size)
+        self.side = side
+        self.dist = dist
+        self.mean = float(mean)
+        self.sd = float(sd)
+        self.reply = None if (reply is None) else _to_bytes(reply)
+        self.seen = 0        # Matching commands seen
+        self.fired = 0       # Times the fault fired
+
+    # ------------------------------------------------------------------------
+    def __repr__(self):
+        return 'Fault({!r}, match={!r}, fired={})'.format(self.kind, self.match, self.fired)
+
+    # ------------------------------------------------------------------------
+    def check(self, cmd, rng):
+        """
+        Return True if the fault fires for a command.
+        """
+        if (self.match is not None) and not bytes(cmd).startswith(self.match):
+            return False
+        self.seen += 1
+        if (self.seen <= self.after):
+            return False
+        if (self.count > 0) and (self.fired >= self.count):
+            return False
+        if (self.probability < 1.0) and (rng.random() >= self.probability):
+            return False
+        self.fired += 1
+        return True
+
+    # ------------------------------------------------------------------------
+    def delay(self, rng):
+        """
+        Return a slow fault delay in seconds, drawn from the distribution.
+        """
+        if (self.dist == 'uniform'):
+            # Uniform over mean +/- sd * sqrt(3), which has the given sd.
+            half = self.sd * math.sqrt(3)
+            value = rng.uniform(self.mean - half, self.mean + half)
+        elif (self.dist == 'normal'):
+            value = rng.gauss(self.mean, self.sd)
+        elif (self.dist == 'lognormal') and (self.mean > 0):
+            # Parameters of the underlying normal distribution.
+            sigma2 = math.log(1.0 + (self.sd / self.mean) ** 2)
+            mu = math.log(self.mean) - (sigma2 / 2.0)
+            value = rng.lognormvariate(mu, math.sqrt(sigma2))
+        elif (self.dist == 'exponential') and (self.mean > 0):
+            value = rng.expovariate(1.0 / self.mean)
+        else:
+            value = self.mean
+        return max(0.0, value)
+
+    # ------------------------------------------------------------------------
+    def damage(self, data, rng, skip=0):
+        """
+        Apply a drop or garble fault to data, leaving the first skip bytes
+        alone.  Returns the damaged data.
+        """
+        head = data[:skip]
+        data = bytearray(data[skip:])
+        if (self.kind == 'drop'):
+            if (self.size <= 0) or (self.size >= len(data)):
+                return head
+            for n in range(self.size):
+                del data[rng.randrange(len(data))]
+        elif (self.kind == 'garble') and (len(data) > 0):
+            for n in range(max(1, self.size)):
+                data[rng.randrange(len(data))] ^= (1 << rng.randrange(8))
+        return head + bytes(data)
+
+
+##############################################################################
+# FaultInjector class.
+##############################################################################
+class FaultInjector(object):
+    """
+    Injects faults into the CAT traffic between a pseudo-terminal and a rig.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, rig, device, baud, link='', faults=None, seed=None):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        rig : str
+            The rig name, used to frame commands and make error replies.
+        device : str
+            The rig's serial port, pseudo-terminal or pyserial URL.
+        baud : int
+            The CAT baud rate.
+        link : str
+            Optional symbolic link to the pseudo-terminal.  The link follows
+            the pseudo-terminal when it comes back after a disconnect.
+        faults : list
+            Fault objects or script lines.
+        seed : int
+            Random number seed, for repeatable runs.
+        """
+        self.protocol = get_protocol(rig)
+        self.device = device
+        self.baud = int(baud)
+        self.link = link
+        self.port = VirtualPort(link)
+        self.name = self.port.name   # The device name to open
+        self.faults = []
+        self.events = []             # (time, kind, command) for each fault fired
+        self.commands = 0            # Commands received
+        self.rng = random.Random(seed)
+        self.ser = None
+        self._lock = threading.Lock()
+        self._rx_fault = None        # Fault applied to the next response
+        self._rx_skip = 0            # Echo bytes not damaged
+        self._hold_until = 0.0       # End of a stall
+        self._running = False
+        self._threads = []
+        for fault in (faults or []):
+            self.add(fault)
+
+    # ------------------------------------------------------------------------
+    def add(self, fault):
+        """
+        Add a Fault object or script line.
+        """
+        if not isinstance(fault, Fault):
+            fault = parse_fault(fault)
+        with self._lock:
+            self.faults.append(fault)
+        return fault
+
+    # ------------------------------------------------------------------------
+    def clear(self):
+        """
+        Remove all faults.
+        """
+        with self._lock:
+            self.faults = []
+            self._rx_fault = None
+
+    # ------------------------------------------------------------------------
+    def stats(self):
+        """
+        Return the number of times each kind of fault fired.
+        """
+        counts = dict((kind, 0) for kind in FAULT_KINDS)
+        with self._lock:
+            for fault in self.faults:
+                counts[fault.kind] += fault.fired
+        return counts
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Open the rig port and start passing traffic.  Returns True if
+        successful.
+        """
+        if self._running:
+            return True
+        try:
+            self.ser = serial.serial_for_url(self.device, baudrate=self.baud,
+                stopbits=self.protocol.stopbits, timeout=POLL_TIME)
+        except (serial.SerialException, ValueError) as err:
+            print('Fault injector {}: {}'.format(self.device, str(err)))
+            return False
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._uplink, name='FaultUp', daemon=True),
+            threading.Thread(target=self._downlink, name='FaultDown', daemon=True)]
+        for t in self._threads:
+            t.start()
+        return True
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        self._running = False
+        for t in self._threads:
+            t.join(timeout=1.0)
+        self._threads = []
+        if self.ser is not None:
+            self.ser.close()
+            self.ser = None
+        if self.port is not None:
+            self.port.close()
+            self.port = None
+
+    # ------------------------------------------------------------------------
+    def _uplink(self):
+        """
+        Pseudo-terminal to rig thread.
+        """
+        buf = b''
+        while self._running:
+            port = self.port
+            if port is None:
+                time.sleep(POLL_TIME)
+                continue
+            try:
+                (r, w, x) = select.select([port.master], [], [], POLL_TIME)
+                if not r:
+                    continue
+                buf += os.read(port.master, 4096)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except (OSError, ValueError):
+                # The client closed the port; wait for it to open it again.
+                time.sleep(POLL_TIME)
+                continue
+            (cmds, buf) = self.protocol.split_frames(buf)
+            for cmd in cmds:
+                self._on_command(cmd)
+                if (self.port is not port):
+                    buf = b''   # Disconnected: the rest is lost
+                    break
+
+    # ------------------------------------------------------------------------
+    def _on_command(self, cmd):
+        """
+        Apply the faults triggered by a command and pass it on.
+        """
+        self.commands += 1
+        with self._lock:
+            fired = [f for f in self.faults if f.check(cmd, self.rng)]
+            self._rx_fault = None
+        for fault in fired:
+            self.events.append((time.perf_counter(), fault.kind, cmd))
+            Tracer.instant('fault.' + fault.kind, 'fault', cmd=repr(cmd))
+            AppLog.log.debug('Fault injected: %s %r', fault.kind, cmd)
+
+        for fault in fired:
+            if (fault.kind == 'slow'):
+                time.sleep(fault.delay(self.rng))
+            elif (fault.kind == 'stall'):
+                self._hold_until = time.perf_counter() + fault.seconds
+                time.sleep(fault.seconds)
+            elif (fault.kind == 'disconnect'):
+                self._disconnect(fault.seconds)
+                return
+            elif (fault.kind == 'error'):
+                reply = fault.reply
+                if reply is None:
+                    reply = error_reply(self.protocol, cmd)
+                self.port.write(reply)
+                return
+            elif (fault.side == 'tx'):
+                cmd = fault.damage(cmd, self.rng)
+            else:
+                with self._lock:
+                    self._rx_fault = fault
+                    self._rx_skip = len(cmd) if self.protocol.bus_echo else 0
+
+        if (len(cmd) > 0):
+            try:
+                self.ser.write(cmd)
+            except (serial.SerialException, OSError) as err:
+                print('Fault injector {}: {}'.format(self.device, str(err)))
+
+    # ------------------------------------------------------------------------
+    def _disconnect(self, seconds):
+        """
+        Remove the pseudo-terminal, then create a new one after a time.
+        The client sees an I/O error, and must open the port again.
+        """
+        port = self.port
+        self.port = None
+        port.close()
+        time.sleep(seconds)
+        if self._running:
+            self.port = VirtualPort(self.link)
+            self.name = self.port.name
+
+    # ------------------------------------------------------------------------
+    def _downlink(self):
+        """
+        Rig to pseudo-terminal thread.
+        """
+        while self._running:
+            try:
+                data = self.ser.read(1)
+                if data:
+                    data += self.ser.read(self.ser.in_waiting)
+            except (serial.SerialException, OSError, TypeError, AttributeError):
+                time.sleep(POLL_TIME)
+                continue
+            if not data:
+                continue
+            delay = self._hold_until - time.perf_counter()
+            if (delay > 0):
+                time.sleep(delay)
+            with self._lock:
+                fault = self._rx_fault
+            if fault is not None:
+                # Damage the whole response, not just the first read.
+                data += self._read_response()
+                with self._lock:
+                    skip = self._rx_skip
+                    if (len(data) <= skip):
+                        self._rx_skip -= len(data)   # Only the echo so far
+                        fault = None
+                    elif (self._rx_fault is fault):
+                        self._rx_fault = None
+            if fault is not None:
+                data = fault.damage(data, self.rng, skip)
+            port = self.port
+            if (port is not None) and (len(data) > 0):
+                port.write(data)
+
+    # ------------------------------------------------------------------------
+    def _read_response(self):
+        """
+        Read until the rig pauses, which ends the response.
+        """
+        timeout = self.ser.timeout
+        self.ser.timeout = max(RESPONSE_GAP, 20.0 / self.baud)
+        data = b''
+        try:
+            while True:
+                more = self.ser.read(max(1, self.ser.in_waiting))
+                if not more:
+                    break
+                data += more
+        finally:
+            self.ser.timeout = timeout
+        return data
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('FaultInjector test program.')
+    if (len(sys.argv) < 5):
+        print('Usage: FaultInjector.py <rig> <device|sim> <baud> <script> [link]')
+        sys.exit(1)
+    (rig, device, baud, script) = sys.argv[1:5]
+    link = sys.argv[5] if (len(sys.argv) > 5) else ''
+    sim = None
+    if (device == 'sim'):
+        from src.RigSimulator import create_simulator
+        sim = create_simulator(rig, baud=int(baud))
+        sim.start()
+        device = sim.name
+    injector = FaultInjector(rig, device, baud, link, load_script(script))
+    if not injector.start():
+        sys.exit(1)
+    print('Injecting {} faults between {} and {}'.format(
+        len(injector.faults), link or injector.name, device))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    injector.stop()
+    if sim is not None:
+        sim.stop()
+    print(injector.stats())
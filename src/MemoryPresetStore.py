@@ -49,6 +49,7 @@ import _env_init
 # Local packages.
 import globals
 from src.pyRigPresetUtils import *
+from src import StartupProfiler as profiler
 from src.ConfigFile import ConfigFile
 from PyRigCat.PyRigCat import OperatingMode
 
@@ -111,7 +112,8 @@ class MemoryPresetStore(object):
         self._command5 = ''                      # Text command 5
         self._command6 = ''                      # Text command 6
 
-        self.init()
+        with profiler.phase('{}({}).init'.format(self.__class__.__name__, self._id)):
+            self.init()
 
     # ------------------------------------------------------------------------
     def get_id(self):
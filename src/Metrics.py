@@ -0,0 +1,432 @@
+###############################################################################
+# Metrics.py
+# Author: Tom Kerr AB3GY
+#
+# Performance metrics for the pyRigPreset application.
+# Counts CAT commands, errors, timeouts, bytes and reconnects, and times CAT
+# commands, preset applies and config file writes.  The metrics are served in
+# the Prometheus text exposition format at http://127.0.0.1:<port>/metrics.
+#
+# Metrics are only collected after start() is called.  Until then the
+# recording functions return immediately.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import functools
+import threading
+import time
+
+
+##############################################################################
+# Globals.
+##############################################################################
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9473
+
+# Histogram bucket upper bounds in seconds.
+CAT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+WRITE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+_enabled = False     # True if metrics are being collected
+_server = None       # The HTTP server
+_thread = None       # The HTTP server thread
+_lock = threading.Lock()
+_metrics = []        # All metrics, in registration order
+_gauges = []         # (name, help, function) evaluated at scrape time
+
+
+##############################################################################
+# Counter class.
+##############################################################################
+class Counter(object):
+    """
+    A counter with optional labels.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}     # Label values -> count
+        _metrics.append(self)
+
+    # ------------------------------------------------------------------------
+    def inc(self, *label_values, amount=1):
+        if not _enabled:
+            return
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    # ------------------------------------------------------------------------
+    def merge(self, label_values, value):
+        """
+        Add a count taken from another process.  Call with the lock held.
+        """
+        self.values[label_values] = self.values.get(label_values, 0) + value
+
+    # ------------------------------------------------------------------------
+    def expose(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} counter'.format(self.name)]
+        for (label_values, count) in sorted(self.values.items()):
+            lines.append('{}{} {}'.format(self.name, _labels(self.labels, label_values), count))
+        return lines
+
+
+##############################################################################
+# Histogram class.
+##############################################################################
+class Histogram(object):
+    """
+    A histogram with optional labels.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, name, help, labels=(), buckets=CAT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}     # Label values -> [bucket counts, sum, count]
+        _metrics.append(self)
+
+    # ------------------------------------------------------------------------
+    def observe(self, seconds, *label_values):
+        if not _enabled:
+            return
+        idx = bisect.bisect_left(self.buckets, seconds)
+        with _lock:
+            value = self.values.get(label_values)
+            if value is None:
+                value = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            value[0][idx] += 1
+            value[1] += seconds
+            value[2] += 1
+
+    # ------------------------------------------------------------------------
+    def merge(self, label_values, value):
+        """
+        Add observations taken from another process.  Call with the lock held.
+        """
+        (counts, total, count) = value
+        old = self.values.get(label_values)
+        if old is None:
+            self.values[label_values] = [list(counts), total, count]
+            return
+        old[0] = [a + b for (a, b) in zip(old[0], counts)]
+        old[1] += total
+        old[2] += count
+
+    # ------------------------------------------------------------------------
+    @contextmanager
+    def time(self, *label_values):
+        """
+        Context manager that observes the time spent in its block.
+        """
+        if not _enabled:
+            yield
+            return
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t_start, *label_values)
+
+    # ------------------------------------------------------------------------
+    def expose(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} histogram'.format(self.name)]
+        for (label_values, (counts, total, count)) in sorted(self.values.items()):
+            cumulative = 0
+            for (bound, n) in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                labels = _labels(self.labels + ('le',), label_values + (str(bound),))
+                lines.append('{}_bucket{} {}'.format(self.name, labels, cumulative))
+            labels = _labels(self.labels, label_values)
+            lines.append('{}_sum{} {:.6f}'.format(self.name, labels, total))
+            lines.append('{}_count{} {}'.format(self.name, labels, count))
+        return lines
+
+
+##############################################################################
+# Metric definitions.
+##############################################################################
+cat_commands = Counter('pyrigpreset_cat_commands_total',
+    'CAT commands sent.', ('rig', 'command'))
+cat_errors = Counter('pyrigpreset_cat_errors_total',
+    'CAT commands that returned ERROR.', ('rig', 'command'))
+cat_timeouts = Counter('pyrigpreset_cat_timeouts_total',
+    'CAT commands that got no response.', ('rig', 'command'))
+cat_seconds = Histogram('pyrigpreset_cat_command_seconds',
+    'CAT command round trip time.', ('rig', 'command'))
+bytes_out = Counter('pyrigpreset_bytes_sent_total',
+    'Bytes sent to the transceiver on the wire.', ('transport',))
+bytes_in = Counter('pyrigpreset_bytes_received_total',
+    'Bytes received from the transceiver on the wire.', ('transport',))
+reconnects = Counter('pyrigpreset_reconnects_total',
+    'Transceiver connections reopened after a failure.', ('transport',))
+init_seconds = Histogram('pyrigpreset_cat_init_seconds',
+    'Time to open and initialize the CAT port.', ('rig',))
+split_seconds = Histogram('pyrigpreset_setup_split_seconds',
+    'Time to set VFO, mode and split parameters.', ('rig',))
+preset_seconds = Histogram('pyrigpreset_preset_apply_seconds',
+    'Time to apply a preset or control action.', ('kind',))
+config_write_seconds = Histogram('pyrigpreset_config_write_seconds',
+    'Time to write the config file.', (), WRITE_BUCKETS)
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# ------------------------------------------------------------------------
+def _labels(names, values):
+    if (len(names) == 0):
+        return ''
+    pairs = ['{}="{}"'.format(n, _escape(v)) for (n, v) in zip(names, values)]
+    return '{' + ','.join(pairs) + '}'
+
+# ------------------------------------------------------------------------
+def enabled():
+    """
+    Return True if metrics are being collected, False otherwise.
+    """
+    return _enabled
+
+# ------------------------------------------------------------------------
+def enable():
+    """
+    Collect metrics without serving them.  Used by the CAT process, which
+    forwards them to the GUI process.
+    """
+    global _enabled
+    _enabled = True
+
+# ------------------------------------------------------------------------
+def take(exclude=()):
+    """
+    Return the metric values collected since the last call, and reset them.
+
+    Parameters
+    ----------
+    exclude : tuple
+        Metrics to reset without returning, because the receiving process
+        records them itself.
+
+    Returns
+    -------
+    data : list
+        (name, [(label values, value), ...]) for each metric with values,
+        as accepted by merge().
+    """
+    data = []
+    with _lock:
+        for metric in _metrics:
+            if (len(metric.values) > 0):
+                if metric not in exclude:
+                    data.append((metric.name, list(metric.values.items())))
+                metric.values = {}
+    return data
+
+# ------------------------------------------------------------------------
+def merge(data):
+    """
+    Add metric values returned by take() in another process.
+    The data may have been through JSON, so tuples may be lists.
+    """
+    if not _enabled:
+        return
+    by_name = {m.name: m for m in _metrics}
+    with _lock:
+        for (name, items) in data:
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            for (label_values, value) in items:
+                metric.merge(tuple(label_values), value)
+
+# ------------------------------------------------------------------------
+def add_gauge(name, help, fn):
+    """
+    Add a gauge whose value is read by calling fn() at scrape time.
+    """
+    _gauges.append((name, help, fn))
+
+# ------------------------------------------------------------------------
+def timed(histogram, *label_values):
+    """
+    Function decorator that observes each call's run time in a histogram.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with histogram.time(*label_values):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ------------------------------------------------------------------------
+def record_cat_command(rig, cmd_str, resp, seconds):
+    """
+    Record one CAT command sent through the rig CAT object.
+
+    Parameters
+    ----------
+    rig : str
+        The rig name.
+    cmd_str : str
+        The command string.  Only the command name is used as a label.
+    resp : str
+        The response string.
+    seconds : float
+        The round trip time.
+    """
+    if not _enabled:
+        return
+    command = cmd_str.split(' ', 1)[0].upper()
+    resp = str(resp)
+    cat_commands.inc(rig, command)
+    cat_seconds.observe(seconds, rig, command)
+    if (len(resp) == 0) or ('TIMEOUT' in resp.upper()):
+        cat_timeouts.inc(rig, command)
+    elif ('ERROR' in resp):
+        cat_errors.inc(rig, command)
+
+# ------------------------------------------------------------------------
+def expose():
+    """
+    Return all metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        for metric in _metrics:
+            lines.extend(metric.expose())
+    for (name, help, fn) in _gauges:
+        try:
+            value = fn()
+        except Exception:
+            continue
+        lines.append('# HELP {} {}'.format(name, help))
+        lines.append('# TYPE {} gauge'.format(name))
+        lines.append('{} {}'.format(name, value))
+    return '\n'.join(lines) + '\n'
+
+# ------------------------------------------------------------------------
+def start(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Start collecting metrics and serving them over HTTP.
+    Returns True if successful.
+    """
+    global _enabled
+    global _server
+    global _thread
+    if _server is not None:
+        return True
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as err:
+        print('Metrics server error: ' + str(err))
+        return False
+    _server.daemon_threads = True
+    _thread = threading.Thread(target=_server.serve_forever, name='Metrics', daemon=True)
+    _thread.start()
+    _enabled = True
+    return True
+
+# ------------------------------------------------------------------------
+def stop():
+    """
+    Stop the HTTP server and stop collecting metrics.
+    """
+    global _enabled
+    global _server
+    global _thread
+    _enabled = False
+    if _server is None:
+        return
+    _server.shutdown()
+    _server.server_close()
+    _thread.join(timeout=1.0)
+    _server = None
+    _thread = None
+
+
+##############################################################################
+# _MetricsHandler class.
+##############################################################################
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET /metrics.
+    """
+    # ------------------------------------------------------------------------
+    def do_GET(self):
+        if (self.path.split('?', 1)[0] not in ('/', '/metrics')):
+            self.send_error(404)
+            return
+        body = expose().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # ------------------------------------------------------------------------
+    def log_message(self, format, *args):
+        # Scrapes are frequent; do not log them.
+        pass
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('Metrics test program.')
+    start()
+    record_cat_command('FT991', 'FREQA 14074000', 'OK', 0.012)
+    record_cat_command('FT991', 'MODE XYZ', 'ERROR: bad mode', 0.008)
+    with preset_seconds.time('memory'):
+        time.sleep(0.02)
+    print(expose())
+    stop()
@@ -0,0 +1,411 @@
+###############################################################################
+# PortBridge.py
+# Author: Tom Kerr AB3GY
+#
+# Serial over TCP bridge for the pyRigPreset application.
+# Lets the CAT port be a pyserial URL, for rigs reached through ser2net or a
+# similar server:
+#
+#   rfc2217://host:port     Telnet with RFC 2217 serial port control
+#   socket://host:port      Raw TCP socket
+#
+# The PyRigCat classes open a serial device by name, so each URL is bridged
+# to a local pseudo-terminal, and the CAT layer opens the pseudo-terminal.
+# Bridges stay open between CAT sessions, with TCP keepalive enabled, so the
+# network connection is made once rather than on every preset.  Bytes written
+# to the pseudo-terminal in quick succession are sent in a single TCP write,
+# and Nagle's algorithm is turned off, so a burst of commands costs one
+# network round trip instead of one per command.
+#
+# Functions added with add_tap() see every byte sent and received through a
+# bridge.  While any are added, serial devices are bridged too, so that their
+# traffic can be recorded.
+#
+# Requires a POSIX operating system.  On other systems URLs are passed
+# through unchanged.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import os
+import select
+import socket
+import threading
+import time
+try:
+    import tty
+except ImportError:
+    tty = None   # Not POSIX
+
+import serial
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src import AppLog
+from src import Metrics
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Supported URL schemes.
+URL_SCHEMES = ('rfc2217', 'socket')
+
+# Seconds to wait for more bytes before sending a TCP write.
+COALESCE_TIME = 0.002
+
+# Maximum bytes sent in one TCP write.
+COALESCE_MAX = 1024
+
+# Seconds of idle time before TCP keepalive probes are sent.
+KEEPALIVE_IDLE = 30
+
+# Seconds between network reads while idle.
+READ_TIMEOUT = 0.1
+
+# Tap directions.
+TAP_TX = 0   # To the rig
+TAP_RX = 1   # From the rig
+
+_bridges = {}                   # URL -> PortBridge
+_bridges_lock = threading.Lock()
+_taps = []                      # Functions called with (direction, data)
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def is_url(port):
+    """
+    Return True if a port name is a URL rather than a serial device.
+    """
+    return ('://' in str(port))
+
+# ------------------------------------------------------------------------
+def is_supported_url(port):
+    """
+    Return True if a port name is a supported serial over TCP URL.
+    """
+    scheme = str(port).partition('://')[0].lower()
+    return is_url(port) and (scheme in URL_SCHEMES)
+
+# ------------------------------------------------------------------------
+def supported():
+    """
+    Return True if URLs can be bridged on this operating system.
+    """
+    return (tty is not None)
+
+# ------------------------------------------------------------------------
+def local_port(port, baudrate, **kwargs):
+    """
+    Return the device name to open for a CAT port.
+
+    Parameters
+    ----------
+    port : str
+        A serial device name or a serial over TCP URL.
+    baudrate : int
+        The baud rate, passed to the remote serial port by RFC 2217.
+    kwargs : dict
+        Other pyserial parameters, such as bytesize, parity or stopbits.
+
+    Returns
+    -------
+    port : str
+        The pseudo-terminal bridged to the port, or the port unchanged if it
+        does not need to be bridged or cannot be bridged.
+    """
+    bridged = is_supported_url(port) or \
+        ((len(_taps) > 0) and (len(port) > 0) and not is_url(port))
+    if not bridged or not supported():
+        return port
+    with _bridges_lock:
+        bridge = _bridges.get(port)
+        if bridge is None:
+            bridge = _bridges[port] = PortBridge(port)
+    if bridge.open(baudrate, **kwargs):
+        return bridge.name
+    return port
+
+# ------------------------------------------------------------------------
+def bridged_devices():
+    """
+    Return the serial devices held open by a bridge.
+    """
+    with _bridges_lock:
+        return [p for p in _bridges if not is_url(p)]
+
+# ------------------------------------------------------------------------
+def add_tap(fn):
+    """
+    Add a function called with (direction, data) for all bridge traffic.
+    direction is TAP_TX for bytes sent to the rig, or TAP_RX for bytes
+    received.  It is called on the bridge threads and must not block.
+    """
+    with _bridges_lock:
+        _taps.append(fn)
+
+# ------------------------------------------------------------------------
+def remove_tap(fn):
+    """
+    Remove a function added by add_tap().  Serial devices bridged only for
+    the taps are released when the last tap is removed.
+    """
+    with _bridges_lock:
+        if fn in _taps:
+            _taps.remove(fn)
+        if (len(_taps) == 0):
+            for port in [p for p in _bridges if not is_url(p)]:
+                _bridges.pop(port).close()
+
+# ------------------------------------------------------------------------
+def _tap(direction, data):
+    for fn in list(_taps):
+        try:
+            fn(direction, data)
+        except Exception as err:
+            AppLog.log.error('Port bridge tap error: %s', err)
+
+# ------------------------------------------------------------------------
+def close_bridges():
+    """
+    Close all bridges.
+    """
+    with _bridges_lock:
+        for bridge in _bridges.values():
+            bridge.close()
+        _bridges.clear()
+
+# ------------------------------------------------------------------------
+def set_socket_options(ser):
+    """
+    Turn off Nagle's algorithm and turn on TCP keepalive for the socket
+    behind a pyserial URL object.
+    """
+    sock = getattr(ser, '_socket', None)
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+    except OSError as err:
+        AppLog.log.error('Port bridge socket option error: %s', err)
+
+
+##############################################################################
+# PortBridge class.
+##############################################################################
+class PortBridge(object):
+    """
+    Bridges a pseudo-terminal to a serial over TCP URL or a serial device.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, url):
+        self.url = url
+        (self.master, self.slave) = os.openpty()
+        tty.setraw(self.slave)
+        self.name = os.ttyname(self.slave)  # The device name the CAT layer opens
+        self.ser = None                     # The pyserial URL object
+        self.settings = None                # Serial settings of the open URL
+        self._lock = threading.Lock()
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._uplink, name='PortBridgeUp', daemon=True),
+            threading.Thread(target=self._downlink, name='PortBridgeDown', daemon=True)]
+        for t in self._threads:
+            t.start()
+
+    # ------------------------------------------------------------------------
+    def open(self, baudrate, **kwargs):
+        """
+        Connect to the URL, if not already connected with the same settings.
+        Returns True if connected.
+        """
+        settings = dict(kwargs, baudrate=int(baudrate))
+        with self._lock:
+            if (self.ser is not None) and (settings == self.settings):
+                return True
+            self._disconnect()
+            try:
+                self.ser = serial.serial_for_url(self.url, timeout=READ_TIMEOUT, **settings)
+            except (serial.SerialException, ValueError) as err:
+                AppLog.log.error('Port bridge %s: %s', self.url, err)
+                return False
+            set_socket_options(self.ser)
+            self.settings = settings
+            return True
+
+    # ------------------------------------------------------------------------
+    def close(self):
+        """
+        Disconnect and remove the pseudo-terminal.
+        """
+        self._running = False
+        with self._lock:
+            self._disconnect()
+        for t in self._threads:
+            t.join(timeout=1.0)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------------
+    def _disconnect(self):
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+            self.ser = None
+
+    # ------------------------------------------------------------------------
+    def _uplink(self):
+        """
+        Pseudo-terminal to network thread.  Coalesces bursts of writes.
+        """
+        while self._running:
+            (r, w, x) = select.select([self.master], [], [], READ_TIMEOUT)
+            if not r:
+                continue
+            try:
+                data = os.read(self.master, COALESCE_MAX)
+                # Gather the rest of a burst of commands.
+                while (len(data) < COALESCE_MAX) and \
+                        select.select([self.master], [], [], COALESCE_TIME)[0]:
+                    more = os.read(self.master, COALESCE_MAX - len(data))
+                    if not more:
+                        break
+                    data += more
+            except OSError:
+                time.sleep(READ_TIMEOUT)
+                continue
+            self._send(data)
+
+    # ------------------------------------------------------------------------
+    def _connection(self):
+        """
+        Return the open URL object, reconnecting after a dropped connection.
+        """
+        with self._lock:
+            if (self.ser is None) and (self.settings is not None) and self._running:
+                try:
+                    Metrics.reconnects.inc('bridge')
+                    self.ser = serial.serial_for_url(self.url, timeout=READ_TIMEOUT, **self.settings)
+                    set_socket_options(self.ser)
+                except (serial.SerialException, ValueError) as err:
+                    AppLog.log.error('Port bridge %s: %s', self.url, err)
+            return self.ser
+
+    # ------------------------------------------------------------------------
+    def _send(self, data):
+        """
+        Write to the network.  A failed write is not repeated, since the
+        rig may already have received it; the next write reconnects.
+        """
+        ser = self._connection()
+        if ser is None:
+            return
+        try:
+            ser.write(data)
+            Metrics.bytes_out.inc('bridge', amount=len(data))
+            if _taps:
+                _tap(TAP_TX, data)
+        except (serial.SerialException, OSError, TypeError, AttributeError) as err:
+            # TypeError and AttributeError come from a socket closed by the
+            # other thread.
+            with self._lock:
+                if (self.ser is ser):
+                    AppLog.log.error('Port bridge %s: %s', self.url, err)
+                    self._disconnect()
+
+    # ------------------------------------------------------------------------
+    def _downlink(self):
+        """
+        Network to pseudo-terminal thread.
+        """
+        while self._running:
+            ser = self.ser
+            if ser is None:
+                time.sleep(READ_TIMEOUT)
+                continue
+            try:
+                data = ser.read(1)
+                if data:
+                    data += ser.read(ser.in_waiting)
+            except (serial.SerialException, OSError, TypeError, AttributeError) as err:
+                # Closed by another thread, or the connection dropped.
+                with self._lock:
+                    if (self.ser is ser):
+                        AppLog.log.error('Port bridge %s: %s', self.url, err)
+                        self._disconnect()
+                continue
+            if data:
+                Metrics.bytes_in.inc('bridge', amount=len(data))
+                if _taps:
+                    _tap(TAP_RX, data)
+                try:
+                    os.write(self.master, data)
+                except OSError:
+                    pass
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('PortBridge test program.')
+    if (len(sys.argv) < 3):
+        print('Usage: PortBridge.py <url> <baud>')
+        sys.exit(1)
+    name = local_port(sys.argv[1], int(sys.argv[2]))
+    print('{} is bridged to {}'.format(sys.argv[1], name))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    close_bridges()
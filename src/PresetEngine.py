@@ -0,0 +1,421 @@
+###############################################################################
+# PresetEngine.py
+# Author: Tom Kerr AB3GY
+#
+# Preset engine for the pyRigPreset application.
+# Applies memory and configuration presets and sends single commands to the
+# transceiver.  Used by the GUI widgets and by the automation interfaces.
+# Each function opens its own CAT session and updates the rig shadow state.
+# If the child process CAT server is running, requests are forwarded to it.
+#
+# This module does not use tkinter.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+from src.pyRigPresetUtils import to_int
+from src import AppLog
+from src import Metrics
+from src import Tracer
+from src.ConfigPresetStore import ConfigPresetStore
+from src.MemoryPresetStore import MemoryPresetStore
+from src.RigCat import cat_session, exclusive_port, read_rig_cat_state, send_rig_cat_cmd, \
+    setup_split
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def _send_cmd(cmd):
+    """
+    Send a command within an open CAT session.
+    Returns the response, or an empty string if the command is empty.
+    An error response is logged with the CAT frames that led up to it.
+    """
+    cmd = str(cmd).strip()
+    if (len(cmd) == 0):
+        return ''
+    resp = send_rig_cat_cmd(cmd)
+    if _is_error(resp):
+        AppLog.error('Command "{}" failed: {}'.format(cmd, resp))
+    return resp
+
+# ------------------------------------------------------------------------
+def _is_error(resp):
+    return ('ERROR' in str(resp))
+
+# ------------------------------------------------------------------------
+def _done(result, callback):
+    """
+    Pass a result to the optional callback and return it.
+    """
+    if callback is not None:
+        callback(result)
+    return result
+
+# ------------------------------------------------------------------------
+@Metrics.timed(Metrics.preset_seconds, 'memory')
+@Tracer.traced('apply_memory_preset', 'preset')
+def apply_memory_preset(preset, callback=None):
+    """
+    Apply an emulated memory preset to the transceiver.
+
+    Parameters
+    ----------
+    preset : MemoryPresetStore object or int
+        The memory preset, or its ID.
+    callback : function
+        Optional function called with the status when the request completes.
+        With the CAT process enabled it is called later from the Tk main
+        loop and None is returned at once.
+
+    Returns
+    -------
+    status : bool
+        True if all commands were accepted, False otherwise.
+    """
+    if globals.cat_process is not None:
+        if isinstance(preset, MemoryPresetStore):
+            preset = preset.get_id()
+        return globals.cat_process.apply_memory_preset(to_int(preset), callback)
+    if not isinstance(preset, MemoryPresetStore):
+        preset = MemoryPresetStore(to_int(preset))
+    status = False
+    with cat_session() as ok:
+        if ok:
+            # Use a single command to configure VFO, mode and split.
+            vfoa_hz = int(preset.get_vfoa_freq_mhz() * 1E6)
+            vfob_hz = int(preset.get_vfob_freq_mhz() * 1E6)
+            resp = setup_split(
+                vfoa_hz,
+                preset.get_modea(),
+                preset.get_split(),
+                vfob_hz,
+                preset.get_modeb())
+            status = (resp == 'OK')
+            if not status:
+                AppLog.error('Error setting VFO and split parameters')
+            else:
+                globals.rig_state.update(
+                    rig=globals.rig_cat.NAME,
+                    vfoa_hz=vfoa_hz,
+                    vfob_hz=vfob_hz,
+                    modea=preset.get_modea(),
+                    modeb=preset.get_modeb(),
+                    split=preset.get_split(),
+                    memory_preset=preset.get_id())
+
+            # Set CTCSS config and tone.
+            ctcss = preset.get_ctcss_config()
+            cmd = 'TONE ' + ctcss
+            if (ctcss != 'OFF'):
+                tone = str(preset.get_ctcss_tone())
+                cmd += (' ' + tone)
+            if _is_error(_send_cmd(cmd)):
+                status = False
+
+            # Send commands 1 - 6.
+            for cmd in (
+                preset.get_command1(),
+                preset.get_command2(),
+                preset.get_command3(),
+                preset.get_command4(),
+                preset.get_command5(),
+                preset.get_command6()):
+                if _is_error(_send_cmd(cmd)):
+                    status = False
+    return _done(status, callback)
+
+# ------------------------------------------------------------------------
+@Metrics.timed(Metrics.preset_seconds, 'config')
+@Tracer.traced('apply_config_preset', 'preset')
+def apply_config_preset(preset, callback=None):
+    """
+    Send a configuration preset's commands to the transceiver.
+
+    Parameters
+    ----------
+    preset : ConfigPresetStore object or int
+        The configuration preset, or its ID.
+    callback : function
+        Optional function called with the status when the request completes.
+        With the CAT process enabled it is called later from the Tk main
+        loop and None is returned at once.
+
+    Returns
+    -------
+    status : bool
+        True if all commands were accepted, False otherwise.
+    """
+    if globals.cat_process is not None:
+        if isinstance(preset, ConfigPresetStore):
+            preset = preset.get_id()
+        return globals.cat_process.apply_config_preset(to_int(preset), callback)
+    if not isinstance(preset, ConfigPresetStore):
+        preset = ConfigPresetStore(to_int(preset))
+    status = False
+    with cat_session() as ok:
+        if ok:
+            status = True
+            for idx in range(globals.NUM_CONFIG_COMMANDS):
+                if _is_error(_send_cmd(preset.get_config_cmd(idx))):
+                    status = False
+            globals.rig_state.update(
+                rig=globals.rig_cat.NAME,
+                config_preset=preset.get_id())
+    return _done(status, callback)
+
+# ------------------------------------------------------------------------
+@Metrics.timed(Metrics.preset_seconds, 'frequency')
+@Tracer.traced('set_frequency', 'preset')
+def set_frequency(freq_hz, callback=None):
+    """
+    Set the transceiver VFO-A frequency.
+
+    Parameters
+    ----------
+    freq_hz : int
+        The frequency in Hz.
+    callback : function
+        Optional function called with the status when the request completes.
+        With the CAT process enabled it is called later from the Tk main
+        loop and None is returned at once.
+
+    Returns
+    -------
+    status : bool
+        True if the command was accepted, False otherwise.
+    """
+    freq_hz = int(freq_hz)
+    if globals.cat_process is not None:
+        return globals.cat_process.set_frequency(freq_hz, callback)
+    status = False
+    with cat_session() as ok:
+        if ok:
+            status = not _is_error(_send_cmd('FREQA {}'.format(freq_hz)))
+            if status:
+                globals.rig_state.update(rig=globals.rig_cat.NAME, vfoa_hz=freq_hz)
+    return _done(status, callback)
+
+# ------------------------------------------------------------------------
+@Metrics.timed(Metrics.preset_seconds, 'mode')
+@Tracer.traced('set_mode', 'preset')
+def set_mode(mode, callback=None):
+    """
+    Set the transceiver VFO-A operating mode.
+
+    Parameters
+    ----------
+    mode : str
+        The operating mode, such as 'USB'.
+    callback : function
+        Optional function called with the status when the request completes.
+        With the CAT process enabled it is called later from the Tk main
+        loop and None is returned at once.
+
+    Returns
+    -------
+    status : bool
+        True if the command was accepted, False otherwise.
+    """
+    mode = str(mode).strip()
+    if globals.cat_process is not None:
+        return globals.cat_process.set_mode(mode, callback)
+    status = False
+    with cat_session() as ok:
+        if ok:
+            status = not _is_error(_send_cmd('MODE ' + mode))
+            if status:
+                globals.rig_state.update(rig=globals.rig_cat.NAME, modea=mode)
+    return _done(status, callback)
+
+# ------------------------------------------------------------------------
+@Metrics.timed(Metrics.preset_seconds, 'split')
+@Tracer.traced('set_split', 'preset')
+def set_split(split, vfob_hz=None, modeb=None, callback=None):
+    """
+    Turn split operation on or off and optionally set the VFO-B frequency
+    and mode.  VFO-A keeps its current frequency and mode, which must be
+    known from an earlier command.
+
+    Parameters
+    ----------
+    split : bool
+        True to transmit on VFO-B.
+    vfob_hz : int
+        The VFO-B frequency in Hz, or None to keep the current frequency.
+    modeb : str
+        The VFO-B operating mode, or None to keep the current mode.
+    callback : function
+        Optional function called with the status when the request completes.
+        With the CAT process enabled it is called later from the Tk main
+        loop and None is returned at once.
+
+    Returns
+    -------
+    status : bool
+        True if the command was accepted, False otherwise.
+    """
+    state = globals.rig_state.snapshot()
+    vfob_hz = state['vfob_hz'] if vfob_hz is None else int(vfob_hz)
+    modeb = state['modeb'] if modeb is None else str(modeb)
+    if globals.cat_process is not None:
+        return globals.cat_process.set_split(split, vfob_hz, modeb, callback)
+    if (state['vfoa_hz'] == 0) or (len(state['modea']) == 0):
+        AppLog.log.warning('VFO-A frequency and mode are not known')
+        return _done(False, callback)
+    status = False
+    with cat_session() as ok:
+        if ok:
+            resp = setup_split(
+                state['vfoa_hz'],
+                state['modea'],
+                bool(split),
+                vfob_hz,
+                modeb)
+            status = (resp == 'OK')
+            if status:
+                globals.rig_state.update(
+                    rig=globals.rig_cat.NAME,
+                    split=bool(split),
+                    vfob_hz=vfob_hz,
+                    modeb=modeb)
+    return _done(status, callback)
+
+# ------------------------------------------------------------------------
+@Metrics.timed(Metrics.preset_seconds, 'ptt')
+@Tracer.traced('set_ptt', 'preset')
+def set_ptt(on, callback=None):
+    """
+    Turn the transceiver PTT on or off.
+
+    Parameters
+    ----------
+    on : bool
+        True to transmit, False to receive.
+    callback : function
+        Optional function called with the status when the request completes.
+        With the CAT process enabled it is called later from the Tk main
+        loop and None is returned at once.
+
+    Returns
+    -------
+    status : bool
+        True if the command was accepted, False otherwise.
+    """
+    if globals.cat_process is not None:
+        return globals.cat_process.set_ptt(on, callback)
+    status = False
+    with cat_session(read_timeout=0.1) as ok:
+        if ok:
+            cmd = 'PTT ON' if on else 'PTT OFF'
+            status = not _is_error(_send_cmd(cmd))
+            if status:
+                globals.rig_state.update(rig=globals.rig_cat.NAME, ptt=bool(on))
+    return _done(status, callback)
+
+# ------------------------------------------------------------------------
+@Tracer.traced('read_rig_state', 'preset')
+def read_rig_state():
+    """
+    Read the VFO-A frequency and mode from the transceiver into the rig
+    state.
+
+    Returns
+    -------
+    status : bool
+        True if both were read, False otherwise.
+    """
+    if globals.cat_process is not None:
+        return globals.cat_process.read_rig_state()
+    with exclusive_port():
+        fields = read_rig_cat_state()
+    globals.rig_state.update(**fields)
+    return ('vfoa_hz' in fields) and ('modea' in fields)
+
+# ------------------------------------------------------------------------
+@Metrics.timed(Metrics.preset_seconds, 'command')
+@Tracer.traced('send_command', 'preset')
+def send_command(cmd, callback=None):
+    """
+    Send a single command to the transceiver.
+
+    Parameters
+    ----------
+    cmd : str
+        The command string, such as 'FREQA 14074000'.
+    callback : function
+        Optional function called with the response when the request completes.
+        With the CAT process enabled it is called later from the Tk main
+        loop and None is returned at once.
+
+    Returns
+    -------
+    resp : str
+        The transceiver response.
+    """
+    if globals.cat_process is not None:
+        return globals.cat_process.send_command(cmd, callback)
+    resp = globals.rig_cat.ERROR
+    with cat_session() as ok:
+        if ok:
+            resp = _send_cmd(cmd)
+    return _done(resp, callback)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('PresetEngine test program.')
+    globals.init()
+    if (len(sys.argv) > 1):
+        print(apply_memory_preset(sys.argv[1]))
+        print(globals.rig_state.snapshot())
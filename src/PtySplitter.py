@@ -0,0 +1,443 @@
+###############################################################################
+# PtySplitter.py
+# Author: Tom Kerr AB3GY
+#
+# Virtual serial port splitter for the pyRigPreset application.
+# Creates pseudo-terminals that speak the selected rig's native CAT
+# protocol, so that programs which can only use a serial port share the
+# transceiver with pyRigPreset and with each other.
+#
+# Commands received on the virtual ports are split into frames and forwarded
+# to the real port one at a time, in the order received.  The forwarder takes
+# the CAT lock for each short burst of commands, so the GUI's commands are
+# interleaved with them.  The real port is kept open between bursts, and is
+# closed when the GUI opens it or after the virtual ports have been idle for
+# a short time.
+# Responses to read commands are reused for a short time, so several
+# programs polling the same value cause only one read.  Frequencies seen in
+# commands and responses update the rig shadow state.
+#
+# Requires a POSIX operating system.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import os
+import queue
+import selectors
+import threading
+import time
+try:
+    import tty
+except ImportError:
+    tty = None   # Not POSIX
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+from src import AppLog
+from src import CatIoLoop
+from src import PortBridge
+from src.BaudUpgrade import BYTESIZE, PARITY, STOPBITS
+from src.RigCat import _cat_lock, add_port_release_hook, release_shared_port, \
+    remove_port_release_hook, resolve_rig_port
+from src.RigProtocol import get_protocol
+from src.pyRigPresetUtils import to_int
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Seconds a read response is reused.
+CACHE_TTL = 0.2
+
+# Seconds of virtual port inactivity before the real port is closed.
+IDLE_RELEASE = 0.5
+
+# Most commands forwarded each time the CAT lock is taken, and the pause
+# after a full burst.
+BURST_MAX = 8
+BURST_GAP = 0.002
+
+# Seconds to wait for the rig to respond to a forwarded command.
+RESPONSE_TIMEOUT = 0.5
+
+# Maximum bytes read from a virtual port at a time.
+READ_SIZE = 4096
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def supported():
+    """
+    Return True if virtual serial ports are supported on this operating
+    system.
+    """
+    return (tty is not None) and CatIoLoop.supported()
+
+
+##############################################################################
+# VirtualPort class.
+##############################################################################
+class VirtualPort(object):
+    """
+    One pseudo-terminal.  Client programs open the slave device name.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, link=''):
+        (self.master, self.slave) = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.name = os.ttyname(self.slave)  # The device name clients open
+        self.link = link                    # Optional symbolic link to name
+        self.inbuf = b''                    # Received bytes not yet framed
+        self.write_lock = threading.Lock()
+        if (len(link) > 0):
+            try:
+                if os.path.islink(link):
+                    os.unlink(link)
+                os.symlink(self.name, link)
+            except OSError as err:
+                AppLog.log.error('Virtual port link error: %s', err)
+                self.link = ''
+
+    # ------------------------------------------------------------------------
+    def write(self, data):
+        """
+        Write data for the client program.  Data is dropped if the client
+        is not reading.
+        """
+        with self.write_lock:
+            try:
+                os.write(self.master, data)
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------------
+    def close(self):
+        if (len(self.link) > 0):
+            try:
+                os.unlink(self.link)
+            except OSError:
+                pass
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+##############################################################################
+# PtySplitter class.
+##############################################################################
+class PtySplitter(object):
+    """
+    Shares the rig's serial port between virtual serial ports.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, count=1, link=''):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        count : int
+            The number of virtual ports to create.
+        link : str
+            Optional symbolic link name prefix.  Port n is linked from the
+            name followed by n, such as /tmp/rig0.
+        """
+        self.count = count
+        self.link = link
+        self.ports = []
+        self.protocol = None
+        self._loop = None            # CatIoLoop for the real port
+        self._channel = None         # Open real port, or None
+        self._selector = None
+        self._forward = queue.Queue()
+        self._cache = {}             # Command -> (time, frames)
+        self._last_port = None       # Port that sent the last command
+        self._running = False
+        self._threads = []
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Create the virtual ports and start forwarding.
+
+        Returns
+        -------
+        status : bool
+            True if successful, False otherwise.
+        """
+        if self._running:
+            return True
+        if not supported():
+            AppLog.log.warning('Virtual serial ports are not supported on this system.')
+            return False
+        rig = str(globals.config.get('CAT', 'RIG')).upper()
+        self.protocol = get_protocol(rig)
+        if self.protocol is None:
+            AppLog.log.warning('Rig: %s not supported by the virtual port splitter.', rig)
+            return False
+        for n in range(self.count):
+            link = '{}{}'.format(self.link, n) if (len(self.link) > 0) else ''
+            port = VirtualPort(link)
+            self.ports.append(port)
+            AppLog.log.info('Virtual CAT port %s: %s', n, port.link or port.name)
+        self._selector = selectors.DefaultSelector()
+        for port in self.ports:
+            self._selector.register(port.master, selectors.EVENT_READ, port)
+        self._loop = CatIoLoop.CatIoLoop()
+        self._loop.start()
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._read_ports, name='PtySplitterRead', daemon=True),
+            threading.Thread(target=self._forwarder, name='PtySplitterForward', daemon=True)]
+        for t in self._threads:
+            t.start()
+        add_port_release_hook(self._close_port)
+        return True
+
+    # ------------------------------------------------------------------------
+    def pending(self):
+        """
+        Return the number of commands waiting for the real port.
+        """
+        return self._forward.qsize()
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop forwarding and remove the virtual ports.
+        """
+        if not self._running:
+            return
+        self._running = False
+        remove_port_release_hook(self._close_port)
+        self._forward.put(None)
+        for t in self._threads:
+            t.join(timeout=2.0)
+        self._threads = []
+        self._loop.stop()
+        self._selector.close()
+        for port in self.ports:
+            port.close()
+        self.ports = []
+
+    # ------------------------------------------------------------------------
+    def _read_ports(self):
+        """
+        Virtual port reader thread.  Splits client data into commands and
+        answers them from the cache or queues them for the real port.
+        """
+        while self._running:
+            for (key, events) in self._selector.select(0.25):
+                port = key.data
+                try:
+                    data = os.read(port.master, READ_SIZE)
+                except (BlockingIOError, OSError):
+                    continue
+                port.inbuf += data
+                (cmds, port.inbuf) = self.protocol.split_frames(port.inbuf)
+                for cmd in cmds:
+                    self._on_command(port, cmd)
+
+    # ------------------------------------------------------------------------
+    def _on_command(self, port, cmd):
+        if self.protocol.bus_echo:
+            # The client expects to see its own command on the bus.
+            port.write(cmd)
+        if self.protocol.is_read(cmd):
+            cached = self._cache.get(cmd)
+            if (cached is not None) and ((time.monotonic() - cached[0]) < CACHE_TTL):
+                port.write(b''.join(cached[1]))
+                return
+        self._forward.put((port, cmd))
+
+    # ------------------------------------------------------------------------
+    def _forwarder(self):
+        """
+        Real port forwarder thread.  Sends commands to the rig in order,
+        taking the CAT lock for each burst.
+        """
+        while True:
+            try:
+                item = self._forward.get(timeout=IDLE_RELEASE if self._channel else None)
+            except queue.Empty:
+                with _cat_lock:
+                    self._close_port()
+                continue
+            if item is None:
+                break
+            stop = False
+            full = True
+            with _cat_lock:
+                self._forward_one(item)
+                for n in range(BURST_MAX - 1):
+                    try:
+                        item = self._forward.get_nowait()
+                    except queue.Empty:
+                        full = False
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    self._forward_one(item)
+            if stop:
+                break
+            if full:
+                # Give a waiting GUI session its turn before the next burst.
+                time.sleep(BURST_GAP)
+        with _cat_lock:
+            self._close_port()
+
+    # ------------------------------------------------------------------------
+    def _forward_one(self, item):
+        """
+        Send one queued command, holding the CAT lock.
+        """
+        (port, cmd) = item
+        if (self._channel is None) and not self._open_port():
+            return
+        self._last_port = port
+        frames = self._send(port, cmd)
+        if (len(frames) > 0):
+            port.write(b''.join(frames))
+
+    # ------------------------------------------------------------------------
+    def _send(self, port, cmd):
+        """
+        Send one command to the rig.  Returns the response frames.
+        """
+        protocol = self.protocol
+        is_read = protocol.is_read(cmd)
+        if is_read:
+            # Another client may have asked for the same thing meanwhile.
+            cached = self._cache.get(cmd)
+            if (cached is not None) and ((time.monotonic() - cached[0]) < CACHE_TTL):
+                return cached[1]
+        else:
+            self._cache.clear()
+        future = self._loop.request(
+            self._channel,
+            cmd,
+            expect=protocol.expected_responses(cmd),
+            timeout=RESPONSE_TIMEOUT,
+            protocol=protocol.response_protocol(cmd))
+        try:
+            frames = future.result()
+        except (TimeoutError, ConnectionError) as err:
+            AppLog.log.error('Virtual port %s: %s', port.name, err)
+            if self._channel.closed:
+                self._close_port()
+            return []
+        if is_read:
+            self._cache[cmd] = (time.monotonic(), frames)
+        fields = protocol.state_update(cmd, frames)
+        if (len(fields) > 0):
+            globals.rig_state.update(rig=protocol.name, **fields)
+        return frames
+
+    # ------------------------------------------------------------------------
+    def _on_unsolicited(self, channel, frame):
+        # Frames that do not answer a request, such as error responses to
+        # set commands or rig broadcasts, go to the most recent sender.
+        if self._last_port is not None:
+            self._last_port.write(frame)
+
+    # ------------------------------------------------------------------------
+    def _open_port(self):
+        """
+        Open the real port.  Call with the CAT lock held.
+        Returns True if successful.
+        """
+        release_shared_port(keep=self._close_port)
+        section = 'CAT'
+        port = resolve_rig_port(
+            str(globals.config.get(section, 'PORT')),
+            str(globals.config.get(section, 'SERIAL')))
+        baud = to_int(globals.config.get(section, 'BAUD'))
+        settings = {
+            'bytesize': BYTESIZE.get(str(globals.config.get(section, 'DATA')), BYTESIZE['8']),
+            'parity': PARITY.get(str(globals.config.get(section, 'PARITY')), PARITY['NONE']),
+            'stopbits': STOPBITS.get(str(globals.config.get(section, 'STOP')), STOPBITS['1'])}
+        try:
+            port = PortBridge.local_port(port, baud, **settings)
+            self._channel = self._loop.open_port(self.protocol, port, baud, **settings).result()
+        except Exception as err:
+            AppLog.log.error('Virtual port splitter cannot open %s: %s', port, err)
+            return False
+        self._channel.on_frame = self._on_unsolicited
+        return True
+
+    # ------------------------------------------------------------------------
+    def _close_port(self):
+        """
+        Close the real port.  Call with the CAT lock held.  Also called by
+        a CAT session that needs the port.
+        """
+        if self._channel is None:
+            return
+        try:
+            self._loop.close_port(self._channel).result(timeout=2.0)
+        except Exception:
+            pass
+        self._channel = None
+        self._cache.clear()
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('PtySplitter test program.')
+    globals.init()
+    splitter = PtySplitter(count=to_int(sys.argv[1]) if (len(sys.argv) > 1) else 1)
+    if splitter.start():
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        splitter.stop()
@@ -0,0 +1,244 @@
+###############################################################################
+# RigAsync.py
+# Author: Tom Kerr AB3GY
+#
+# asyncio interface for the pyRigPreset application.
+# Lets asyncio based automation scripts apply presets and send commands:
+#
+#   rig = AsyncRig()
+#   await rig.apply_memory(3)
+#   resp = await rig.send('FREQA 14074000')
+#   async for state in rig.watch():
+#       print(state['vfoa_hz'])
+#
+# All CAT work runs on a single worker thread, in the order it was awaited,
+# so any number of concurrent awaits share one thread.  The worker uses the
+# same preset engine as the GUI, and CAT sessions are serialized with the
+# GUI's.
+#
+# Use tk_asyncio_pump() to run an asyncio event loop inside the Tk main loop.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+from src import PresetEngine
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Interval in milliseconds between asyncio event loop runs in the Tk main loop.
+TK_PUMP_INTERVAL_MS = 10
+
+_executor = None   # The shared CAT worker
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def get_cat_worker():
+    """
+    Return the shared single thread CAT worker.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='CatWorker')
+    return _executor
+
+# ------------------------------------------------------------------------
+def tk_asyncio_pump(root, loop=None, interval_ms=TK_PUMP_INTERVAL_MS):
+    """
+    Run an asyncio event loop from the Tk main loop.
+    Each interval, the asyncio loop runs until it has no more ready
+    callbacks, then control returns to Tk.
+
+    Parameters
+    ----------
+    root : Tk object
+        The Tk root window.
+    loop : asyncio event loop
+        The event loop to run.  A new loop is created if None.
+    interval_ms : int
+        Milliseconds between event loop runs.
+
+    Returns
+    -------
+    loop : asyncio event loop
+        The event loop being run.
+    """
+    if loop is None:
+        loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def pump():
+        loop.call_soon(loop.stop)
+        loop.run_forever()
+        if not loop.is_closed():
+            root.after(interval_ms, pump)
+
+    root.after(interval_ms, pump)
+    return loop
+
+
+##############################################################################
+# AsyncRig class.
+##############################################################################
+class AsyncRig(object):
+    """
+    asyncio interface to the transceiver.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, executor=None):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor
+            Optional executor used to run CAT work.  Defaults to the shared
+            single thread CAT worker.
+        """
+        self._executor = executor or get_cat_worker()
+
+    # ------------------------------------------------------------------------
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # ------------------------------------------------------------------------
+    async def apply_memory(self, preset):
+        """
+        Apply a memory preset.  Returns True if successful.
+        """
+        return await self._run(PresetEngine.apply_memory_preset, preset)
+
+    # ------------------------------------------------------------------------
+    async def apply_config(self, preset):
+        """
+        Apply a configuration preset.  Returns True if successful.
+        """
+        return await self._run(PresetEngine.apply_config_preset, preset)
+
+    # ------------------------------------------------------------------------
+    async def set_frequency(self, freq_hz):
+        """
+        Set the VFO-A frequency in Hz.  Returns True if successful.
+        """
+        return await self._run(PresetEngine.set_frequency, freq_hz)
+
+    # ------------------------------------------------------------------------
+    async def set_ptt(self, on):
+        """
+        Turn PTT on or off.  Returns True if successful.
+        """
+        return await self._run(PresetEngine.set_ptt, on)
+
+    # ------------------------------------------------------------------------
+    async def send(self, cmd):
+        """
+        Send a command and return the transceiver response.
+        """
+        return await self._run(PresetEngine.send_command, cmd)
+
+    # ------------------------------------------------------------------------
+    def state(self):
+        """
+        Return a snapshot of the transceiver shadow state.
+        """
+        return globals.rig_state.snapshot()
+
+    # ------------------------------------------------------------------------
+    async def watch(self, current=True):
+        """
+        Asynchronous iterator of transceiver state snapshots, one per change.
+        If changes arrive faster than they are consumed, only the latest
+        state is kept.
+
+        Parameters
+        ----------
+        current : bool
+            If True, the current state is produced first.
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        latest = [None]
+
+        def on_change(snap):
+            # Called on the thread that changed the state.
+            latest[0] = snap
+            loop.call_soon_threadsafe(event.set)
+
+        globals.rig_state.add_listener(on_change)
+        try:
+            if current:
+                yield globals.rig_state.snapshot()
+            while True:
+                await event.wait()
+                event.clear()
+                snap = latest[0]
+                if snap is not None:
+                    yield snap
+        finally:
+            globals.rig_state.remove_listener(on_change)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+
+    async def main(pnum):
+        rig = AsyncRig()
+        watcher = rig.watch(current=False)
+        results = await asyncio.gather(rig.apply_memory(pnum), watcher.__anext__())
+        print(results)
+        await watcher.aclose()
+
+    print('RigAsync test program.')
+    globals.init()
+    asyncio.run(main(sys.argv[1] if (len(sys.argv) > 1) else 1))
@@ -0,0 +1,352 @@
+###############################################################################
+# RigAutoDetect.py
+# Author: Tom Kerr AB3GY
+#
+# Automatic transceiver detection for the pyRigPreset application.
+# Probes serial ports for a supported transceiver, trying each registered
+# rig protocol's identify command at each baud rate, fastest first.
+# All ports are probed concurrently, on a single I/O thread where the
+# operating system supports it, or with one thread per port otherwise.
+#
+# Note that probing writes identify commands to every candidate port.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+from concurrent.futures import Future, ThreadPoolExecutor
+import time
+
+import serial
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src.RigProtocol import PROTOCOLS
+from src import CatIoLoop
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Seconds to wait for the rig to start responding, in addition to the time
+# needed to transfer the response at the probe baud rate.
+RESPONSE_TIMEOUT = 0.08
+
+# Bytes to allow for when computing the response transfer time.
+RESPONSE_BYTES = 16
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def probe(ser, protocol, timeout):
+    """
+    Send a protocol's identify command and check the response.
+
+    Parameters
+    ----------
+    ser : serial.Serial object
+        The open serial port.
+    protocol : RigProtocol object
+        The protocol to try.
+    timeout : float
+        Seconds to wait for a valid response.
+
+    Returns
+    -------
+    found : bool
+        True if a valid identify response was received, False otherwise.
+    """
+    ser.reset_input_buffer()
+    ser.write(protocol.identify_cmd)
+    ser.flush()
+    buf = b''
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if (remaining <= 0):
+            return False
+        ser.timeout = remaining
+        data = ser.read(max(1, ser.in_waiting))
+        if (len(data) == 0):
+            return False
+        buf += data
+        (frames, buf) = protocol.split_frames(buf)
+        for frame in frames:
+            if protocol.is_echo(frame):
+                continue
+            if protocol.is_identify_response(frame):
+                return True
+            # Any other complete frame means the wrong protocol or baud rate.
+            return False
+
+# ------------------------------------------------------------------------
+def read_response(ser, protocol, cmd, timeout):
+    """
+    Send a command and read its response frames, skipping bus echoes.
+
+    Parameters
+    ----------
+    ser : serial.Serial object
+        The open serial port.
+    protocol : RigProtocol object
+        The rig's protocol.
+    cmd : bytes
+        The command.
+    timeout : float
+        Seconds to wait for the response.
+
+    Returns
+    -------
+    frames : list
+        The response frames.  Fewer frames than expected are returned if
+        the rig does not answer in time.
+    """
+    expect = protocol.expected_responses(cmd)
+    framer = protocol.response_protocol(cmd)
+    ser.reset_input_buffer()
+    ser.write(cmd)
+    ser.flush()
+    frames = []
+    buf = b''
+    deadline = time.monotonic() + timeout
+    while (len(frames) < expect):
+        remaining = deadline - time.monotonic()
+        if (remaining <= 0):
+            break
+        ser.timeout = remaining
+        data = ser.read(max(1, ser.in_waiting))
+        if (len(data) == 0):
+            break
+        buf += data
+        (new_frames, buf) = framer.split_frames(buf)
+        frames += [f for f in new_frames if not protocol.is_echo(f)]
+    return frames
+
+# ------------------------------------------------------------------------
+def detect_port(port, bauds, protocols=None):
+    """
+    Probe a single serial port for a supported transceiver.
+    Each baud rate is tried fastest first, and each protocol at each baud
+    rate.  Probing stops on the first valid response.
+
+    Parameters
+    ----------
+    port : str
+        The serial port device name.
+    bauds : list
+        The list of baud rates to try.
+    protocols : list
+        Optional list of RigProtocol objects to try.  Defaults to all
+        registered protocols.
+
+    Returns
+    -------
+    result : dict
+        A dictionary with keys 'port', 'rig', 'baud' and 'stop' if a rig
+        was found, or None if not.
+    """
+    if protocols is None:
+        protocols = PROTOCOLS
+    rates = sorted(set(int(b) for b in bauds), reverse=True)
+    try:
+        ser = serial.Serial(port=port, baudrate=rates[0], timeout=RESPONSE_TIMEOUT, write_timeout=0.5)
+    except Exception:
+        # Busy or missing ports are skipped.
+        return None
+    result = None
+    try:
+        for baud in rates:
+            ser.baudrate = baud
+            timeout = RESPONSE_TIMEOUT + (RESPONSE_BYTES * 10.0 / baud)
+            for protocol in protocols:
+                ser.stopbits = protocol.stopbits
+                if probe(ser, protocol, timeout):
+                    result = {
+                        'port': port,
+                        'rig': protocol.name,
+                        'baud': str(baud),
+                        'stop': str(protocol.stopbits),
+                    }
+                    break
+            if result is not None:
+                break
+    except Exception as err:
+        print('RigAutoDetect: {}: {}'.format(port, str(err)))
+    try:
+        ser.close()
+    except Exception:
+        pass
+    return result
+
+# ------------------------------------------------------------------------
+def detect_rigs(ports, bauds, protocols=None):
+    """
+    Probe serial ports for supported transceivers.
+
+    Parameters
+    ----------
+    ports : list
+        The list of serial port device names to probe.
+    bauds : list
+        The list of baud rates to try.
+    protocols : list
+        Optional list of RigProtocol objects to try.  Defaults to all
+        registered protocols.
+
+    Returns
+    -------
+    results : list
+        A list of result dictionaries, one per port where a rig was found,
+        in the same order as the ports list.
+    """
+    ports = list(ports)
+    if (len(ports) == 0):
+        return []
+    if protocols is None:
+        protocols = PROTOCOLS
+    if not CatIoLoop.supported():
+        with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+            results = pool.map(lambda p: detect_port(p, bauds, protocols), ports)
+        return [r for r in results if r is not None]
+    
+    loop = CatIoLoop.CatIoLoop()
+    loop.start()
+    try:
+        probers = [_PortProber(loop, p, bauds, protocols) for p in ports]
+        # Start every prober before waiting, so the ports are probed together.
+        futures = [p.start() for p in probers]
+        results = [f.result() for f in futures]
+    finally:
+        loop.stop()
+    return [r for r in results if r is not None]
+
+
+##############################################################################
+# _PortProber class.
+##############################################################################
+class _PortProber(object):
+    """
+    Probes a single port on the I/O loop.  Each step is started from the
+    completion callback of the previous one, so no thread is needed per port.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, loop, port, bauds, protocols):
+        self.loop = loop
+        self.port = port
+        self.steps = [(b, p) for b in sorted(set(int(b) for b in bauds), reverse=True) for p in protocols]
+        self.idx = -1
+        self.channel = None
+        self.result = Future()
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Start probing.  Returns a Future completed with the result dictionary,
+        or None if no rig was found.
+        """
+        if (len(self.steps) == 0):
+            self.result.set_result(None)
+            return self.result
+        (baud, protocol) = self.steps[0]
+        f = self.loop.open_port(protocol, self.port, baud, stopbits=protocol.stopbits)
+        f.add_done_callback(self._on_open)
+        return self.result
+
+    # ------------------------------------------------------------------------
+    def _on_open(self, f):
+        try:
+            self.channel = f.result()
+        except Exception:
+            self.result.set_result(None)
+            return
+        self.loop.call_soon(self._next)
+
+    # ------------------------------------------------------------------------
+    def _next(self):
+        self.idx += 1
+        if (self.idx >= len(self.steps)):
+            self._finish(None)
+            return
+        (baud, protocol) = self.steps[self.idx]
+        self.channel.protocol = protocol
+        self.loop.configure(self.channel, baudrate=baud, stopbits=protocol.stopbits)
+        timeout = RESPONSE_TIMEOUT + (RESPONSE_BYTES * 10.0 / baud)
+        f = self.loop.request(self.channel, protocol.identify_cmd, timeout=timeout)
+        f.add_done_callback(self._on_response)
+
+    # ------------------------------------------------------------------------
+    def _on_response(self, f):
+        (baud, protocol) = self.steps[self.idx]
+        try:
+            frames = f.result()
+        except ConnectionError:
+            self._finish(None)
+            return
+        except Exception:
+            frames = []
+        if (len(frames) > 0) and protocol.is_identify_response(frames[0]):
+            self._finish({
+                'port': self.port,
+                'rig': protocol.name,
+                'baud': str(baud),
+                'stop': str(protocol.stopbits),
+            })
+        else:
+            self._next()
+
+    # ------------------------------------------------------------------------
+    def _finish(self, result):
+        self.loop.close_port(self.channel)
+        self.result.set_result(result)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    from serial.tools import list_ports as lp
+    print('RigAutoDetect test program.')
+    ports = [p.device for p in lp.comports()]
+    t0 = time.monotonic()
+    results = detect_rigs(ports, (4800, 9600, 19200, 38400))
+    print('Probed {} ports in {:0.2f} seconds.'.format(len(ports), time.monotonic() - t0))
+    for r in results:
+        print(r)
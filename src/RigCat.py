@@ -40,6 +40,11 @@
 ###############################################################################
 
 # System level packages.
+from contextlib import contextmanager
+import threading
+import time
+
+from serial import Serial, SerialBase, SerialException
 
 # Local environment init.
 import _env_init
@@ -47,6 +52,15 @@ import _env_init
 # Local packages.
 import globals
 from src.pyRigPresetUtils import *
+from src import AppLog
+from src import Metrics
+from src import Tracer
+from src.BaudUpgrade import BYTESIZE, PARITY, STOPBITS, negotiate_baud
+from src import PortBridge
+from src.RigAutoDetect import read_response
+from src.RigProtocol import get_protocol
+from src import SerialLowLatency
+from src.RigctldClient import RIG_NET, RigctldClient, to_rig_mode
 
 # All the PyRigCat classes.
 from PyRigCat.PyRigCat import *
@@ -59,6 +73,24 @@ from PyRigCat.PyRigCat_ic7000 import PyRigCat_ic7000
 # Globals.
 ##############################################################################
 
+# (rig, port, baud) combinations already negotiated this session.
+_baud_negotiated = set()
+
+# Serial port settings saved when low latency mode is enabled.
+_low_latency_saved = None
+
+# Serializes CAT sessions between threads.
+_cat_lock = threading.RLock()
+
+# Functions called before a CAT session opens the rig port.
+_port_release_hooks = []
+
+# Thread that keeps the rig CAT object open between sessions, or None.
+_held_by = None
+
+# Total bytes written to and read from the rig CAT object's serial port.
+_wire_bytes = [0, 0]
+
 
 ##############################################################################
 # Functions.
@@ -69,10 +101,17 @@ def init_rig_cat(read_timeout=0.5):
     """
     Initialize the rig CAT control object.
     """
+    rig = str(globals.config.get('CAT', 'RIG')).upper()
+    with Metrics.init_seconds.time(rig), Tracer.span('init_rig_cat', 'cat', rig=rig):
+        return _init_rig_cat(read_timeout)
+
+# ------------------------------------------------------------------------
+def _init_rig_cat(read_timeout):
     #print('RigCat init_rig_cat enter', flush=True)
     section = 'CAT'
     rig = str(globals.config.get(section, 'RIG')).upper()
     port = str(globals.config.get(section, 'PORT'))
+    serial = str(globals.config.get(section, 'SERIAL'))
     baud = str(globals.config.get(section, 'BAUD'))
     data = str(globals.config.get(section, 'DATA'))
     parity = str(globals.config.get(section, 'PARITY'))
@@ -88,6 +127,12 @@ def init_rig_cat(read_timeout=0.5):
     elif (rig == RigName.IC7000):
         if (globals.rig_cat.NAME != RigName.IC7000):
             globals.rig_cat = PyRigCat_ic7000()
+    elif (rig == RIG_NET):
+        # The port is a rigctld host:port address.
+        if (globals.rig_cat.NAME != RIG_NET):
+            globals.rig_cat = RigctldClient()
+        config_ok = globals.rig_cat.config_port(port=port, read_timeout=read_timeout)
+        return config_ok and globals.rig_cat.init_rig()
     else:
         print ('Rig: ' + rig + ' not supported.')
         return False
@@ -108,21 +153,312 @@ def init_rig_cat(read_timeout=0.5):
     if (stop == '1.5'): stop_t = Stopbits.ONE_POINT_FIVE
     elif (stop == '2'): stop_t = Stopbits.TWO
     
+    # Follow the USB-serial adapter if its device name has changed.
+    device = resolve_rig_port(port, serial)
+    config_ok = _open_rig_port(rig, device, baud_t, data, parity, stop,
+        data_t, parity_t, stop_t, read_timeout)
+    
+    if not config_ok and (len(serial) > 0) and (globals.port_inventory is not None):
+        # The adapter may have just been replugged.  Rescan the ports and retry.
+        globals.port_inventory.refresh()
+        new_device = resolve_rig_port(device, serial)
+        if (new_device != device):
+            Metrics.reconnects.inc('serial')
+            device = new_device
+            config_ok = _open_rig_port(rig, device, baud_t, data, parity, stop,
+                data_t, parity_t, stop_t, read_timeout)
+    
+    if config_ok:
+        globals.rig_cat.init_rig()
+    else:
+        AppLog.error('Transceiver serial port configuration error.')
+    #print('RigCat init_rig_cat exit', flush=True)
+    return config_ok
+
+# ------------------------------------------------------------------------
+def _open_rig_port(rig, device, baud_t, data, parity, stop, data_t, parity_t, stop_t, read_timeout):
+    """
+    Configure the rig CAT object's serial port on a device, after the
+    optional baud rate upgrade, low latency mode and port bridge steps.
+    Returns True if successful.
+    """
+    global _low_latency_saved
+    section = 'CAT'
+    is_url = PortBridge.is_url(device)
+    
+    # Optionally switch to the fastest baud rate supported by the rig.
+    if (str(globals.config.get(section, 'AUTO_BAUD')).upper() == 'ON') and not is_url:
+        baud_t = upgrade_rig_baud(rig, device, baud_t, data, parity, stop)
+    
+    # Optionally put a USB-serial adapter into low latency mode.
+    if (str(globals.config.get(section, 'LOW_LATENCY')).upper() == 'ON') and not is_url:
+        SerialLowLatency.restore(_low_latency_saved)
+        _low_latency_saved = SerialLowLatency.enable(device)
+    
+    # A serial over TCP URL is opened through a local bridge.  So is a serial
+    # device while its traffic is being recorded.
+    port = PortBridge.local_port(
+        device,
+        baud_t,
+        bytesize=BYTESIZE.get(data, BYTESIZE['8']),
+        parity=PARITY.get(parity, PARITY['NONE']),
+        stopbits=STOPBITS.get(stop, STOPBITS['1']))
+    
     # Configure the serial port.
-    config_ok = globals.rig_cat.config_port(
+    return globals.rig_cat.config_port(
         port=port, 
         baudrate=baud_t,
         datasize=data_t,
         parity=parity_t,
         stopbits=stop_t,
         read_timeout=read_timeout)
+
+# ------------------------------------------------------------------------
+@contextmanager
+def cat_session(read_timeout=0.5):
+    """
+    Context manager used to send a series of commands to the transceiver.
+    Opens the rig CAT object on entry and closes it on exit.  Sessions are
+    serialized, so only one thread uses the rig CAT object at a time.
     
-    if config_ok:
-        globals.rig_cat.init_rig()
-    else:
-        print('Transcriver serial port configuration error.')
-    #print('RigCat init_rig_cat exit', flush=True)
-    return config_ok
+    Yields True if the rig CAT object was initialized, False otherwise.
+    """
+    with _cat_lock:
+        if (_held_by == threading.get_ident()):
+            # This thread keeps the rig CAT object open.
+            yield True
+            return
+        release_shared_port()
+        try:
+            yield init_rig_cat(read_timeout)
+        finally:
+            close_rig_cat()
+
+# ------------------------------------------------------------------------
+@contextmanager
+def exclusive_port(keep=None):
+    """
+    Hold the CAT lock with the rig port closed everywhere it is kept open,
+    except by keep, so the caller may open the port or probe other ports.
+    CAT sessions, virtual ports and rigctld clients wait until it exits.
+    """
+    with _cat_lock:
+        release_shared_port(keep)
+        yield
+
+# ------------------------------------------------------------------------
+def hold_rig_cat(read_timeout=0.5):
+    """
+    Open the rig CAT object and keep it open for the calling thread's CAT
+    sessions, until release_rig_cat() is called or another user of the port
+    opens it.  Used by servers that send many short commands.
+    Returns True if the rig CAT object is open.
+    """
+    global _held_by
+    with _cat_lock:
+        if (_held_by == threading.get_ident()):
+            return True
+        release_shared_port()
+        if not init_rig_cat(read_timeout):
+            close_rig_cat()
+            return False
+        _held_by = threading.get_ident()
+        add_port_release_hook(release_rig_cat)
+        return True
+
+# ------------------------------------------------------------------------
+def release_rig_cat():
+    """
+    Close the rig CAT object kept open by hold_rig_cat().
+    """
+    global _held_by
+    with _cat_lock:
+        if _held_by is None:
+            return
+        _held_by = None
+        remove_port_release_hook(release_rig_cat)
+        close_rig_cat()
+
+# ------------------------------------------------------------------------
+def add_port_release_hook(fn):
+    """
+    Register a function that closes a rig port kept open between commands,
+    such as by the virtual port splitter.  It is called with the CAT lock
+    held, before another user opens the port.
+    """
+    if fn not in _port_release_hooks:
+        _port_release_hooks.append(fn)
+
+# ------------------------------------------------------------------------
+def remove_port_release_hook(fn):
+    if fn in _port_release_hooks:
+        _port_release_hooks.remove(fn)
+
+# ------------------------------------------------------------------------
+def release_shared_port(keep=None):
+    """
+    Close the rig port everywhere it is kept open, except by keep.
+    Call with the CAT lock held.
+    """
+    for fn in list(_port_release_hooks):
+        if (fn != keep):
+            fn()
+
+# ------------------------------------------------------------------------
+def read_rig_cat_state(read_timeout=0.5):
+    """
+    Read the VFO-A frequency and mode from the transceiver.  Call within
+    exclusive_port().
+    Returns a dictionary of rig state fields, as used by RigState.update(),
+    without the frequency or mode if the rig did not answer.
+    """
+    section = 'CAT'
+    rig = str(globals.config.get(section, 'RIG')).upper()
+    fields = {'rig': rig}
+    if (rig == RIG_NET):
+        if init_rig_cat(read_timeout):
+            freq = str(globals.rig_cat.ascii_cmd('\\get_freq', ['']))
+            mode = str(globals.rig_cat.ascii_cmd('\\get_mode', ['']))
+            if freq.isdigit():
+                fields['vfoa_hz'] = int(freq)
+            if (len(mode) > 0) and (globals.rig_cat.ERROR not in mode):
+                fields['modea'] = to_rig_mode(mode.split()[0])
+        close_rig_cat()
+        return fields
+    
+    # Serial rigs are read with their own CAT protocol.
+    protocol = get_protocol(rig)
+    if protocol is None:
+        return fields
+    settings = {
+        'bytesize': BYTESIZE.get(str(globals.config.get(section, 'DATA')), BYTESIZE['8']),
+        'parity': PARITY.get(str(globals.config.get(section, 'PARITY')), PARITY['NONE']),
+        'stopbits': STOPBITS.get(str(globals.config.get(section, 'STOP')), STOPBITS['1'])}
+    baud = to_int(globals.config.get(section, 'BAUD'))
+    port = resolve_rig_port(
+        str(globals.config.get(section, 'PORT')),
+        str(globals.config.get(section, 'SERIAL')))
+    try:
+        port = PortBridge.local_port(port, baud, **settings)
+        ser = Serial(port=port, baudrate=baud, timeout=read_timeout, write_timeout=0.5, **settings)
+    except Exception as err:
+        AppLog.log.warning('Cannot read the rig state: %s', err)
+        return fields
+    try:
+        for cmd in protocol.read_state_cmds:
+            frames = read_response(ser, protocol, cmd, read_timeout)
+            fields.update(protocol.state_update(cmd, frames))
+    except SerialException as err:
+        AppLog.log.warning('Cannot read the rig state: %s', err)
+    finally:
+        ser.close()
+    return fields
+
+# ------------------------------------------------------------------------
+def resolve_rig_port(port, serial):
+    """
+    Return the current device name of the selected rig's serial port.
+    If the port's USB serial number is known and the adapter has moved to a
+    new device name, the new name is saved to the config file.
+    """
+    if (globals.port_inventory is None) or (len(serial) == 0):
+        return port
+    new_port = globals.port_inventory.resolve(port, serial)
+    if (new_port != port):
+        AppLog.log.info('Rig port %s is now %s', port, new_port)
+        save_cat_setting('PORT', new_port)
+    return new_port
+
+# ------------------------------------------------------------------------
+def upgrade_rig_baud(rig, port, baud, data, parity, stop):
+    """
+    Switch the rig and serial port to the fastest CAT baud rate that passes
+    verification, and save the new baud rate to the config file.
+    Negotiation is done once per rig, port and baud rate per session.
+    Returns the baud rate to use.
+    """
+    key = (rig, port, int(baud))
+    if key in _baud_negotiated:
+        return int(baud)
+    new_baud = negotiate_baud(port, rig, baud, data, parity, stop)
+    _baud_negotiated.add((rig, port, new_baud))
+    _baud_negotiated.add(key)
+    if (new_baud != int(baud)):
+        AppLog.log.info('Rig baud rate %s is now %s', baud, new_baud)
+        save_cat_setting('BAUD', str(new_baud))
+    return new_baud
+
+# ------------------------------------------------------------------------
+def save_cat_setting(key, value):
+    """
+    Save a CAT setting to the current CAT selection and to the selected
+    CAT preset.
+    """
+    globals.config.set('CAT', key, value)
+    preset = str(globals.config.get('CAT', 'PRESET'))
+    if (len(preset) > 0):
+        section = 'CAT_PRESET{:03d}'.format(to_int(preset))
+        if globals.config.has_section(section):
+            globals.config.set(section, key, value)
+    globals.config.write()
+
+# ------------------------------------------------------------------------
+def select_cat_preset(pnum):
+    """
+    Copy a CAT preset to the current CAT selection.
+    """
+    # Read the preset values.
+    section = 'CAT_PRESET{:03d}'.format(pnum)
+    if not globals.config.has_section(section):
+        globals.config.add_section(section)
+    rig = str(globals.config.get(section, 'RIG'))
+    port = str(globals.config.get(section, 'PORT'))
+    serial = str(globals.config.get(section, 'SERIAL'))
+    baud = str(globals.config.get(section, 'BAUD'))
+    data = str(globals.config.get(section, 'DATA'))
+    parity = str(globals.config.get(section, 'PARITY'))
+    stop = str(globals.config.get(section, 'STOP'))
+    
+    # Write them to the current CAT selection.
+    section = 'CAT'
+    if not globals.config.has_section(section):
+        globals.config.add_section(section)
+    globals.config.set(section, 'PRESET', pnum)
+    globals.config.set(section, 'RIG', rig)
+    globals.config.set(section, 'PORT', port)
+    globals.config.set(section, 'SERIAL', serial)
+    globals.config.set(section, 'BAUD', baud)
+    globals.config.set(section, 'DATA', data)
+    globals.config.set(section, 'PARITY', parity)
+    globals.config.set(section, 'STOP', stop)
+    globals.config.write()
+
+# ------------------------------------------------------------------------
+def _count_wire_bytes(rig_cat):
+    """
+    Count the bytes a PyRigCat object writes to and reads from its serial
+    port.  The write() and read() methods of each pyserial port the object
+    holds are wrapped once.  The port may be opened by the first command,
+    so this is called before every command.
+    """
+    for ser in list(vars(rig_cat).values()):
+        if not isinstance(ser, SerialBase) or ('write' in vars(ser)):
+            continue
+        write = ser.write
+        read = ser.read
+        def counted_write(data, write=write):
+            n = write(data)
+            count = len(data) if n is None else n
+            _wire_bytes[0] += count
+            Metrics.bytes_out.inc('serial', amount=count)
+            return n
+        def counted_read(size=1, read=read):
+            data = read(size)
+            _wire_bytes[1] += len(data)
+            Metrics.bytes_in.inc('serial', amount=len(data))
+            return data
+        ser.write = counted_write
+        ser.read = counted_read
 
 # ------------------------------------------------------------------------
 def send_rig_cat_cmd(cmd_str):
@@ -134,8 +470,16 @@ def send_rig_cat_cmd(cmd_str):
     if (len(cmd_list) > 0):
         if (len(cmd_list) < 2): 
             cmd_list.append('')
-        resp = globals.rig_cat.ascii_cmd(cmd_list[0], cmd_list[1:])
-        print('Command: "{}" Response: "{}"'.format(cmd_str, resp))
+        with Tracer.span('send_rig_cat_cmd', 'cat', cmd=cmd_str) as span:
+            _count_wire_bytes(globals.rig_cat)
+            (written, read) = _wire_bytes
+            t_start = time.perf_counter()
+            resp = globals.rig_cat.ascii_cmd(cmd_list[0], cmd_list[1:])
+            Metrics.record_cat_command(globals.rig_cat.NAME, cmd_str, resp, time.perf_counter() - t_start)
+            span.set(resp=str(resp),
+                bytes_written=_wire_bytes[0] - written,
+                bytes_read=_wire_bytes[1] - read)
+        AppLog.record_frame(globals.rig_cat.NAME, cmd_str, resp)
     else:
         resp = globals.rig_cat.ERROR
     #print('RigCat send_cmd exit', flush=True)
@@ -146,7 +490,11 @@ def setup_split(vfoa_hz, modea, split, vfob_hz, modeb):
     """
     Single function to set all split operation parameters.
     """
-    resp = globals.rig_cat.setup_split(vfoa_hz, modea, split, vfob_hz, modeb)
+    with Metrics.split_seconds.time(globals.rig_cat.NAME), Tracer.span('setup_split', 'cat') as span:
+        _count_wire_bytes(globals.rig_cat)
+        (written, read) = _wire_bytes
+        resp = globals.rig_cat.setup_split(vfoa_hz, modea, split, vfob_hz, modeb)
+        span.set(bytes_written=_wire_bytes[0] - written, bytes_read=_wire_bytes[1] - read)
     return resp
 
 # ------------------------------------------------------------------------
@@ -155,6 +503,9 @@ def close_rig_cat():
     Close the rig CAT object.
     """
     #print('RigCat close_rig_cat enter', flush=True)
+    global _low_latency_saved
     if globals.rig_cat is not None:
         globals.rig_cat.close()
+    SerialLowLatency.restore(_low_latency_saved)
+    _low_latency_saved = None
     #print('RigCat close_rig_cat exit', flush=True)
@@ -0,0 +1,509 @@
+###############################################################################
+# RigProtocol.py
+# Author: Tom Kerr AB3GY
+#
+# Rig CAT protocol descriptions for the pyRigPreset application.
+# Describes the serial framing of each supported transceiver's native CAT
+# protocol and the command used to identify it.  Used for low level tasks
+# that work directly with CAT frames, such as automatic rig detection.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from PyRigCat.PyRigCat import RigName
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Registered protocols, in the order they are probed.
+PROTOCOLS = []
+
+# FT-817 operating mode codes returned by the read frequency/mode command.
+FT817_MODES = (0x00, 0x01, 0x02, 0x03, 0x04, 0x06, 0x08, 0x0A, 0x0C, 0x82, 0x88)
+
+# FT-817 response lengths by opcode, for commands that have a response.
+FT817_RESPONSE_LEN = {
+    0x03: 5,  # Read frequency and mode
+    0xE7: 1,  # Read receiver status
+    0xF7: 1,  # Read transmitter status
+    0xBB: 2,  # Read EEPROM
+    0x08: 1,  # PTT on
+    0x88: 1,  # PTT off
+    0x00: 1,  # Lock on
+    0x80: 1,  # Lock off
+}
+FT817_READ_OPCODES = (0x03, 0xE7, 0xF7, 0xBB)
+
+# FT-817 mode codes.
+FT817_MODE_CODES = {
+    'LSB': 0x00, 'USB': 0x01, 'CW': 0x02, 'CWR': 0x03, 'AM': 0x04,
+    'WFM': 0x06, 'FM': 0x08, 'DIG': 0x0A, 'PKT': 0x0C,
+}
+
+# FT-991 mode codes, used by the MD command.
+FT991_MODE_CODES = {
+    'LSB': '1', 'USB': '2', 'CW': '3', 'FM': '4', 'AM': '5',
+    'RTTY-LSB': '6', 'CW-R': '7', 'DATA-LSB': '8', 'RTTY-USB': '9',
+    'DATA-FM': 'A', 'FM-N': 'B', 'DATA-USB': 'C', 'AM-N': 'D', 'C4FM': 'E',
+}
+
+# FT-991 read commands that take a one digit parameter, such as MD0;
+FT991_READ_P1 = (b'AG', b'GT', b'MD', b'NL', b'PA', b'RA', b'RG', b'RL', b'SH', b'SM', b'SQ')
+
+# CI-V addresses.
+CIV_PREAMBLE = b'\xFE\xFE'
+CIV_EOM = 0xFD
+CIV_CONTROLLER = 0xE0
+CIV_IC7000 = 0x70
+
+# IC-7000 mode codes, used by the 04 and 06 commands.
+IC7000_MODE_CODES = {
+    'LSB': 0x00, 'USB': 0x01, 'AM': 0x02, 'CW': 0x03, 'RTTY': 0x04,
+    'FM': 0x05, 'WFM': 0x06, 'CW-R': 0x07, 'RTTY-R': 0x08,
+}
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def register_protocol(protocol):
+    """
+    Add a protocol to the list of registered protocols.
+    A protocol registered with the same rig name replaces the old one.
+    """
+    for idx in range(len(PROTOCOLS)):
+        if (PROTOCOLS[idx].name == protocol.name):
+            PROTOCOLS[idx] = protocol
+            return
+    PROTOCOLS.append(protocol)
+
+# ------------------------------------------------------------------------
+def get_protocol(name):
+    """
+    Return the registered protocol for a rig name, or None if not found.
+    """
+    name = str(name).upper()
+    for p in PROTOCOLS:
+        if (p.name == name):
+            return p
+    return None
+
+# ------------------------------------------------------------------------
+def code_to_mode(codes, code, default=None):
+    """
+    Return the operating mode for a rig's mode code, or default if the code
+    is not known.
+    """
+    for (mode, c) in codes.items():
+        if (c == code):
+            return mode
+    return default
+
+# ------------------------------------------------------------------------
+def is_bcd(data):
+    """
+    Return True if every byte in data is two valid BCD digits.
+    """
+    for b in data:
+        if ((b >> 4) > 9) or ((b & 0x0F) > 9):
+            return False
+    return True
+
+# ------------------------------------------------------------------------
+def bcd_to_int(data, little_endian=False):
+    """
+    Convert packed BCD bytes to an integer.
+    """
+    if little_endian:
+        data = reversed(bytes(data))
+    n = 0
+    for b in data:
+        n = (n * 100) + ((b >> 4) * 10) + (b & 0x0F)
+    return n
+
+# ------------------------------------------------------------------------
+def int_to_bcd(n, length, little_endian=False):
+    """
+    Convert an integer to length bytes of packed BCD.
+    """
+    data = bytearray()
+    for idx in range(length):
+        n, low = divmod(n, 10)
+        n, high = divmod(n, 10)
+        data.insert(0, (high << 4) | low)
+    if little_endian:
+        data.reverse()
+    return bytes(data)
+
+
+##############################################################################
+# RigProtocol class.
+##############################################################################
+class RigProtocol(object):
+    """
+    Base class describing a rig's native CAT protocol.
+    """
+    name = ''              # Rig name, one of the RigName values
+    identify_cmd = b''     # Command used to identify the rig
+    stopbits = 1           # Default number of stop bits
+    cat_bauds = ()         # CAT baud rates supported by the rig
+    auto_baud = False      # True if the rig follows the controller's baud rate
+    bus_echo = False       # True if the rig echoes every command it receives
+    read_state_cmds = ()   # Commands that read the VFO-A frequency and mode
+    error_window = 0.0     # Seconds a command with no response may take to fail
+
+    # ------------------------------------------------------------------------
+    def frame_end(self, buf):
+        """
+        Return the length of the first complete frame in buf, or 0 if buf
+        does not yet hold a complete frame.
+        """
+        return 0
+
+    # ------------------------------------------------------------------------
+    def split_frames(self, buf):
+        """
+        Split buf into complete frames.
+
+        Returns
+        -------
+        (frames, rest) : tuple
+            frames : list
+                The list of complete frames.
+            rest : bytes
+                The remaining bytes, which do not yet form a complete frame.
+        """
+        frames = []
+        buf = bytes(buf)
+        while True:
+            n = self.frame_end(buf)
+            if (n <= 0): break
+            frames.append(buf[:n])
+            buf = buf[n:]
+        return (frames, buf)
+
+    # ------------------------------------------------------------------------
+    def is_identify_response(self, frame):
+        """
+        Return True if frame is a valid response to the identify command.
+        """
+        return False
+
+    # ------------------------------------------------------------------------
+    def baud_cmd(self, baud):
+        """
+        Return the command that sets the rig's CAT baud rate, or None if the
+        rig cannot change its baud rate over CAT.
+        """
+        return None
+
+    # ------------------------------------------------------------------------
+    def can_change_baud(self):
+        """
+        Return True if the rig's CAT baud rate can be changed from the
+        controller.
+        """
+        if self.auto_baud:
+            return True
+        for baud in self.cat_bauds:
+            if self.baud_cmd(baud) is not None:
+                return True
+        return False
+
+    # ------------------------------------------------------------------------
+    def is_echo(self, frame):
+        """
+        Return True if frame is an echo of a frame sent to the rig.
+        """
+        return False
+
+    # ------------------------------------------------------------------------
+    def expected_responses(self, cmd):
+        """
+        Return the number of response frames the rig sends for a command.
+        """
+        return 1
+
+    # ------------------------------------------------------------------------
+    def response_protocol(self, cmd):
+        """
+        Return the protocol object used to frame the response to a command.
+        """
+        return self
+
+    # ------------------------------------------------------------------------
+    def is_read(self, cmd):
+        """
+        Return True if a command only reads from the rig, so its response
+        may be reused for a short time.
+        """
+        return False
+
+    # ------------------------------------------------------------------------
+    def state_update(self, cmd, frames):
+        """
+        Return rig state fields, as used by RigState.update(), learned from
+        a command and its response frames.
+        """
+        return {}
+
+
+##############################################################################
+# Ft817Protocol class.
+##############################################################################
+class Ft817Protocol(RigProtocol):
+    """
+    Yaesu FT-817 5-byte binary CAT protocol.
+    Commands are 4 parameter bytes followed by an opcode byte.  Read
+    commands return fixed length responses, so responses are framed by the
+    expected length, which is 5 bytes for the identify command.
+    The CAT baud rate is set from the front panel menu only.
+    """
+    name = RigName.FT817
+    identify_cmd = b'\x00\x00\x00\x00\x03'  # Read frequency and mode
+    stopbits = 2
+    cat_bauds = (4800, 9600, 38400)
+    read_state_cmds = (identify_cmd,)
+
+    # ------------------------------------------------------------------------
+    def __init__(self, response_len=5):
+        self.response_len = response_len
+
+    # ------------------------------------------------------------------------
+    def frame_end(self, buf):
+        if (len(buf) >= self.response_len):
+            return self.response_len
+        return 0
+
+    # ------------------------------------------------------------------------
+    def is_identify_response(self, frame):
+        return (len(frame) == 5) and is_bcd(frame[:4]) and (frame[4] in FT817_MODES)
+
+    # ------------------------------------------------------------------------
+    def expected_responses(self, cmd):
+        return 1 if (cmd[4] in FT817_RESPONSE_LEN) else 0
+
+    # ------------------------------------------------------------------------
+    def response_protocol(self, cmd):
+        n = FT817_RESPONSE_LEN.get(cmd[4], self.response_len)
+        if (n == self.response_len):
+            return self
+        return Ft817Protocol(n)
+
+    # ------------------------------------------------------------------------
+    def is_read(self, cmd):
+        return (cmd[4] in FT817_READ_OPCODES)
+
+    # ------------------------------------------------------------------------
+    def state_update(self, cmd, frames):
+        # Frequencies are 4 BCD bytes in units of 10 Hz.
+        if (cmd[4] == 0x01) and is_bcd(cmd[:4]):
+            return {'vfoa_hz': bcd_to_int(cmd[:4]) * 10}
+        if (cmd[4] == 0x07) and (code_to_mode(FT817_MODE_CODES, cmd[0]) is not None):
+            return {'modea': code_to_mode(FT817_MODE_CODES, cmd[0])}
+        if (cmd[4] == 0x03) and (len(frames) > 0) and self.is_identify_response(frames[0]):
+            fields = {'vfoa_hz': bcd_to_int(frames[0][:4]) * 10}
+            mode = code_to_mode(FT817_MODE_CODES, frames[0][4])
+            if mode is not None:
+                fields['modea'] = mode
+            return fields
+        return {}
+
+
+##############################################################################
+# Ft991Protocol class.
+##############################################################################
+class Ft991Protocol(RigProtocol):
+    """
+    Yaesu FT-991 ASCII CAT protocol.  Frames are terminated by a semicolon.
+    """
+    name = RigName.FT991
+    identify_cmd = b'ID;'
+    ids = (b'ID0570;', b'ID0670;')  # FT-991, FT-991A
+    cat_bauds = (4800, 9600, 19200, 38400)
+    read_state_cmds = (b'FA;', b'MD0;')
+    error_window = 0.05  # A rejected set command answers '?;'
+
+    # ------------------------------------------------------------------------
+    def baud_cmd(self, baud):
+        # Menu 031 CAT RATE.
+        if baud in self.cat_bauds:
+            return 'EX031{};'.format(self.cat_bauds.index(baud)).encode('ascii')
+        return None
+
+    # ------------------------------------------------------------------------
+    def frame_end(self, buf):
+        idx = bytes(buf).find(b';')
+        return idx + 1
+
+    # ------------------------------------------------------------------------
+    def is_identify_response(self, frame):
+        return bytes(frame) in self.ids
+
+    # ------------------------------------------------------------------------
+    def expected_responses(self, cmd):
+        # Read commands are the bare command, or the command with a one
+        # digit parameter selecting what to read.  Set commands have no
+        # response unless they fail, which produces '?;'.
+        body = bytes(cmd).rstrip(b';')
+        if (len(body) == 2):
+            return 1
+        if (len(body) == 3) and (body[:2] in FT991_READ_P1):
+            return 1
+        if (len(body) == 5) and (body[:2] == b'EX'):
+            return 1
+        return 0
+
+    # ------------------------------------------------------------------------
+    def is_read(self, cmd):
+        return (self.expected_responses(cmd) > 0)
+
+    # ------------------------------------------------------------------------
+    def state_update(self, cmd, frames):
+        # Set commands and read responses have the same format.
+        for frame in [bytes(cmd)] + [bytes(f) for f in frames]:
+            if (len(frame) == 12) and frame[2:11].isdigit():
+                if frame.startswith(b'FA'):
+                    return {'vfoa_hz': int(frame[2:11])}
+                if frame.startswith(b'FB'):
+                    return {'vfob_hz': int(frame[2:11])}
+            if (len(frame) == 5) and frame.startswith(b'MD0'):
+                mode = code_to_mode(FT991_MODE_CODES, frame[3:4].decode('ascii', 'replace'))
+                if mode is not None:
+                    return {'modea': mode}
+        return {}
+
+
+##############################################################################
+# Ic7000Protocol class.
+##############################################################################
+class Ic7000Protocol(RigProtocol):
+    """
+    Icom IC-7000 CI-V protocol.
+    Frames are FE FE <to> <from> <command> [data] FD.  The CI-V bus echoes
+    every frame sent to the rig.  With the CI-V baud rate menu set to Auto
+    (the default), the rig follows the controller's baud rate.
+    """
+    name = RigName.IC7000
+    identify_cmd = bytes([0xFE, 0xFE, CIV_IC7000, CIV_CONTROLLER, 0x19, 0x00, CIV_EOM])
+    cat_bauds = (300, 1200, 4800, 9600, 19200)
+    auto_baud = True
+    bus_echo = True
+    read_state_cmds = (
+        bytes([0xFE, 0xFE, CIV_IC7000, CIV_CONTROLLER, 0x03, CIV_EOM]),  # Read frequency
+        bytes([0xFE, 0xFE, CIV_IC7000, CIV_CONTROLLER, 0x04, CIV_EOM]))  # Read mode
+
+    # ------------------------------------------------------------------------
+    def frame_end(self, buf):
+        buf = bytes(buf)
+        start = buf.find(CIV_PREAMBLE)
+        if (start < 0):
+            return 0
+        end = buf.find(bytes([CIV_EOM]), start + 2)
+        return end + 1
+
+    # ------------------------------------------------------------------------
+    def split_frames(self, buf):
+        # Discard any noise in front of the preamble.
+        buf = bytes(buf)
+        start = buf.find(CIV_PREAMBLE)
+        if (start > 0):
+            buf = buf[start:]
+        return RigProtocol.split_frames(self, buf)
+
+    # ------------------------------------------------------------------------
+    def is_echo(self, frame):
+        frame = bytes(frame).lstrip(b'\xFE')
+        return (len(frame) >= 2) and (frame[0] != CIV_CONTROLLER)
+
+    # ------------------------------------------------------------------------
+    def is_identify_response(self, frame):
+        frame = bytes(frame)
+        start = frame.find(CIV_PREAMBLE)
+        if (start < 0):
+            return False
+        frame = frame[start:]
+        return (len(frame) == 8) and \
+            (frame[2] == CIV_CONTROLLER) and \
+            (frame[4] == 0x19) and (frame[5] == 0x00) and \
+            (frame[7] == CIV_EOM)
+
+    # ------------------------------------------------------------------------
+    def is_read(self, cmd):
+        # Read frequency, read mode, read ID.
+        cmd = bytes(cmd).lstrip(b'\xFE')
+        return (len(cmd) >= 4) and (cmd[2] in (0x03, 0x04, 0x19))
+
+    # ------------------------------------------------------------------------
+    def state_update(self, cmd, frames):
+        # Set frequency commands and read frequency responses carry 5 BCD
+        # bytes, least significant first.  Set mode commands and read mode
+        # responses carry the mode and filter bytes.
+        for frame in [bytes(cmd)] + [bytes(f) for f in frames]:
+            frame = frame.lstrip(b'\xFE')
+            if (len(frame) == 9) and (frame[2] in (0x00, 0x03, 0x05)) and is_bcd(frame[3:8]):
+                return {'vfoa_hz': bcd_to_int(frame[3:8], little_endian=True)}
+            if (len(frame) >= 5) and (frame[2] in (0x01, 0x04, 0x06)) and (frame[-1] == CIV_EOM):
+                mode = code_to_mode(IC7000_MODE_CODES, frame[3])
+                if mode is not None:
+                    return {'modea': mode}
+        return {}
+
+
+# Register the supported protocols.
+register_protocol(Ft991Protocol())
+register_protocol(Ic7000Protocol())
+register_protocol(Ft817Protocol())
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('RigProtocol test program.')
+    for p in PROTOCOLS:
+        print('{}: identify {}'.format(p.name, p.identify_cmd.hex(' ')))
+    p = get_protocol(RigName.IC7000)
+    print(p.split_frames(b'\x00\xFE\xFE\x70\xE0\x19\x00\xFD\xFE\xFE\xE0\x70\x19\x00\x70\xFD\xFE'))
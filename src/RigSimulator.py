@@ -0,0 +1,516 @@
+###############################################################################
+# RigSimulator.py
+# Author: Tom Kerr AB3GY
+#
+# Transceiver simulators for the pyRigPreset application.
+# Each simulator speaks a rig's native CAT protocol on a pseudo-terminal, so
+# pyRigPreset can be pointed at it with the normal CAT port settings:
+#
+#   FT817   Yaesu 5-byte binary commands
+#   FT991   Yaesu ASCII commands terminated by ';'
+#   IC7000  Icom CI-V frames, with the bus echo of every command
+#
+# The simulators keep the rig state (VFO frequencies and modes, split, PTT,
+# menu settings), pace every byte in both directions at the configured baud
+# rate, and wait a configurable time before answering each command.
+#
+# Requires a POSIX operating system.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import os
+import select
+import threading
+import time
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src.PtySplitter import VirtualPort
+from src.RigProtocol import CIV_CONTROLLER, CIV_EOM, CIV_IC7000, CIV_PREAMBLE, \
+    FT817_MODE_CODES, FT991_MODE_CODES, FT991_READ_P1, IC7000_MODE_CODES, \
+    bcd_to_int, code_to_mode, int_to_bcd, is_bcd, get_protocol
+from PyRigCat.PyRigCat import RigName
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Default response latency in seconds, after the command has arrived.
+DEFAULT_LATENCY = 0.01
+
+# Seconds between reads while idle.
+POLL_TIME = 0.1
+
+# CI-V command accepted and rejected responses.
+CIV_OK = 0xFB
+CIV_NG = 0xFA
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def create_simulator(rig, **kwargs):
+    """
+    Create a simulator for a rig name.  Keyword arguments are passed to the
+    simulator class.  Returns None if the rig is not simulated.
+    """
+    cls = SIMULATORS.get(str(rig).upper())
+    if cls is None:
+        return None
+    return cls(**kwargs)
+
+
+##############################################################################
+# RigSimulator class.
+##############################################################################
+class RigSimulator(object):
+    """
+    Base class for the rig simulators.
+    """
+    rig = ''             # Rig name, one of the RigName values
+    stopbits = 1         # Stop bits, used for byte pacing
+    echo = False         # True if the rig echoes every command
+
+    # ------------------------------------------------------------------------
+    def __init__(self, link='', baud=38400, latency=DEFAULT_LATENCY, pace=True):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        link : str
+            Optional symbolic link to the pseudo-terminal.
+        baud : int
+            The simulated CAT baud rate.
+        latency : float or dict
+            Seconds between receiving a command and starting the response.
+            A dict gives the latency by command name, as returned by
+            command_name(), with the key None for all other commands.
+        pace : bool
+            True to send and receive bytes at the baud rate, False to send
+            them as fast as possible.
+        """
+        self.protocol = get_protocol(self.rig)
+        self.port = VirtualPort(link)
+        self.name = self.port.name       # The device name to open
+        self.baud = int(baud)
+        self.latency = latency
+        self.pace = pace
+        self.commands = 0                # Number of commands handled
+        self.state = {
+            'vfoa_hz': 14074000,
+            'vfob_hz': 14074000,
+            'modea': 'USB',
+            'modeb': 'USB',
+            'vfo': 'A',                  # The VFO in use
+            'split': False,
+            'ptt': False,
+        }
+        self.lock = threading.Lock()     # Protects the state
+        self._running = False
+        self._thread = None
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.rig + 'Sim', daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.port.close()
+
+    # ------------------------------------------------------------------------
+    def byte_time(self):
+        """
+        Return the time to send one byte: a start bit, 8 data bits and the
+        stop bits.
+        """
+        return (9 + self.stopbits) / float(self.baud)
+
+    # ------------------------------------------------------------------------
+    def command_name(self, cmd):
+        """
+        Return a short name for a command, used to look up its latency.
+        """
+        return None
+
+    # ------------------------------------------------------------------------
+    def command_latency(self, cmd):
+        """
+        Return the response latency for a command.
+        """
+        if isinstance(self.latency, dict):
+            name = self.command_name(cmd)
+            return self.latency.get(name, self.latency.get(None, DEFAULT_LATENCY))
+        return float(self.latency)
+
+    # ------------------------------------------------------------------------
+    def handle(self, cmd):
+        """
+        Apply a command to the rig state.  Returns the response bytes, or
+        b'' if the command has no response.
+        """
+        return b''
+
+    # ------------------------------------------------------------------------
+    def send(self, data):
+        """
+        Send bytes to the controller, paced at the baud rate.
+        """
+        if not self.pace:
+            self.port.write(data)
+            return
+        bt = self.byte_time()
+        t_next = time.perf_counter()
+        for idx in range(len(data)):
+            t_next += bt
+            self.port.write(data[idx:idx+1])
+            delay = t_next - time.perf_counter()
+            if (delay > 0):
+                time.sleep(delay)
+
+    # ------------------------------------------------------------------------
+    def split_commands(self, buf):
+        """
+        Split received bytes into complete commands.
+        Returns a (commands, rest) tuple.
+        """
+        return self.protocol.split_frames(buf)
+
+    # ------------------------------------------------------------------------
+    def on_command(self, cmd):
+        """
+        Handle one complete command: echo it, wait, and respond.
+        """
+        if self.pace:
+            # The command took this long to arrive at the baud rate.
+            time.sleep(len(cmd) * self.byte_time())
+        if self.echo:
+            self.send(cmd)
+        with self.lock:
+            resp = self.handle(cmd)
+            self.commands += 1
+        latency = self.command_latency(cmd)
+        if (len(resp) > 0):
+            if (latency > 0):
+                time.sleep(latency)
+            self.send(resp)
+
+    # ------------------------------------------------------------------------
+    def _run(self):
+        buf = b''
+        while self._running:
+            try:
+                (r, w, x) = select.select([self.port.master], [], [], POLL_TIME)
+                if not r:
+                    continue
+                buf += os.read(self.port.master, 4096)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError:
+                break
+            (cmds, buf) = self.split_commands(buf)
+            for cmd in cmds:
+                self.on_command(cmd)
+
+    # ------------------------------------------------------------------------
+    def _vfo_keys(self):
+        """
+        Return the state keys of the VFO in use.
+        """
+        if (self.state['vfo'] == 'B'):
+            return ('vfob_hz', 'modeb')
+        return ('vfoa_hz', 'modea')
+
+
+##############################################################################
+# Ft817Simulator class.
+##############################################################################
+class Ft817Simulator(RigSimulator):
+    """
+    Yaesu FT-817 simulator.  Commands are 4 parameter bytes and an opcode.
+    """
+    rig = RigName.FT817
+    stopbits = 2
+
+    # ------------------------------------------------------------------------
+    def split_commands(self, buf):
+        n = (len(buf) // 5) * 5
+        return ([buf[i:i+5] for i in range(0, n, 5)], buf[n:])
+
+    # ------------------------------------------------------------------------
+    def command_name(self, cmd):
+        return cmd[4]
+
+    # ------------------------------------------------------------------------
+    def handle(self, cmd):
+        s = self.state
+        op = cmd[4]
+        (freq_key, mode_key) = self._vfo_keys()
+        if (op == 0x01) and is_bcd(cmd[:4]):    # Set frequency
+            s[freq_key] = bcd_to_int(cmd[:4]) * 10
+        elif (op == 0x03):                      # Read frequency and mode
+            return int_to_bcd(s[freq_key] // 10, 4) + \
+                bytes([FT817_MODE_CODES.get(s[mode_key], 0x01)])
+        elif (op == 0x07):                      # Set mode
+            s[mode_key] = code_to_mode(FT817_MODE_CODES, cmd[0], s[mode_key])
+        elif (op == 0x81):                      # Toggle VFO A/B
+            s['vfo'] = 'B' if (s['vfo'] == 'A') else 'A'
+        elif (op in (0x02, 0x82)):              # Split on, off
+            s['split'] = (op == 0x02)
+        elif (op in (0x08, 0x88)):              # PTT on, off
+            was = s['ptt']
+            s['ptt'] = (op == 0x08)
+            return b'\xF0' if (was == s['ptt']) else b'\x00'
+        elif (op in (0x00, 0x80)):              # Lock on, off
+            return b'\x00'
+        elif (op == 0xE7):                      # Read receiver status
+            return b'\x00'
+        elif (op == 0xF7):                      # Read transmitter status
+            return b'\x00' if s['ptt'] else b'\x80'
+        elif (op == 0xBB):                      # Read EEPROM
+            return b'\x00\x00'
+        return b''
+
+
+##############################################################################
+# Ft991Simulator class.
+##############################################################################
+class Ft991Simulator(RigSimulator):
+    """
+    Yaesu FT-991 simulator.  Commands are ASCII, terminated by ';'.
+    """
+    rig = RigName.FT991
+
+    # ------------------------------------------------------------------------
+    def __init__(self, **kwargs):
+        RigSimulator.__init__(self, **kwargs)
+        self.settings = {}       # Other set commands: prefix -> value
+
+    # ------------------------------------------------------------------------
+    def command_name(self, cmd):
+        return cmd[:2].decode('ascii', 'replace')
+
+    # ------------------------------------------------------------------------
+    def handle(self, cmd):
+        s = self.state
+        body = cmd.rstrip(b';').decode('ascii', 'replace')
+        name = body[:2]
+        arg = body[2:]
+        if (name == 'ID') and (len(arg) == 0):
+            return b'ID0570;'
+        if (name in ('FA', 'FB')):
+            key = 'vfoa_hz' if (name == 'FA') else 'vfob_hz'
+            if (len(arg) == 0):
+                return '{}{:09d};'.format(name, s[key]).encode('ascii')
+            if (len(arg) == 9) and arg.isdigit():
+                s[key] = int(arg)
+                return b''
+            return b'?;'
+        if (name == 'MD') and (len(arg) >= 1) and (arg[0] in '01'):
+            key = 'modea' if (arg[0] == '0') else 'modeb'
+            if (len(arg) == 1):
+                return 'MD{}{};'.format(arg[0], FT991_MODE_CODES.get(s[key], '2')).encode('ascii')
+            mode = code_to_mode(FT991_MODE_CODES, arg[1:], None)
+            if (mode is None):
+                return b'?;'
+            s[key] = mode
+            return b''
+        if (name == 'TX'):
+            if (len(arg) == 0):
+                return b'TX1;' if s['ptt'] else b'TX0;'
+            s['ptt'] = (arg != '0')
+            return b''
+        if (name == 'ST'):
+            if (len(arg) == 0):
+                return b'ST1;' if s['split'] else b'ST0;'
+            s['split'] = (arg == '1')
+            return b''
+        if (name == 'FT'):
+            if (len(arg) == 0):
+                return b'FT1;' if s['split'] else b'FT0;'
+            s['split'] = (arg in ('1', '3'))
+            return b''
+        if (name == 'SV') and (len(arg) == 0):
+            (s['vfoa_hz'], s['vfob_hz']) = (s['vfob_hz'], s['vfoa_hz'])
+            (s['modea'], s['modeb']) = (s['modeb'], s['modea'])
+            return b''
+        if (name == 'AB') and (len(arg) == 0):
+            (s['vfob_hz'], s['modeb']) = (s['vfoa_hz'], s['modea'])
+            return b''
+        if (name == 'BA') and (len(arg) == 0):
+            (s['vfoa_hz'], s['modea']) = (s['vfob_hz'], s['modeb'])
+            return b''
+        if (name == 'IF') and (len(arg) == 0):
+            return 'IF001{:09d}+000000{}00000;'.format(
+                s['vfoa_hz'], FT991_MODE_CODES.get(s['modea'], '2')).encode('ascii')
+        if (len(name) < 2) or not name.isalpha():
+            return b'?;'
+        # Other commands: reads return the last value set.
+        key = self._setting_key(name, arg)
+        if (key == body):
+            value = self.settings.get(key)
+            return b'?;' if (value is None) else '{}{};'.format(key, value).encode('ascii')
+        self.settings[key] = body[len(key):]
+        return b''
+
+    # ------------------------------------------------------------------------
+    def _setting_key(self, name, arg):
+        """
+        Return the part of a command that names a setting: the command name,
+        plus the menu number for EX or the first parameter digit for
+        commands such as AG0.
+        """
+        if (name == 'EX'):
+            return name + arg[:3]
+        if (len(arg) >= 1) and (name.encode('ascii') in FT991_READ_P1):
+            return name + arg[:1]
+        return name
+
+
+##############################################################################
+# Ic7000Simulator class.
+##############################################################################
+class Ic7000Simulator(RigSimulator):
+    """
+    Icom IC-7000 simulator.  Commands are CI-V frames, and every frame is
+    echoed on the bus before the response.
+    """
+    rig = RigName.IC7000
+    echo = True
+
+    # ------------------------------------------------------------------------
+    def command_name(self, cmd):
+        cmd = cmd.lstrip(b'\xFE')
+        return cmd[2] if (len(cmd) > 2) else None
+
+    # ------------------------------------------------------------------------
+    def _reply(self, data):
+        return CIV_PREAMBLE + bytes([CIV_CONTROLLER, CIV_IC7000]) + bytes(data) + bytes([CIV_EOM])
+
+    # ------------------------------------------------------------------------
+    def handle(self, cmd):
+        s = self.state
+        frame = cmd.lstrip(b'\xFE')
+        if (len(frame) < 4) or (frame[0] != CIV_IC7000):
+            return b''   # Not for this rig
+        (op, data) = (frame[2], frame[3:-1])
+        (freq_key, mode_key) = self._vfo_keys()
+        if (op == 0x03) and (len(data) == 0):           # Read frequency
+            return self._reply(bytes([0x03]) + int_to_bcd(s[freq_key], 5, little_endian=True))
+        if (op in (0x00, 0x05)) and (len(data) == 5) and is_bcd(data):
+            s[freq_key] = bcd_to_int(data, little_endian=True)
+            return b'' if (op == 0x00) else self._reply([CIV_OK])
+        if (op == 0x04) and (len(data) == 0):           # Read mode
+            return self._reply([0x04, IC7000_MODE_CODES.get(s[mode_key], 0x01), 0x01])
+        if (op in (0x01, 0x06)) and (len(data) >= 1):   # Set mode
+            mode = code_to_mode(IC7000_MODE_CODES, data[0], None)
+            if (mode is None):
+                return self._reply([CIV_NG])
+            s[mode_key] = mode
+            return b'' if (op == 0x01) else self._reply([CIV_OK])
+        if (op == 0x07) and (len(data) == 1):           # VFO select
+            if (data[0] in (0x00, 0x01)):
+                s['vfo'] = 'A' if (data[0] == 0x00) else 'B'
+            elif (data[0] == 0xB0):                     # Exchange A and B
+                (s['vfoa_hz'], s['vfob_hz']) = (s['vfob_hz'], s['vfoa_hz'])
+                (s['modea'], s['modeb']) = (s['modeb'], s['modea'])
+            elif (data[0] == 0xA0):                     # A = B
+                (s['vfob_hz'], s['modeb']) = (s['vfoa_hz'], s['modea'])
+            else:
+                return self._reply([CIV_NG])
+            return self._reply([CIV_OK])
+        if (op == 0x0F):                                # Split
+            if (len(data) == 0):
+                return self._reply([0x0F, 0x01 if s['split'] else 0x00])
+            s['split'] = (data[0] == 0x01)
+            return self._reply([CIV_OK])
+        if (op == 0x1C) and (len(data) >= 1) and (data[0] == 0x00):  # PTT
+            if (len(data) == 1):
+                return self._reply([0x1C, 0x00, 0x01 if s['ptt'] else 0x00])
+            s['ptt'] = (data[1] == 0x01)
+            return self._reply([CIV_OK])
+        if (op == 0x19) and (data == b'\x00'):         # Read ID
+            return self._reply([0x19, 0x00, CIV_IC7000])
+        if (op in (0x14, 0x16, 0x1A, 0x1B)) and (len(data) > 1):  # Levels and tones
+            return self._reply([CIV_OK])
+        return self._reply([CIV_NG])
+
+
+# Simulators by rig name.
+SIMULATORS = {
+    RigName.FT817: Ft817Simulator,
+    RigName.FT991: Ft991Simulator,
+    RigName.IC7000: Ic7000Simulator,
+}
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('RigSimulator test program.')
+    if (len(sys.argv) < 2):
+        print('Usage: RigSimulator.py <FT817|FT991|IC7000> [baud] [link]')
+        sys.exit(1)
+    baud = int(sys.argv[2]) if (len(sys.argv) > 2) else 38400
+    link = sys.argv[3] if (len(sys.argv) > 3) else ''
+    sim = create_simulator(sys.argv[1], link=link, baud=baud)
+    if sim is None:
+        print('Rig not simulated: ' + sys.argv[1])
+        sys.exit(1)
+    sim.start()
+    print('{} simulator at {} baud on {}'.format(sim.rig, baud, link or sim.name))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    sim.stop()
@@ -0,0 +1,194 @@
+###############################################################################
+# RigState.py
+# Author: Tom Kerr AB3GY
+#
+# Shadow copy of the transceiver state for the pyRigPreset application.
+# Holds the last known frequency, mode, split and PTT state as set through
+# the preset engine, so that it can be read without a CAT round trip.
+# Listeners are called on every change.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import threading
+import time
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src import AppLog
+from src import Tracer
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# State fields and their initial values.
+STATE_FIELDS = {
+    'rig': '',            # Rig name
+    'vfoa_hz': 0,         # VFO-A frequency in Hz
+    'vfob_hz': 0,         # VFO-B frequency in Hz
+    'modea': '',          # VFO-A operating mode
+    'modeb': '',          # VFO-B operating mode
+    'split': False,       # True if split operation is enabled
+    'ptt': False,         # True if transmitting
+    'memory_preset': 0,   # Last memory preset applied
+    'config_preset': 0,   # Last configuration preset applied
+}
+
+
+##############################################################################
+# RigState class.
+##############################################################################
+class RigState(object):
+    """
+    Thread safe shadow copy of the transceiver state.
+    Every change increments a sequence number, so readers can tell whether
+    the state has changed since they last looked.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deliver_lock = threading.RLock()  # Held while listeners run
+        self._state = dict(STATE_FIELDS)
+        self._seq = 0
+        self._time = 0.0
+        self._listeners = []
+
+    # ------------------------------------------------------------------------
+    def get(self, key):
+        """
+        Return a single state value.
+        """
+        with self._lock:
+            return self._state[key]
+
+    # ------------------------------------------------------------------------
+    def snapshot(self):
+        """
+        Return a copy of the state, including the sequence number 'seq' and
+        the time of the last change 'time'.
+        """
+        with self._lock:
+            snap = dict(self._state)
+            snap['seq'] = self._seq
+            snap['time'] = self._time
+        return snap
+
+    # ------------------------------------------------------------------------
+    def seq(self):
+        """
+        Return the state sequence number.
+        """
+        return self._seq
+
+    # ------------------------------------------------------------------------
+    def update(self, **kwargs):
+        """
+        Update one or more state values and notify listeners if anything
+        changed.  Updates from different threads are delivered to the
+        listeners one at a time, in sequence number order.
+
+        Parameters
+        ----------
+        kwargs : dict
+            State field names and their new values.
+
+        Returns
+        -------
+        changed : bool
+            True if the state changed, False otherwise.
+        """
+        with self._deliver_lock:
+            with self._lock:
+                changed = False
+                for (key, value) in kwargs.items():
+                    if key not in self._state:
+                        raise KeyError('Unknown rig state field: ' + str(key))
+                    if (self._state[key] != value):
+                        self._state[key] = value
+                        changed = True
+                if not changed:
+                    return False
+                self._seq += 1
+                self._time = time.time()
+                snap = dict(self._state)
+                snap['seq'] = self._seq
+                snap['time'] = self._time
+                listeners = list(self._listeners)
+            # Listeners run outside the state lock, so they may read the
+            # state, but inside the delivery lock, so a later update cannot
+            # overtake this one.
+            with Tracer.span('RigState listeners', 'ui', seq=snap['seq']):
+                for listener in listeners:
+                    try:
+                        listener(snap)
+                    except Exception as err:
+                        AppLog.log.error('RigState listener error: %s', err)
+        return True
+
+    # ------------------------------------------------------------------------
+    def add_listener(self, listener):
+        """
+        Add a function called with a state snapshot on every change.
+        Listeners are called on the thread that made the change.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    # ------------------------------------------------------------------------
+    def remove_listener(self, listener):
+        """
+        Remove a listener added by add_listener().
+        """
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('RigState test program.')
+    state = RigState()
+    state.add_listener(print)
+    state.update(vfoa_hz=14074000, modea='USB')
+    state.update(vfoa_hz=14074000)
+    state.update(ptt=True)
+    print(state.snapshot())
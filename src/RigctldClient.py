@@ -0,0 +1,594 @@
+###############################################################################
+# RigctldClient.py
+# Author: Tom Kerr AB3GY
+#
+# Hamlib rigctld client for the pyRigPreset application.
+# Used in place of a PyRigCat object when the rig is NET, for rigs that are
+# already owned by a rigctld daemon, possibly on another machine.  The CAT
+# port setting holds the rigctld address as host:port.
+#
+# Provides the subset of the PyRigCat interface used by pyRigPreset, and
+# translates the PyRigCat ASCII commands to rigctld commands.  Commands that
+# start with a backslash are sent to rigctld unchanged.
+#
+# Connections are kept open between CAT sessions in a small pool, so the TCP
+# connection cost is paid once.  Multiple commands, such as the five needed
+# to set up split operation, are sent in a single write and their replies
+# read back together, so a preset costs one network round trip.
+#
+# Kept free of other application imports.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import socket
+import socketserver
+import threading
+import time
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+from src import AppLog
+from src import Metrics
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Rig name used to select rigctld.
+RIG_NET = 'NET'
+
+# Default rigctld port.
+DEFAULT_PORT = 4532
+
+# Maximum number of open connections per rigctld address.
+POOL_SIZE = 2
+
+# Minimum seconds to wait for a reply.
+NET_TIMEOUT = 2.0
+
+# Hamlib mode names and the matching transceiver mode names.
+HAMLIB_MODES = {
+    'USB':    'USB',
+    'LSB':    'LSB',
+    'CW':     'CW',
+    'CWR':    'CW-R',
+    'AM':     'AM',
+    'FM':     'FM',
+    'RTTY':   'RTTY-LSB',
+    'RTTYR':  'RTTY-USB',
+    'PKTUSB': 'DATA-USB',
+    'PKTLSB': 'DATA-LSB',
+    'PKTFM':  'DATA-FM',
+}
+RIG_MODES = {v: k for (k, v) in HAMLIB_MODES.items()}
+
+_pools = {}                   # (host, port) -> ConnectionPool
+_pools_lock = threading.Lock()
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def to_hamlib_mode(mode):
+    """
+    Return the Hamlib name of a transceiver operating mode.
+    """
+    return RIG_MODES.get(mode, mode)
+
+# ------------------------------------------------------------------------
+def to_rig_mode(mode):
+    """
+    Return the transceiver name of a Hamlib operating mode.
+    """
+    return HAMLIB_MODES.get(mode.upper(), mode.upper())
+
+# ------------------------------------------------------------------------
+def parse_address(addr):
+    """
+    Split a host:port string into a (host, port) tuple.
+    """
+    addr = str(addr).strip()
+    (host, sep, port) = addr.rpartition(':')
+    if (len(sep) == 0) or not port.isdigit():
+        return (addr or 'localhost', DEFAULT_PORT)
+    return (host or 'localhost', int(port))
+
+# ------------------------------------------------------------------------
+def get_pool(address):
+    """
+    Return the connection pool for a (host, port) address.
+    """
+    with _pools_lock:
+        pool = _pools.get(address)
+        if pool is None:
+            pool = _pools[address] = ConnectionPool(address)
+        return pool
+
+# ------------------------------------------------------------------------
+def close_pools():
+    """
+    Close all pooled connections.
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+##############################################################################
+# RigctldConnection class.
+##############################################################################
+class RigctldConnection(object):
+    """
+    One TCP connection to rigctld.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, address, timeout=NET_TIMEOUT):
+        self.address = address
+        self.sock = socket.create_connection(address, timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file_in = self.sock.makefile('rb')
+
+    # ------------------------------------------------------------------------
+    def close(self):
+        try:
+            self.file_in.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------------
+    def transact(self, cmds, timeout=NET_TIMEOUT):
+        """
+        Send commands in one write and read all their replies.
+
+        Parameters
+        ----------
+        cmds : list
+            rigctld commands in long form, such as '\\set_freq 14074000'.
+        timeout : float
+            Seconds to wait for each reply line.
+
+        Returns
+        -------
+        replies : list
+            A (code, values) tuple for each command.  code is the Hamlib
+            return code, 0 if successful.  values is a list of the returned
+            values.
+        """
+        self.sock.settimeout(timeout)
+        # The '+' prefix selects the extended response format, which ends
+        # every reply with an RPRT line, so replies can be read back in order.
+        data = ''.join('+{}\n'.format(c) for c in cmds)
+        data = data.encode('utf-8')
+        self.sock.sendall(data)
+        Metrics.bytes_out.inc('rigctld', amount=len(data))
+        replies = []
+        for cmd in cmds:
+            values = []
+            echo = True
+            while True:
+                line = self.file_in.readline()
+                if (len(line) == 0):
+                    raise ConnectionError('rigctld closed the connection')
+                Metrics.bytes_in.inc('rigctld', amount=len(line))
+                line = line.decode('utf-8', 'replace').strip()
+                if line.startswith('RPRT'):
+                    replies.append((int(line.split()[1]), values))
+                    break
+                if echo:
+                    # The first line echoes the command name and arguments.
+                    echo = False
+                    continue
+                (key, sep, value) = line.partition(': ')
+                if (len(sep) > 0):
+                    values.append(value)
+        return replies
+
+
+##############################################################################
+# ConnectionPool class.
+##############################################################################
+class ConnectionPool(object):
+    """
+    Pool of persistent connections to one rigctld address.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, address, size=POOL_SIZE):
+        self.address = address
+        self.size = size
+        self._cond = threading.Condition()
+        self._idle = []       # Open connections not in use
+        self._count = 0       # Open connections, idle or in use
+
+    # ------------------------------------------------------------------------
+    def acquire(self, timeout=NET_TIMEOUT):
+        """
+        Take a connection from the pool, opening a new one if the pool is
+        not full.  Raises OSError if no connection can be made.
+        """
+        with self._cond:
+            deadline = time.monotonic() + timeout
+            while (len(self._idle) == 0) and (self._count >= self.size):
+                remaining = deadline - time.monotonic()
+                if (remaining <= 0) or not self._cond.wait(remaining):
+                    raise TimeoutError('No free rigctld connection')
+            if (len(self._idle) > 0):
+                return self._idle.pop()
+            self._count += 1
+        try:
+            return RigctldConnection(self.address, timeout)
+        except OSError:
+            self._discard()
+            raise
+
+    # ------------------------------------------------------------------------
+    def release(self, conn, broken=False):
+        """
+        Return a connection to the pool.  Broken connections are closed.
+        """
+        if broken:
+            conn.close()
+            self._discard()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    # ------------------------------------------------------------------------
+    def close(self):
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+            self._count -= len(self._idle)
+            self._idle = []
+
+    # ------------------------------------------------------------------------
+    def _discard(self):
+        with self._cond:
+            self._count -= 1
+            self._cond.notify()
+
+
+##############################################################################
+# RigctldClient class.
+##############################################################################
+class RigctldClient(object):
+    """
+    PyRigCat compatible CAT object that controls the rig through rigctld.
+    """
+    NAME = RIG_NET
+    ERROR = 'ERROR'
+
+    # ------------------------------------------------------------------------
+    def __init__(self):
+        self.address = None
+        self.timeout = NET_TIMEOUT
+        self.pool = None
+        self.conn = None
+
+    # ------------------------------------------------------------------------
+    def config_port(self, port, read_timeout=NET_TIMEOUT, **kwargs):
+        """
+        Set the rigctld address.  Serial port parameters are ignored.
+
+        Parameters
+        ----------
+        port : str
+            The rigctld address, as host:port.
+        read_timeout : float
+            Seconds to wait for a reply.
+
+        Returns
+        -------
+        status : bool
+            True if rigctld could be reached, False otherwise.
+        """
+        self.close()
+        self.address = parse_address(port)
+        self.timeout = max(float(read_timeout), NET_TIMEOUT)
+        self.pool = get_pool(self.address)
+        try:
+            self.conn = self.pool.acquire(self.timeout)
+        except OSError as err:
+            AppLog.log.error('rigctld %s:%s: %s', *self.address, err)
+            return False
+        return True
+
+    # ------------------------------------------------------------------------
+    def init_rig(self):
+        return (self.conn is not None)
+
+    # ------------------------------------------------------------------------
+    def close(self):
+        """
+        Return the connection to the pool.  The connection stays open.
+        """
+        if self.conn is not None:
+            self.pool.release(self.conn)
+            self.conn = None
+
+    # ------------------------------------------------------------------------
+    def transact(self, cmds):
+        """
+        Send rigctld commands and return their replies.  A connection that
+        has gone stale is replaced and the commands are sent again.
+        """
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = self.pool.acquire(self.timeout)
+            try:
+                return self.conn.transact(cmds, self.timeout)
+            except (OSError, ValueError) as err:
+                self.pool.release(self.conn, broken=True)
+                self.conn = None
+                Metrics.reconnects.inc('rigctld')
+                if (attempt > 0):
+                    raise ConnectionError(str(err))
+
+    # ------------------------------------------------------------------------
+    def run(self, cmds):
+        """
+        Send rigctld commands.  Returns 'OK' if all of them succeeded,
+        or an error string.
+        """
+        if (len(cmds) == 0):
+            return 'OK'
+        try:
+            replies = self.transact(cmds)
+        except OSError as err:
+            return '{}: {}'.format(self.ERROR, str(err))
+        for (cmd, (code, values)) in zip(cmds, replies):
+            if (code != 0):
+                return '{}: {} RPRT {}'.format(self.ERROR, cmd, code)
+        return 'OK'
+
+    # ------------------------------------------------------------------------
+    def translate(self, cmd, args):
+        """
+        Translate a PyRigCat ASCII command to a list of rigctld commands.
+        Returns None if the command is not supported.
+        """
+        cmd = cmd.upper()
+        args = [a for a in args if (len(a) > 0)]
+        arg = args[0].upper() if (len(args) > 0) else ''
+        if (cmd in ('FREQA', 'FREQ')) and (len(args) == 1):
+            return ['\\set_freq ' + args[0]]
+        if (cmd == 'FREQB') and (len(args) == 1):
+            return ['\\set_split_freq ' + args[0]]
+        if (cmd in ('MODE', 'MODEA')) and (len(args) == 1):
+            return ['\\set_mode {} 0'.format(to_hamlib_mode(arg))]
+        if (cmd == 'MODEB') and (len(args) == 1):
+            return ['\\set_split_mode {} 0'.format(to_hamlib_mode(arg))]
+        if (cmd == 'PTT') and (arg in ('ON', 'OFF')):
+            return ['\\set_ptt {}'.format(int(arg == 'ON'))]
+        if (cmd == 'SPLIT') and (arg in ('ON', 'OFF')):
+            return ['\\set_split_vfo {} VFOB'.format(int(arg == 'ON'))]
+        if (cmd == 'TONE') and (arg == 'OFF'):
+            return ['\\set_func TONE 0', '\\set_func TSQL 0']
+        if (cmd == 'TONE') and (arg in ('ENC', 'DEC')) and (len(args) == 2):
+            # Tones are in tenths of a Hz.
+            if (arg == 'ENC'):
+                return ['\\set_ctcss_tone ' + args[1], '\\set_func TONE 1']
+            return ['\\set_ctcss_sql ' + args[1], '\\set_func TSQL 1']
+        return None
+
+    # ------------------------------------------------------------------------
+    def ascii_cmd(self, cmd, args):
+        """
+        Send a PyRigCat ASCII command and return the response.
+        """
+        if cmd.startswith('\\'):
+            line = ' '.join([cmd] + [a for a in args if (len(a) > 0)])
+            try:
+                (code, values) = self.transact([line])[0]
+            except OSError as err:
+                return '{}: {}'.format(self.ERROR, str(err))
+            if (code != 0):
+                return '{}: RPRT {}'.format(self.ERROR, code)
+            return ' '.join(values) if (len(values) > 0) else 'OK'
+        if (cmd.upper() == 'SLEEP') and (len(args) > 0):
+            time.sleep(float(args[0]))
+            return 'OK'
+        cmds = self.translate(cmd, args)
+        if cmds is None:
+            return '{}: {} not supported by rigctld'.format(self.ERROR, cmd)
+        return self.run(cmds)
+
+    # ------------------------------------------------------------------------
+    def setup_split(self, vfoa_hz, modea, split, vfob_hz, modeb):
+        """
+        Set the VFO-A frequency and mode, split, and the VFO-B frequency and
+        mode, in one network round trip.
+        """
+        cmds = [
+            '\\set_freq {}'.format(int(vfoa_hz)),
+            '\\set_mode {} 0'.format(to_hamlib_mode(modea)),
+            '\\set_split_vfo {} VFOB'.format(int(bool(split)))]
+        if split:
+            cmds += [
+                '\\set_split_freq {}'.format(int(vfob_hz)),
+                '\\set_split_mode {} 0'.format(to_hamlib_mode(modeb))]
+        return self.run(cmds)
+
+
+##############################################################################
+# FakeRigctld class.
+##############################################################################
+class FakeRigctld(object):
+    """
+    Minimal rigctld stand-in for testing the client.  Answers set and get
+    commands for the frequency and mode in the extended response format,
+    records each chunk of data received, and can drop a connection instead
+    of answering, like a rigctld that has been restarted.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self):
+        self.state = {'freq': '14074000', 'mode': 'USB', 'passband': '2400'}
+        self.reads = []          # Data received, one entry per read
+        self.connections = 0     # Connections accepted
+        self.drop_next = False   # True to close the connection on the next command
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                fake.connections += 1
+                fake.serve(self.connection)
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.address = self.server.server_address
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ------------------------------------------------------------------------
+    def serve(self, sock):
+        buf = b''
+        while True:
+            data = sock.recv(4096)
+            if (len(data) == 0):
+                return
+            self.reads.append(data)
+            buf += data
+            reply = ''
+            while (b'\n' in buf):
+                (line, buf) = buf.split(b'\n', 1)
+                if self.drop_next:
+                    self.drop_next = False
+                    sock.close()
+                    return
+                reply += self.reply(line.decode('utf-8').strip())
+            sock.sendall(reply.encode('utf-8'))
+
+    # ------------------------------------------------------------------------
+    def reply(self, line):
+        """
+        Return the extended format reply to one command line.
+        """
+        words = line.lstrip('+').lstrip('\\').split()
+        (name, args) = (words[0], words[1:])
+        echo = '{}: {}'.format(name, ' '.join(args)).rstrip() + '\n'
+        if (name == 'get_freq'):
+            return echo + 'Frequency: {}\nRPRT 0\n'.format(self.state['freq'])
+        if (name == 'get_mode'):
+            return echo + 'Mode: {}\nPassband: {}\nRPRT 0\n'.format(
+                self.state['mode'], self.state['passband'])
+        if (name == 'set_freq') and (len(args) == 1) and args[0].isdigit():
+            self.state['freq'] = args[0]
+            return echo + 'RPRT 0\n'
+        if (name == 'set_mode') and (len(args) == 2):
+            (self.state['mode'], self.state['passband']) = args
+            return echo + 'RPRT 0\n'
+        if (name == 'set_freq') or (name == 'set_mode'):
+            return echo + 'RPRT -1\n'
+        if name.startswith('set_') and (len(args) > 0):
+            # Other settings, such as split, are only recorded.
+            self.state[name[4:]] = ' '.join(args)
+            return echo + 'RPRT 0\n'
+        return echo + 'RPRT -4\n'
+
+
+# ------------------------------------------------------------------------
+def self_test():
+    """
+    Run the client against a fake rigctld.  Returns True if all checks pass.
+    """
+    fake = FakeRigctld()
+    rig = RigctldClient()
+    results = []
+
+    def check(name, ok):
+        results.append(ok)
+        print('{} {}'.format('PASS' if ok else 'FAIL', name))
+
+    check('connect', rig.config_port('{}:{}'.format(*fake.address)))
+
+    # Extended responses: the echo line is skipped and each value is kept.
+    check('get_freq', rig.ascii_cmd('\\get_freq', ['']) == '14074000')
+    check('get_mode values', rig.transact(['\\get_mode']) == [(0, ['USB', '2400'])])
+    check('error code', rig.transact(['\\set_freq abc']) == [(-1, [])])
+    check('error reply', rig.ascii_cmd('\\get_level', ['AF']) == 'ERROR: RPRT -4')
+
+    # Pipelined replies: a split setup goes out in one write, and the
+    # replies are matched to their commands in order.
+    fake.reads = []
+    check('setup_split', rig.setup_split(7074000, 'LSB', True, 7076000, 'LSB') == 'OK')
+    check('one write', len(fake.reads) == 1)
+    check('set in order', (fake.state['freq'] == '7074000') and
+        (fake.state['split_vfo'] == '1 VFOB') and (fake.state['split_freq'] == '7076000'))
+    replies = rig.transact(['\\get_freq', '\\set_freq 14074000', '\\get_freq', '\\get_mode'])
+    check('pipelined replies', replies == [
+        (0, ['7074000']), (0, []), (0, ['14074000']), (0, ['LSB', '0'])])
+
+    # Stale connection: the server drops the connection, as a restarted
+    # rigctld would, and the client reconnects and sends again.
+    rig.close()
+    fake.drop_next = True
+    check('reconnect', rig.config_port('{}:{}'.format(*fake.address)) and
+        (rig.ascii_cmd('FREQA', ['7030000']) == 'OK'))
+    check('reconnected once', (fake.connections == 2) and (fake.state['freq'] == '7030000'))
+
+    rig.close()
+    close_pools()
+    fake.stop()
+    return all(results)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import sys
+    print('RigctldClient test program.')
+    if (len(sys.argv) > 1) and (sys.argv[1] == '--self-test'):
+        sys.exit(0 if self_test() else 1)
+    rig = RigctldClient()
+    if rig.config_port(sys.argv[1] if (len(sys.argv) > 1) else 'localhost:4532'):
+        print(rig.ascii_cmd('\\get_freq', ['']))
+        print(rig.setup_split(14074000, 'USB', False, 0, 'USB'))
+        rig.close()
+    close_pools()
@@ -0,0 +1,553 @@
+###############################################################################
+# RigctldServer.py
+# Author: Tom Kerr AB3GY
+#
+# Hamlib rigctld compatible TCP server for the pyRigPreset application.
+# Lets WSJT-X, fldigi, loggers and other programs that support the Hamlib
+# "NET rigctl" rig share the transceiver with pyRigPreset, so only one
+# program holds the serial port.
+#
+# Queries are answered from the rig shadow state without any CAT traffic.
+# The frequency and mode are read from the rig when the server starts.
+# Commands that change the transceiver go through the preset engine, so they
+# are serialized with the GUI and update the shadow state.  Pending commands
+# from different clients are run in turn, so one busy client cannot hold up
+# the others.  While clients are connected the rig port is kept open between
+# commands, until the GUI or the last client needs it closed.
+#
+# Supported commands, in short form or Hamlib long form:
+#   f, F     get_freq, set_freq
+#   m, M     get_mode, set_mode
+#   t, T     get_ptt, set_ptt
+#   v, V     get_vfo, set_vfo           (VFOA only)
+#   s, S     get_split_vfo, set_split_vfo
+#   i, I     get_split_freq, set_split_freq
+#   x, X     get_split_mode, set_split_mode
+#   q        quit
+#   \dump_state, \chk_vfo, \get_powerstat
+#
+# A '+' prefix selects the extended response format.
+#
+# This module does not use tkinter.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+import socketserver
+import threading
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+from src import AppLog
+from src import PresetEngine
+from src.pyRigPresetUtils import to_int
+from src.RigCat import hold_rig_cat, release_rig_cat
+from src.RigctldClient import to_hamlib_mode, to_rig_mode
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Default address.  The Hamlib rigctld default port.
+RIGCTLD_HOST = '127.0.0.1'
+RIGCTLD_PORT = 4532
+
+# Seconds a client waits for a command to complete.
+COMMAND_TIMEOUT = 10.0
+
+# Hamlib return codes.
+RIG_OK = 0
+RIG_EINVAL = -1
+RIG_ENIMPL = -4
+RIG_ETIMEOUT = -5
+RIG_EIO = -6
+
+# Passband width in Hz reported for each Hamlib mode.
+PASSBAND_HZ = {
+    'CW': 500, 'CWR': 500, 'AM': 6000, 'FM': 15000, 'PKTFM': 15000,
+}
+DEFAULT_PASSBAND_HZ = 2400
+
+# Reply to \dump_state, protocol version 0.  Describes a generic HF/VHF/UHF
+# transceiver with no level, function or parameter support.
+DUMP_STATE = '\n'.join([
+    '0',
+    '2',
+    '2',
+    '100000.000000 470000000.000000 0x1ff -1 -1 0x3 0x0',
+    '0 0 0 0 0 0 0',
+    '100000.000000 470000000.000000 0x1ff 5000 100000 0x3 0x0',
+    '0 0 0 0 0 0 0',
+    '0x1ff 1',
+    '0 0',
+    '0xc 2400',
+    '0x2 500',
+    '0x1 6000',
+    '0x20 15000',
+    '0 0',
+    '0',
+    '0',
+    '0',
+    '0',
+    '0',
+    '0',
+    '0x0',
+    '0x0',
+    '0x0',
+    '0x0',
+    '0x0',
+    '0x0',
+]) + '\n'
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def passband_hz(hamlib_mode):
+    return PASSBAND_HZ.get(hamlib_mode, DEFAULT_PASSBAND_HZ)
+
+# ------------------------------------------------------------------------
+def _check_vfo(vfo):
+    if vfo.upper() not in ('VFOA', 'VFO', 'MAIN', 'CURRVFO'):
+        raise ValueError('Unsupported VFO: ' + vfo)
+
+# ------------------------------------------------------------------------
+def _get_freq(state):
+    return [state['vfoa_hz']]
+
+# ------------------------------------------------------------------------
+def _get_mode(state):
+    mode = to_hamlib_mode(state['modea'])
+    return [mode, passband_hz(mode)]
+
+# ------------------------------------------------------------------------
+def _get_ptt(state):
+    return [int(state['ptt'])]
+
+# ------------------------------------------------------------------------
+def _get_vfo(state):
+    return ['VFOA']
+
+# ------------------------------------------------------------------------
+def _get_split_vfo(state):
+    return [int(state['split']), 'VFOB']
+
+# ------------------------------------------------------------------------
+def _get_split_freq(state):
+    return [state['vfob_hz']]
+
+# ------------------------------------------------------------------------
+def _get_split_mode(state):
+    mode = to_hamlib_mode(state['modeb'])
+    return [mode, passband_hz(mode)]
+
+# ------------------------------------------------------------------------
+def _run_held(fn, *args):
+    """
+    Run a command with the rig CAT object held open, so each command does
+    not open and close the rig port.  With PROCESS = ON the port belongs to
+    the CAT process instead.
+    """
+    if globals.cat_process is None:
+        hold_rig_cat()
+    ok = False
+    try:
+        ok = fn(*args)
+    finally:
+        if not ok:
+            # Reopen the port for the next command.
+            release_rig_cat()
+    return ok
+
+# ------------------------------------------------------------------------
+def _set_freq(freq):
+    return PresetEngine.set_frequency(int(round(float(freq))))
+
+# ------------------------------------------------------------------------
+def _set_mode(mode, passband):
+    return PresetEngine.set_mode(to_rig_mode(mode))
+
+# ------------------------------------------------------------------------
+def _set_ptt(ptt):
+    return PresetEngine.set_ptt(to_int(ptt) != 0)
+
+# ------------------------------------------------------------------------
+def _set_vfo(vfo):
+    _check_vfo(vfo)
+    return True
+
+# ------------------------------------------------------------------------
+def _set_split_vfo(split, tx_vfo):
+    return PresetEngine.set_split(to_int(split) != 0)
+
+# ------------------------------------------------------------------------
+def _set_split_freq(freq):
+    state = globals.rig_state.snapshot()
+    return PresetEngine.set_split(state['split'], vfob_hz=int(round(float(freq))))
+
+# ------------------------------------------------------------------------
+def _set_split_mode(mode, passband):
+    state = globals.rig_state.snapshot()
+    return PresetEngine.set_split(state['split'], modeb=to_rig_mode(mode))
+
+# Queries: long name -> (short name, function, value labels)
+GET_COMMANDS = {
+    'get_freq':       ('f', _get_freq, ('Frequency',)),
+    'get_mode':       ('m', _get_mode, ('Mode', 'Passband')),
+    'get_ptt':        ('t', _get_ptt, ('PTT',)),
+    'get_vfo':        ('v', _get_vfo, ('VFO',)),
+    'get_split_vfo':  ('s', _get_split_vfo, ('Split', 'TX VFO')),
+    'get_split_freq': ('i', _get_split_freq, ('TX Frequency',)),
+    'get_split_mode': ('x', _get_split_mode, ('TX Mode', 'TX Passband')),
+    'chk_vfo':        ('',  lambda state: [0], ('ChkVFO',)),
+    'get_powerstat':  ('',  lambda state: [1], ('Power Status',)),
+}
+
+# Commands that change the transceiver: long name -> (short name, function)
+SET_COMMANDS = {
+    'set_freq':       ('F', _set_freq),
+    'set_mode':       ('M', _set_mode),
+    'set_ptt':        ('T', _set_ptt),
+    'set_vfo':        ('V', _set_vfo),
+    'set_split_vfo':  ('S', _set_split_vfo),
+    'set_split_freq': ('I', _set_split_freq),
+    'set_split_mode': ('X', _set_split_mode),
+}
+
+# Short name -> long name.
+SHORT_NAMES = {v[0]: k for (k, v) in GET_COMMANDS.items() if v[0]}
+SHORT_NAMES.update({v[0]: k for (k, v) in SET_COMMANDS.items()})
+SHORT_NAMES['q'] = 'quit'
+
+
+##############################################################################
+# FairCommandQueue class.
+##############################################################################
+class FairCommandQueue(object):
+    """
+    Runs commands one at a time on a worker thread.  Each client has its own
+    queue, and the worker takes one command from each client in turn.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queues = {}     # Client -> deque of (Future, function, args)
+        self._order = deque() # Clients with pending commands, in turn order
+        self._thread = None
+        self._running = False
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='RigctldCommands', daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=COMMAND_TIMEOUT)
+            self._thread = None
+
+    # ------------------------------------------------------------------------
+    def pending(self):
+        """
+        Return the number of commands waiting to run.
+        """
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+    # ------------------------------------------------------------------------
+    def submit(self, client, fn, *args):
+        """
+        Queue a command for a client.  Returns a Future of its result.
+        """
+        future = Future()
+        with self._cond:
+            queue = self._queues.get(client)
+            if queue is None:
+                queue = self._queues[client] = deque()
+            if (len(queue) == 0):
+                self._order.append(client)
+            queue.append((future, fn, args))
+            self._cond.notify()
+        return future
+
+    # ------------------------------------------------------------------------
+    def remove_client(self, client):
+        """
+        Cancel a client's pending commands.
+        """
+        with self._cond:
+            queue = self._queues.pop(client, None)
+            if queue:
+                self._order.remove(client)
+                for (future, fn, args) in queue:
+                    future.cancel()
+
+    # ------------------------------------------------------------------------
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (len(self._order) == 0):
+                    self._cond.wait()
+                if not self._running:
+                    return
+                client = self._order.popleft()
+                queue = self._queues[client]
+                (future, fn, args) = queue.popleft()
+                if (len(queue) > 0):
+                    self._order.append(client)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except Exception as err:
+                future.set_exception(err)
+
+
+##############################################################################
+# RigctldServer class.
+##############################################################################
+class RigctldServer(object):
+    """
+    Serves Hamlib rigctld clients on a background thread.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, host=RIGCTLD_HOST, port=RIGCTLD_PORT):
+        self.address = (host, port)
+        self.server = None
+        self.thread = None
+        self.commands = FairCommandQueue()
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Start serving clients.
+
+        Returns
+        -------
+        status : bool
+            True if the server started, False otherwise.
+        """
+        if self.server is not None:
+            return True
+        try:
+            self.server = _RigctldTcpServer(self.address, _RigctldHandler)
+        except OSError as err:
+            AppLog.log.error('rigctld server error: %s', err)
+            self.server = None
+            return False
+        self.server.commands = self.commands
+        self.commands.start()
+        self.commands.submit(self, PresetEngine.read_rig_state)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            name='RigctldServer',
+            daemon=True)
+        self.thread.start()
+        return True
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop serving clients.
+        """
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        self.commands.stop()
+        release_rig_cat()
+
+
+##############################################################################
+# Server classes.
+##############################################################################
+class _RigctldHandler(socketserver.StreamRequestHandler):
+    """
+    Handles one rigctld client connection.
+    """
+    # ------------------------------------------------------------------------
+    def handle(self):
+        self.server.client_connected()
+        try:
+            for line in self.rfile:
+                reply = self.handle_line(line.decode('utf-8', 'replace'))
+                if reply is None:
+                    break
+                if reply:
+                    self.wfile.write(reply.encode('utf-8'))
+                    self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.server.commands.remove_client(self)
+            self.server.client_disconnected()
+
+    # ------------------------------------------------------------------------
+    def handle_line(self, line):
+        """
+        Run the commands in one line.  Returns the reply text, or None if
+        the client quit.
+        """
+        tokens = line.split()
+        reply = ''
+        while (len(tokens) > 0):
+            token = tokens.pop(0)
+            sep = None
+            if (token[0] in '+;|,') and (len(token) > 1):
+                sep = '\n' if (token[0] == '+') else token[0]
+                token = token[1:]
+            if token.startswith('\\'):
+                names = [token[1:]]
+            else:
+                names = [SHORT_NAMES.get(c, c) for c in token]
+            for name in names:
+                if (name == 'quit'):
+                    return None
+                reply += self.run_command(name, tokens, sep)
+        return reply
+
+    # ------------------------------------------------------------------------
+    def run_command(self, name, tokens, sep):
+        """
+        Run one command, taking its arguments from tokens.
+        Returns the reply text.
+        """
+        if (name == 'dump_state'):
+            return DUMP_STATE
+        if name in GET_COMMANDS:
+            (short, fn, labels) = GET_COMMANDS[name]
+            values = fn(globals.rig_state.snapshot())
+            if sep is None:
+                return ''.join('{}\n'.format(v) for v in values)
+            lines = ['{}:'.format(name)]
+            lines += ['{}: {}'.format(k, v) for (k, v) in zip(labels, values)]
+            lines.append('RPRT 0')
+            return sep.join(lines) + '\n'
+        if name in SET_COMMANDS:
+            (short, fn) = SET_COMMANDS[name]
+            nargs = fn.__code__.co_argcount
+            args = tokens[:nargs]
+            del tokens[:nargs]
+            status = self.run_set_command(fn, args)
+            if sep is None:
+                return 'RPRT {}\n'.format(status)
+            return '{}: {}{}RPRT {}\n'.format(name, ' '.join(args), sep, status)
+        return 'RPRT {}\n'.format(RIG_ENIMPL)
+
+    # ------------------------------------------------------------------------
+    def run_set_command(self, fn, args):
+        """
+        Queue a command that changes the transceiver and wait for it.
+        Returns a Hamlib return code.
+        """
+        if (len(args) < fn.__code__.co_argcount):
+            return RIG_EINVAL
+        future = self.server.commands.submit(self, _run_held, fn, *args)
+        try:
+            ok = future.result(timeout=COMMAND_TIMEOUT)
+        except TimeoutError:
+            return RIG_ETIMEOUT
+        except ValueError as err:
+            AppLog.log.error('rigctld: %s', err)
+            return RIG_EINVAL
+        except Exception as err:
+            AppLog.log.error('rigctld: %s', err)
+            return RIG_EIO
+        return RIG_OK if ok else RIG_EIO
+
+
+class _RigctldTcpServer(socketserver.ThreadingTCPServer):
+    """
+    Counts the connected clients, and closes the rig port once the last
+    one has gone.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    # ------------------------------------------------------------------------
+    def __init__(self, address, handler):
+        socketserver.ThreadingTCPServer.__init__(self, address, handler)
+        self.commands = None
+        self.clients = 0
+        self._clients_lock = threading.Lock()
+
+    # ------------------------------------------------------------------------
+    def client_connected(self):
+        with self._clients_lock:
+            self.clients += 1
+
+    # ------------------------------------------------------------------------
+    def client_disconnected(self):
+        with self._clients_lock:
+            self.clients -= 1
+            if (self.clients == 0):
+                # Close the port after any commands still running.
+                self.commands.submit(self, release_rig_cat)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    import time
+    print('RigctldServer test program.')
+    globals.init()
+    server = RigctldServer()
+    if server.start():
+        print('Serving on {}:{}'.format(*server.address))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        server.stop()
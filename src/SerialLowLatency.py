@@ -0,0 +1,240 @@
+###############################################################################
+# SerialLowLatency.py
+# Author: Tom Kerr AB3GY
+#
+# Linux low latency serial port mode for the pyRigPreset application.
+# USB-serial adapters buffer received data before passing it to the host
+# (16 ms by default for FTDI adapters), which adds delay to every CAT round
+# trip.  This module sets the ASYNC_LOW_LATENCY flag through TIOCSSERIAL and
+# the FTDI sysfs latency_timer, and restores the previous values later.
+#
+# The port is held open from enable() to restore(), so that opening and
+# closing it does not toggle the modem control lines while the rig CAT
+# object has it open.
+#
+# Does nothing on other operating systems.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import array
+import os
+import sys
+
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = None
+    termios = None
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Root of the sysfs tree.  May be changed to point at a test tree.
+SYSFS_ROOT = '/sys'
+
+# Latency timer value in milliseconds used in low latency mode.
+LATENCY_TIMER_MS = 1
+
+# serial_struct flag from linux/serial.h.
+ASYNC_LOW_LATENCY = 0x2000
+
+# ioctl numbers from asm-generic/ioctls.h, for Python versions that do not
+# define them in termios.
+TIOCGSERIAL = getattr(termios, 'TIOCGSERIAL', 0x541E)
+TIOCSSERIAL = getattr(termios, 'TIOCSSERIAL', 0x541F)
+
+# Index of the flags field in struct serial_struct, read as an int array.
+SERIAL_STRUCT_FLAGS = 4
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def supported():
+    """
+    Return True if low latency mode is supported on this operating system.
+    """
+    return sys.platform.startswith('linux') and (fcntl is not None)
+
+# ------------------------------------------------------------------------
+def latency_timer_path(port):
+    """
+    Return the sysfs latency_timer file path for a serial port.
+    """
+    tty = os.path.basename(os.path.realpath(port))
+    return os.path.join(SYSFS_ROOT, 'bus', 'usb-serial', 'devices', tty, 'latency_timer')
+
+# ------------------------------------------------------------------------
+def get_async_flags(fd):
+    """
+    Return the serial_struct flags for an open serial port file descriptor.
+    """
+    buf = array.array('i', [0] * 32)
+    fcntl.ioctl(fd, TIOCGSERIAL, buf)
+    return buf[SERIAL_STRUCT_FLAGS]
+
+# ------------------------------------------------------------------------
+def set_async_flags(fd, flags):
+    """
+    Set the serial_struct flags for an open serial port file descriptor.
+    """
+    buf = array.array('i', [0] * 32)
+    fcntl.ioctl(fd, TIOCGSERIAL, buf)
+    buf[SERIAL_STRUCT_FLAGS] = flags
+    fcntl.ioctl(fd, TIOCSSERIAL, buf)
+
+# ------------------------------------------------------------------------
+def read_latency_timer(port):
+    """
+    Return the latency timer value for a serial port in milliseconds, or
+    None if the port has no latency timer.
+    """
+    try:
+        with open(latency_timer_path(port), 'r') as file_in:
+            return int(file_in.read().strip())
+    except Exception:
+        return None
+
+# ------------------------------------------------------------------------
+def write_latency_timer(port, value):
+    """
+    Set the latency timer value for a serial port in milliseconds.
+    Returns True if successful, False otherwise.
+    """
+    try:
+        with open(latency_timer_path(port), 'w') as file_out:
+            file_out.write(str(int(value)))
+        return True
+    except Exception:
+        return False
+
+# ------------------------------------------------------------------------
+def enable(port):
+    """
+    Put a serial port into low latency mode.
+
+    Parameters
+    ----------
+    port : str
+        The serial port device name.
+
+    Returns
+    -------
+    saved : dict
+        The previous settings, to be passed to restore(), or None if nothing
+        was changed.
+    """
+    if not supported():
+        return None
+    saved = {'port': port, 'fd': None, 'flags': None, 'latency_timer': None}
+
+    # ASYNC_LOW_LATENCY flag.
+    try:
+        saved['fd'] = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        flags = get_async_flags(saved['fd'])
+        if not (flags & ASYNC_LOW_LATENCY):
+            set_async_flags(saved['fd'], flags | ASYNC_LOW_LATENCY)
+            saved['flags'] = flags
+    except Exception:
+        # Not all drivers support TIOCSSERIAL.
+        pass
+    if (saved['flags'] is None) and (saved['fd'] is not None):
+        os.close(saved['fd'])
+        saved['fd'] = None
+
+    # FTDI latency timer, if present and writable.
+    timer = read_latency_timer(port)
+    if (timer is not None) and (timer > LATENCY_TIMER_MS):
+        if write_latency_timer(port, LATENCY_TIMER_MS):
+            saved['latency_timer'] = timer
+
+    if (saved['flags'] is None) and (saved['latency_timer'] is None):
+        return None
+    return saved
+
+# ------------------------------------------------------------------------
+def restore(saved):
+    """
+    Restore the serial port settings saved by enable().
+
+    Parameters
+    ----------
+    saved : dict
+        The settings returned by enable().  Does nothing if None.
+
+    Returns
+    -------
+    None.
+    """
+    if saved is None:
+        return
+    port = saved['port']
+    if saved['fd'] is not None:
+        try:
+            set_async_flags(saved['fd'], saved['flags'])
+        except Exception as err:
+            print('Low latency restore error: ' + str(err))
+        try:
+            os.close(saved['fd'])
+        except Exception:
+            pass
+        saved['fd'] = None
+    if saved['latency_timer'] is not None:
+        write_latency_timer(port, saved['latency_timer'])
+        saved['latency_timer'] = None
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('SerialLowLatency test program.')
+    if (len(sys.argv) < 2):
+        print('Usage: SerialLowLatency.py <port>')
+        sys.exit(1)
+    port = sys.argv[1]
+    print('Latency timer: {}'.format(read_latency_timer(port)))
+    saved = enable(port)
+    print('Saved: {}'.format(saved))
+    print('Latency timer: {}'.format(read_latency_timer(port)))
+    restore(saved)
+    print('Latency timer: {}'.format(read_latency_timer(port)))
@@ -0,0 +1,447 @@
+###############################################################################
+# SerialPortInventory.py
+# Author: Tom Kerr AB3GY
+#
+# SerialPortInventory class for use with the pyRigPreset application.
+# Maintains a cached list of serial ports on this machine, refreshed in the
+# background when ports are added or removed.  Allows a CAT preset to follow
+# its USB-serial adapter by serial number when the device node changes.
+#
+# On Linux, inotify is used to watch /dev and /dev/serial/by-id for changes.
+# On other systems the port list is polled.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from serial.tools import list_ports as lp
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# inotify event masks, from <sys/inotify.h>.
+IN_ATTRIB      = 0x00000004
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED     = 0x00008000
+IN_WATCH_MASK  = (IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+# inotify event header: wd, mask, cookie, len.
+INOTIFY_EVENT = struct.Struct('iIII')
+
+# Directories watched for port changes.
+DEV_DIR = '/dev'
+BY_ID_DIR = '/dev/serial/by-id'
+
+# Device name prefixes in /dev that may be serial ports.
+SERIAL_PREFIXES = ('tty', 'cu.', 'rfcomm', 'serial')
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def _inotify_libc():
+    """
+    Return the C library object if inotify is available, None otherwise.
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        return libc
+    except Exception:
+        return None
+
+
+##############################################################################
+# SerialPortInventory class.
+##############################################################################
+class SerialPortInventory(object):
+    """
+    SerialPortInventory class for use with the pyRigPreset application.
+    Maintains a cached list of serial ports on this machine, refreshed in the
+    background when ports are added or removed.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, poll_interval=2.0, settle_time=0.25):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        poll_interval : float
+            Seconds between port list refreshes when inotify is not available.
+        settle_time : float
+            Seconds to wait after a device change before refreshing, to let
+            udev finish creating device nodes and links.
+
+        Returns
+        -------
+        None.
+        """
+        self.poll_interval = float(poll_interval)
+        self.settle_time = float(settle_time)
+
+        self._lock = threading.Lock()
+        self._ports = []        # List of port info dictionaries
+        self._refreshed = False # True after the first refresh
+        self._thread = None     # Background refresh thread
+        self._stop = threading.Event()
+
+        self._libc = None       # C library object for inotify
+        self._fd = -1           # inotify file descriptor
+        self._by_id_wd = -1     # inotify watch descriptor for BY_ID_DIR
+        self._wake_r = -1       # Wakeup pipe read end
+        self._wake_w = -1       # Wakeup pipe write end
+        self._wake_lock = threading.Lock()
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Start the background refresh thread.
+        The first port enumeration is done by the thread.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        (self._wake_r, self._wake_w) = os.pipe()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='SerialPortInventory',
+            daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop the background refresh thread.  The thread is woken from its
+        wait and closes its own file descriptors as it exits.
+        """
+        self._stop.set()
+        with self._wake_lock:
+            if (self._wake_w >= 0):
+                try:
+                    os.write(self._wake_w, b'\0')
+                except OSError:
+                    pass
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            if not self._thread.is_alive():
+                self._thread = None
+
+    # ------------------------------------------------------------------------
+    def refresh(self):
+        """
+        Enumerate the serial ports on this machine and update the cache.
+
+        Returns
+        -------
+        ports : list
+            The list of port info dictionaries.
+        """
+        ports = []
+        by_id = self._get_by_id_links()
+        try:
+            for p in lp.comports():
+                ports.append({
+                    'device': p.device,
+                    'description': str(p.description),
+                    'serial_number': str(p.serial_number or ''),
+                    'vid': p.vid,
+                    'pid': p.pid,
+                    'by_id': by_id.get(os.path.realpath(p.device), ''),
+                })
+        except Exception as err:
+            print('SerialPortInventory: port enumeration error: ' + str(err))
+            with self._lock:
+                return list(self._ports)
+        ports.sort(key=lambda p: p['device'])
+        with self._lock:
+            self._ports = ports
+            self._refreshed = True
+        return list(ports)
+
+    # ------------------------------------------------------------------------
+    def get_ports(self):
+        """
+        Return the cached list of port info dictionaries.
+        The ports are enumerated now if the cache has never been filled.
+        """
+        with self._lock:
+            if self._refreshed:
+                return list(self._ports)
+        return self.refresh()
+
+    # ------------------------------------------------------------------------
+    def get_devices(self):
+        """
+        Return the cached list of serial port device names.
+        """
+        return [p['device'] for p in self.get_ports()]
+
+    # ------------------------------------------------------------------------
+    def get_serial_number(self, port):
+        """
+        Return the USB serial number of the specified port.
+
+        Parameters
+        ----------
+        port : str
+            The port device name.
+
+        Returns
+        -------
+        serial_number : str
+            The USB serial number, or an empty string if not known.
+        """
+        info = self._find(port)
+        if info is not None:
+            return info['serial_number']
+        return ''
+
+    # ------------------------------------------------------------------------
+    def resolve(self, port, serial_number=''):
+        """
+        Return the current device name for a saved port.
+        If a serial number is saved and the port no longer belongs to it,
+        the port with that serial number is returned instead.
+
+        Parameters
+        ----------
+        port : str
+            The saved port device name.
+        serial_number : str
+            The saved USB serial number, or an empty string if not known.
+
+        Returns
+        -------
+        port : str
+            The current port device name.  The saved port is returned if it
+            cannot be resolved.
+        """
+        serial_number = str(serial_number).strip()
+        info = self._find(port)
+        if (len(serial_number) == 0):
+            return port
+        if (info is not None) and (info['serial_number'] == serial_number):
+            return port
+        for p in self.get_ports():
+            if (p['serial_number'] == serial_number):
+                return p['device']
+        return port
+
+    # ------------------------------------------------------------------------
+    def _find(self, port):
+        """
+        Return the port info dictionary for a device name, or None if not found.
+        The device name may be a link such as a /dev/serial/by-id path.
+        """
+        if (len(str(port)) == 0):
+            return None
+        real = os.path.realpath(port)
+        for p in self.get_ports():
+            if (p['device'] == port) or (p['device'] == real) or (p['by_id'] == port):
+                return p
+        return None
+
+    # ------------------------------------------------------------------------
+    def _get_by_id_links(self):
+        """
+        Return a dictionary of device path to /dev/serial/by-id link path.
+        """
+        links = {}
+        try:
+            for name in os.listdir(BY_ID_DIR):
+                link = os.path.join(BY_ID_DIR, name)
+                links[os.path.realpath(link)] = link
+        except OSError:
+            pass
+        return links
+
+    # ------------------------------------------------------------------------
+    def _run(self):
+        """
+        Background thread.  Refreshes the port list on device changes.
+        """
+        try:
+            self.refresh()
+            self._open_inotify()
+            while not self._stop.is_set():
+                changed = self._wait_change(self.poll_interval)
+                if changed and not self._stop.is_set():
+                    # Let udev finish, then refresh.
+                    self._stop.wait(self.settle_time)
+                    self._drain_inotify()
+                    self._watch_by_id()
+                    self.refresh()
+        finally:
+            self._close_inotify()
+            with self._wake_lock:
+                os.close(self._wake_r)
+                os.close(self._wake_w)
+                self._wake_r = -1
+                self._wake_w = -1
+
+    # ------------------------------------------------------------------------
+    def _open_inotify(self):
+        """
+        Start watching the device directories with inotify, if available.
+        """
+        self._libc = _inotify_libc()
+        if self._libc is None:
+            return
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if (fd < 0):
+            return
+        self._fd = fd
+        self._libc.inotify_add_watch(self._fd, DEV_DIR.encode(), IN_WATCH_MASK)
+        self._watch_by_id()
+
+    # ------------------------------------------------------------------------
+    def _watch_by_id(self):
+        """
+        Watch BY_ID_DIR.  It only exists while a USB-serial device is present.
+        """
+        if (self._fd < 0) or (self._by_id_wd >= 0):
+            return
+        if os.path.isdir(BY_ID_DIR):
+            wd = self._libc.inotify_add_watch(self._fd, BY_ID_DIR.encode(), IN_WATCH_MASK)
+            if (wd >= 0):
+                self._by_id_wd = wd
+
+    # ------------------------------------------------------------------------
+    def _wait_change(self, timeout):
+        """
+        Wait for a relevant inotify event, or for the timeout if inotify is
+        not available.  stop() ends the wait early.
+        Returns True if a serial device may have changed, or if the timeout
+        expired without inotify.  Returns False otherwise.
+        """
+        fds = [self._wake_r]
+        if (self._fd >= 0):
+            fds.append(self._fd)
+        try:
+            (rlist, wlist, xlist) = select.select(fds, [], [], timeout)
+        except (OSError, ValueError):
+            return False
+        if self._stop.is_set():
+            return False
+        if (self._fd < 0):
+            return True
+        if self._fd not in rlist:
+            return False
+        return self._drain_inotify()
+
+    # ------------------------------------------------------------------------
+    def _drain_inotify(self):
+        """
+        Read all pending inotify events.
+        Returns True if any of them concern a serial device.
+        """
+        changed = False
+        while (self._fd >= 0):
+            try:
+                data = os.read(self._fd, 4096)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            if (len(data) == 0):
+                break
+            offset = 0
+            while (offset + INOTIFY_EVENT.size <= len(data)):
+                (wd, mask, cookie, length) = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset:offset+length].rstrip(b'\0').decode(errors='replace')
+                offset += length
+                if (wd == self._by_id_wd):
+                    changed = True
+                    if (mask & (IN_DELETE_SELF | IN_IGNORED)):
+                        self._by_id_wd = -1
+                elif name.startswith(SERIAL_PREFIXES):
+                    changed = True
+        return changed
+
+    # ------------------------------------------------------------------------
+    def _close_inotify(self):
+        """
+        Close the inotify file descriptor.  Called by the background thread.
+        """
+        if (self._fd >= 0):
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+        self._fd = -1
+        self._by_id_wd = -1
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('SerialPortInventory test program.  Plug and unplug ports, Ctrl-C to exit.')
+    inv = SerialPortInventory()
+    inv.start()
+    last = None
+    try:
+        while True:
+            ports = inv.get_ports()
+            if (ports != last):
+                for p in ports:
+                    print('{} serial="{}" by_id="{}"'.format(p['device'], p['serial_number'], p['by_id']))
+                print('--')
+                last = ports
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        inv.stop()
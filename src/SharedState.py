@@ -0,0 +1,285 @@
+###############################################################################
+# SharedState.py
+# Author: Tom Kerr AB3GY
+#
+# Shared memory rig state for the pyRigPreset application.
+# Publishes the rig shadow state in a multiprocessing.shared_memory segment,
+# so that programs on the same computer can read it at any rate without a
+# socket, a lock or a system call per read.
+#
+# Segment layout, little endian:
+#
+#   offset  0  '<4sHH'  magic b'PRSM', layout version, body size
+#   offset  8  '<Q'     seqlock counter, odd while the body is being written
+#   offset 16  BODY     state seq, vfoa_hz, vfob_hz, split, ptt,
+#                       memory_preset, config_preset, rig, modea, modeb
+#                       (NUL padded UTF-8), time of last change
+#
+# The writer makes the counter odd, writes the body, then makes the counter
+# even.  A reader copies the body and accepts it only if the counter was the
+# same even value before and after the copy.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+from multiprocessing import resource_tracker, shared_memory
+import os
+import struct
+import sys
+import threading
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Segment layout.
+HEADER = struct.Struct('<4sHH')
+SEQLOCK = struct.Struct('<Q')
+BODY = struct.Struct('<IQQBBII16s16s16sd')
+MAGIC = b'PRSM'
+VERSION = 1
+SEQLOCK_OFFSET = HEADER.size
+BODY_OFFSET = SEQLOCK_OFFSET + SEQLOCK.size
+SEGMENT_SIZE = BODY_OFFSET + BODY.size
+
+# Number of attempts a reader makes to get a consistent copy.
+READ_RETRIES = 1000
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def default_name():
+    """
+    Return the default segment name, which is unique per user.
+    """
+    if hasattr(os, 'getuid'):
+        return 'pyRigPreset-state-{}'.format(os.getuid())
+    return 'pyRigPreset-state'
+
+# ------------------------------------------------------------------------
+def _fixed(text):
+    return str(text).encode('utf-8')[:16]
+
+# ------------------------------------------------------------------------
+def _text(data):
+    return data.rstrip(b'\0').decode('utf-8', 'replace')
+
+# ------------------------------------------------------------------------
+def _attach(name):
+    """
+    Attach to an existing segment without taking ownership of it.
+    Before Python 3.13 the resource tracker removes every segment a process
+    has opened when the process exits, so readers unregister it.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if (os.name == 'posix'):
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+##############################################################################
+# SharedStateWriter class.
+##############################################################################
+class SharedStateWriter(object):
+    """
+    Creates the shared memory segment and keeps it up to date with the rig
+    shadow state.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, name=''):
+        self.name = name or default_name()
+        self.shm = None
+        self._lock = threading.Lock()   # One writer at a time
+        self._counter = 0
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Create the segment and start publishing.  Returns True if successful.
+        """
+        if self.shm is not None:
+            return True
+        try:
+            try:
+                self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=SEGMENT_SIZE)
+            except FileExistsError:
+                # Left over from an instance that did not shut down.
+                old = shared_memory.SharedMemory(name=self.name)
+                old.close()
+                old.unlink()
+                self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=SEGMENT_SIZE)
+        except OSError as err:
+            print('Shared state error: ' + str(err))
+            self.shm = None
+            return False
+        HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, BODY.size)
+        self.write(globals.rig_state.snapshot())
+        globals.rig_state.add_listener(self.write)
+        return True
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop publishing and remove the segment.
+        """
+        if self.shm is None:
+            return
+        globals.rig_state.remove_listener(self.write)
+        with self._lock:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    # ------------------------------------------------------------------------
+    def write(self, snap):
+        """
+        Write a rig state snapshot to the segment.
+        """
+        body = BODY.pack(
+            snap['seq'] & 0xFFFFFFFF,
+            int(snap['vfoa_hz']),
+            int(snap['vfob_hz']),
+            int(bool(snap['split'])),
+            int(bool(snap['ptt'])),
+            int(snap['memory_preset']),
+            int(snap['config_preset']),
+            _fixed(snap['rig']),
+            _fixed(snap['modea']),
+            _fixed(snap['modeb']),
+            float(snap['time']))
+        with self._lock:
+            if self.shm is None:
+                return
+            buf = self.shm.buf
+            self._counter += 1
+            SEQLOCK.pack_into(buf, SEQLOCK_OFFSET, self._counter)
+            buf[BODY_OFFSET:SEGMENT_SIZE] = body
+            self._counter += 1
+            SEQLOCK.pack_into(buf, SEQLOCK_OFFSET, self._counter)
+
+
+##############################################################################
+# SharedStateReader class.
+##############################################################################
+class SharedStateReader(object):
+    """
+    Reads the rig state from the shared memory segment.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, name=''):
+        """
+        Attach to the segment.  Raises FileNotFoundError if pyRigPreset is
+        not publishing, or ValueError if the layout is not recognized.
+        """
+        self.shm = _attach(name or default_name())
+        (magic, version, size) = HEADER.unpack_from(self.shm.buf, 0)
+        if (magic != MAGIC) or (version != VERSION) or (size != BODY.size):
+            self.shm.close()
+            raise ValueError('Unknown shared state layout')
+
+    # ------------------------------------------------------------------------
+    def close(self):
+        self.shm.close()
+
+    # ------------------------------------------------------------------------
+    def counter(self):
+        """
+        Return the seqlock counter.  It changes on every state update, so a
+        poller can skip read() when it has not changed.
+        """
+        return SEQLOCK.unpack_from(self.shm.buf, SEQLOCK_OFFSET)[0]
+
+    # ------------------------------------------------------------------------
+    def read(self):
+        """
+        Return a consistent copy of the rig state, or None if the writer
+        kept changing it.
+        """
+        buf = self.shm.buf
+        for attempt in range(READ_RETRIES):
+            before = SEQLOCK.unpack_from(buf, SEQLOCK_OFFSET)[0]
+            if (before & 1):
+                continue
+            body = BODY.unpack_from(buf, BODY_OFFSET)
+            if (SEQLOCK.unpack_from(buf, SEQLOCK_OFFSET)[0] == before):
+                break
+        else:
+            return None
+        return {
+            'seq': body[0],
+            'vfoa_hz': body[1],
+            'vfob_hz': body[2],
+            'split': bool(body[3]),
+            'ptt': bool(body[4]),
+            'memory_preset': body[5],
+            'config_preset': body[6],
+            'rig': _text(body[7]),
+            'modea': _text(body[8]),
+            'modeb': _text(body[9]),
+            'time': body[10],
+        }
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    # Print the state published by a running pyRigPreset instance.
+    import time
+    print('SharedState test program.')
+    reader = SharedStateReader()
+    last = None
+    try:
+        while True:
+            if (reader.counter() != last):
+                last = reader.counter()
+                print(reader.read())
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    reader.close()
@@ -0,0 +1,272 @@
+###############################################################################
+# StartupProfiler.py
+# Author: Tom Kerr AB3GY
+#
+# Opt-in startup profiler for the pyRigPreset application.
+# Records wall time and memory allocations for each startup phase and writes
+# a JSON report.
+#
+# Enable by setting the PYRIGPRESET_PROFILE environment variable or by
+# passing --profile on the command line:
+#   PYRIGPRESET_PROFILE=1              Write the report to the default file
+#   PYRIGPRESET_PROFILE=report.json    Write the report to report.json
+#   --profile                          Write the report to the default file
+#   --profile=report.json              Write the report to report.json
+#
+# The profiler is not enabled in the CAT process child.
+#
+# This module must not import any other application modules except
+# DiagReport, since it is started before anything else is imported.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import platform
+import sys
+import time
+import tracemalloc
+
+# Local packages.
+from src import DiagReport
+
+
+##############################################################################
+# Globals.
+##############################################################################
+PROFILE_ENV_VAR = 'PYRIGPRESET_PROFILE'
+PROFILE_ARG = '--profile'
+DEFAULT_REPORT_FILE = 'pyRigPreset-startup.json'
+
+_enabled = False     # True if profiling is enabled
+_report_file = ''    # The JSON report file name
+_t0 = 0.0            # Profiler start time
+_phases = []         # List of completed phase records
+_marks = []          # List of point-in-time marks
+_stack = []          # Stack of phase names currently in progress
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def _elapsed_ms(t):
+    """
+    Return the time in milliseconds from profiler start to time t.
+    """
+    return round((t - _t0) * 1000.0, 3)
+
+# ------------------------------------------------------------------------
+def init(argv=None):
+    """
+    Start the profiler if it is enabled by environment variable or command
+    line argument.
+
+    Parameters
+    ----------
+    argv : list
+        Optional command line argument list.  Defaults to sys.argv.
+
+    Returns
+    -------
+    enabled : bool
+        True if profiling is enabled, False otherwise.
+    """
+    global _enabled
+    global _report_file
+    global _t0
+
+    if argv is None:
+        argv = sys.argv
+
+    report_file = DiagReport.option_file(argv, PROFILE_ENV_VAR, PROFILE_ARG, DEFAULT_REPORT_FILE)
+    if (len(report_file) == 0):
+        return False
+
+    _report_file = report_file
+    _enabled = True
+    tracemalloc.start()
+    _t0 = time.perf_counter()
+    return True
+
+# ------------------------------------------------------------------------
+def enabled():
+    """
+    Return True if profiling is enabled, False otherwise.
+    """
+    return _enabled
+
+# ------------------------------------------------------------------------
+def phase(name):
+    """
+    Return a context manager that records a startup phase.
+    Phases may be nested.  Costs nothing when profiling is disabled.
+
+    Parameters
+    ----------
+    name : str
+        The phase name.
+
+    Returns
+    -------
+    A context manager object.
+    """
+    if _enabled:
+        return _Phase(name)
+    return _null_phase
+
+# ------------------------------------------------------------------------
+def mark(name):
+    """
+    Record a point-in-time mark, such as the first idle callback.
+
+    Parameters
+    ----------
+    name : str
+        The mark name.
+
+    Returns
+    -------
+    None.
+    """
+    if _enabled:
+        _marks.append({
+            'name': str(name),
+            't_ms': _elapsed_ms(time.perf_counter()),
+        })
+
+# ------------------------------------------------------------------------
+def finish():
+    """
+    Stop the profiler and write the JSON report.
+    Does nothing if profiling is not enabled.
+
+    Returns
+    -------
+    (status, err_msg) : tuple
+        status : bool
+            True if the report was written, False otherwise.
+        err_msg : str
+            Error message if an error occurred.
+    """
+    global _enabled
+    if not _enabled:
+        return (False, 'Profiling not enabled.')
+    _enabled = False
+
+    total_ms = _elapsed_ms(time.perf_counter())
+    (current, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'argv': list(sys.argv),
+        'total_ms': total_ms,
+        'alloc_current_bytes': current,
+        'alloc_peak_bytes': peak,
+        'phases': _phases,
+        'marks': _marks,
+    }
+    return DiagReport.write_json(_report_file, report, 'Startup profile', indent=2)
+
+
+##############################################################################
+# _Phase class.
+##############################################################################
+class _Phase(object):
+    """
+    Context manager used to record a single startup phase.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, name):
+        self.name = str(name)
+        self.parent = ''
+        self.t_start = 0.0
+        self.mem_start = 0
+
+    # ------------------------------------------------------------------------
+    def __enter__(self):
+        if (len(_stack) > 0):
+            self.parent = _stack[-1]
+        _stack.append(self.name)
+        self.mem_start = tracemalloc.get_traced_memory()[0]
+        self.t_start = time.perf_counter()
+        return self
+
+    # ------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        t_end = time.perf_counter()
+        mem_end = tracemalloc.get_traced_memory()[0]
+        _stack.pop()
+        _phases.append({
+            'name': self.name,
+            'parent': self.parent,
+            'depth': len(_stack),
+            'start_ms': _elapsed_ms(self.t_start),
+            'wall_ms': round((t_end - self.t_start) * 1000.0, 3),
+            'alloc_bytes': mem_end - self.mem_start,
+        })
+        return False
+
+
+##############################################################################
+# _NullPhase class.
+##############################################################################
+class _NullPhase(object):
+    """
+    Context manager that does nothing.  Used when profiling is disabled.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_null_phase = _NullPhase()
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('StartupProfiler test program.')
+    init([sys.argv[0], PROFILE_ARG])
+    with phase('outer'):
+        with phase('inner'):
+            data = [str(i) for i in range(10000)]
+    mark('done')
+    finish()
@@ -0,0 +1,257 @@
+###############################################################################
+# StateBroadcast.py
+# Author: Tom Kerr AB3GY
+#
+# Rig state broadcaster for the pyRigPreset application.
+# Sends a UDP multicast datagram whenever the rig shadow state changes, and
+# a heartbeat with the current state at a fixed interval, so that any number
+# of programs can follow the rig without any CAT traffic of their own.
+#
+# Datagrams are JSON by default:
+#
+#   {"type": "state", "rig": "FT991", "vfoa_hz": 14074000, ..., "seq": 12}
+#
+# The type is "state" for a change and "heartbeat" for a periodic repeat.
+# The binary format is a '<4sBB' header (magic b'PRPS', version 1, type 0 for
+# state or 1 for heartbeat) followed by the CatProcess STATE payload.  Use
+# decode() to read either format.
+#
+# With the default TTL of 0 the datagrams stay on this computer.  Use a TTL
+# of 1 to reach the local network.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import json
+import socket
+import struct
+import threading
+
+# Local environment init.
+import _env_init
+
+# Local packages.
+import globals
+from src import AppLog
+from src.CatProcess import STATE, pack_state, unpack_state
+
+
+##############################################################################
+# Globals.
+##############################################################################
+
+# Defaults.  The group is in the organization-local scope.
+DEFAULT_GROUP = '239.255.42.99'
+DEFAULT_PORT = 45299
+DEFAULT_TTL = 0
+DEFAULT_INTERVAL = 5.0   # Heartbeat interval in seconds
+
+# Binary datagram header.
+HEADER = struct.Struct('<4sBB')
+MAGIC = b'PRPS'
+VERSION = 1
+
+# Datagram types.
+TYPE_STATE = 0
+TYPE_HEARTBEAT = 1
+TYPE_NAMES = ('state', 'heartbeat')
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def encode(snap, msg_type=TYPE_STATE, binary=False):
+    """
+    Encode a rig state snapshot as a datagram.
+    """
+    if binary:
+        return HEADER.pack(MAGIC, VERSION, msg_type) + pack_state(snap)
+    msg = {'type': TYPE_NAMES[msg_type]}
+    msg.update(snap)
+    return json.dumps(msg, separators=(',', ':')).encode('utf-8')
+
+# ------------------------------------------------------------------------
+def decode(data):
+    """
+    Decode a datagram in either format.
+
+    Returns
+    -------
+    (type, state) : tuple
+        type : str
+            'state' or 'heartbeat'.
+        state : dict
+            The rig state, including the sequence number 'seq'.
+        Returns None if the datagram is not valid.
+    """
+    try:
+        if data.startswith(MAGIC):
+            (magic, version, msg_type) = HEADER.unpack_from(data)
+            payload = data[HEADER.size:]
+            state = unpack_state(payload)
+            state['seq'] = STATE.unpack_from(payload)[0]
+            return (TYPE_NAMES[msg_type], state)
+        msg = json.loads(data.decode('utf-8'))
+        return (msg.pop('type'), msg)
+    except (ValueError, KeyError, IndexError, struct.error):
+        return None
+
+# ------------------------------------------------------------------------
+def open_receiver(group=DEFAULT_GROUP, port=DEFAULT_PORT):
+    """
+    Return a UDP socket joined to the broadcast group, for use by
+    consumers.  Read datagrams with sock.recv() and pass them to decode().
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('', port))
+    mreq = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton('0.0.0.0'))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    return sock
+
+
+##############################################################################
+# StateBroadcaster class.
+##############################################################################
+class StateBroadcaster(object):
+    """
+    Multicasts rig state changes and heartbeats.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self,
+        group=DEFAULT_GROUP,
+        port=DEFAULT_PORT,
+        ttl=DEFAULT_TTL,
+        interval=DEFAULT_INTERVAL,
+        binary=False):
+        """
+        Class constructor.
+
+        Parameters
+        ----------
+        group : str
+            The multicast group address.
+        port : int
+            The UDP port.
+        ttl : int
+            The multicast time to live.  0 stays on this computer, 1 reaches
+            the local network.
+        interval : float
+            Seconds between heartbeats.
+        binary : bool
+            True to send binary datagrams, False to send JSON.
+        """
+        self.address = (group, port)
+        self.ttl = ttl
+        self.interval = interval
+        self.binary = binary
+        self.sock = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------------
+    def start(self):
+        """
+        Start broadcasting.  Returns True if successful.
+        """
+        if self.sock is not None:
+            return True
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            # Sent from rig state listeners, which must never wait.
+            self.sock.setblocking(False)
+        except OSError as err:
+            AppLog.log.error('State broadcast error: %s', err)
+            self.sock = None
+            return False
+        globals.rig_state.add_listener(self._on_change)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._heartbeat, name='StateBroadcast', daemon=True)
+        self._thread.start()
+        return True
+
+    # ------------------------------------------------------------------------
+    def stop(self):
+        """
+        Stop broadcasting.
+        """
+        if self.sock is None:
+            return
+        globals.rig_state.remove_listener(self._on_change)
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self.sock.close()
+        self.sock = None
+
+    # ------------------------------------------------------------------------
+    def send(self, snap, msg_type=TYPE_STATE):
+        sock = self.sock
+        if sock is None:
+            return
+        try:
+            sock.sendto(encode(snap, msg_type, self.binary), self.address)
+        except BlockingIOError:
+            pass   # Send buffer full; the next change or heartbeat follows
+        except OSError as err:
+            AppLog.log.error('State broadcast error: %s', err)
+
+    # ------------------------------------------------------------------------
+    def _on_change(self, snap):
+        # Called on the thread that changed the state.
+        self.send(snap, TYPE_STATE)
+
+    # ------------------------------------------------------------------------
+    def _heartbeat(self):
+        while not self._stop.wait(self.interval):
+            self.send(globals.rig_state.snapshot(), TYPE_HEARTBEAT)
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    # Print the state datagrams sent by a running pyRigPreset instance.
+    print('StateBroadcast test program.')
+    sock = open_receiver()
+    try:
+        while True:
+            print(decode(sock.recv(2048)))
+    except KeyboardInterrupt:
+        pass
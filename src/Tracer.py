@@ -0,0 +1,288 @@
+###############################################################################
+# Tracer.py
+# Author: Tom Kerr AB3GY
+#
+# Event tracer for the pyRigPreset application.
+# Records timed spans, such as a button handler, the CAT port open, each CAT
+# command and the config file write, and writes them as a Chrome trace event
+# JSON file.  Open the file in Perfetto (https://ui.perfetto.dev) or
+# chrome://tracing to see where the time goes when a preset is applied.
+#
+# Tracing is enabled by environment variable or command line argument:
+#   PYRIGPRESET_TRACE=1 or PYRIGPRESET_TRACE=<file>
+#   --trace or --trace=<file>
+#
+# When tracing is disabled, span() returns a shared object that does nothing.
+# Tracing is not enabled in the CAT process child.
+#
+# Designed for personal use by the author, but available to anyone under the
+# license terms below.
+###############################################################################
+
+###############################################################################
+# License
+# Copyright (c) 2023 Tom Kerr AB3GY (ab3gy@arrl.net).
+#
+# Redistribution and use in source and binary forms, with or without 
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,   
+# this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,  
+# this list of conditions and the following disclaimer in the documentation 
+# and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without 
+# specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" 
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE 
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE 
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE 
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE 
+# POSSIBILITY OF SUCH DAMAGE.
+###############################################################################
+
+# System level packages.
+import functools
+import os
+import sys
+import threading
+import time
+
+# Local packages.
+from src import DiagReport
+
+
+##############################################################################
+# Globals.
+##############################################################################
+TRACE_ENV_VAR = 'PYRIGPRESET_TRACE'
+TRACE_ARG = '--trace'
+DEFAULT_TRACE_FILE = 'pyRigPreset-trace.json'
+
+# Maximum number of events kept.  Later events are dropped.
+MAX_EVENTS = 200000
+
+_enabled = False     # True if tracing is enabled
+_trace_file = ''     # The JSON trace file name
+_t0 = 0.0            # Tracer start time
+_events = []         # List of trace events
+_threads = {}        # Thread ID -> thread name
+
+
+##############################################################################
+# Functions.
+##############################################################################
+
+# ------------------------------------------------------------------------
+def _now_us():
+    """
+    Return the time in microseconds since the tracer started.
+    """
+    return (time.perf_counter() - _t0) * 1E6
+
+# ------------------------------------------------------------------------
+def init(argv=None):
+    """
+    Start the tracer if it is enabled by environment variable or command
+    line argument.
+
+    Parameters
+    ----------
+    argv : list
+        Optional command line argument list.  Defaults to sys.argv.
+
+    Returns
+    -------
+    enabled : bool
+        True if tracing is enabled, False otherwise.
+    """
+    global _enabled
+    global _trace_file
+    global _t0
+
+    if argv is None:
+        argv = sys.argv
+
+    trace_file = DiagReport.option_file(argv, TRACE_ENV_VAR, TRACE_ARG, DEFAULT_TRACE_FILE)
+    if (len(trace_file) == 0):
+        return False
+
+    _trace_file = trace_file
+    _t0 = time.perf_counter()
+    _enabled = True
+    return True
+
+# ------------------------------------------------------------------------
+def enabled():
+    """
+    Return True if tracing is enabled, False otherwise.
+    """
+    return _enabled
+
+# ------------------------------------------------------------------------
+def span(name, cat='app', **args):
+    """
+    Return a context manager that records a span.
+    Spans may be nested.  Costs one function call when tracing is disabled.
+
+    Parameters
+    ----------
+    name : str
+        The span name.
+    cat : str
+        The span category, such as 'ui', 'cat' or 'config'.
+    args : dict
+        Values shown with the span.  More can be added with set().
+
+    Returns
+    -------
+    A context manager object.
+    """
+    if _enabled:
+        return _Span(name, cat, args)
+    return _null_span
+
+# ------------------------------------------------------------------------
+def traced(name, cat='app'):
+    """
+    Function decorator that records each call as a span.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name, cat, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# ------------------------------------------------------------------------
+def instant(name, cat='app', **args):
+    """
+    Record a point-in-time event.
+    """
+    if _enabled:
+        _add_event({'name': str(name), 'cat': cat, 'ph': 'i', 's': 't', 'ts': _now_us(), 'args': args})
+
+# ------------------------------------------------------------------------
+def _add_event(event):
+    if (len(_events) >= MAX_EVENTS):
+        return
+    thread = threading.current_thread()
+    event['pid'] = os.getpid()
+    event['tid'] = thread.ident
+    if thread.ident not in _threads:
+        _threads[thread.ident] = thread.name
+    _events.append(event)
+
+# ------------------------------------------------------------------------
+def finish():
+    """
+    Stop the tracer and write the trace file.
+    Does nothing if tracing is not enabled.
+
+    Returns
+    -------
+    (status, err_msg) : tuple
+        status : bool
+            True if the trace was written, False otherwise.
+        err_msg : str
+            Error message if an error occurred.
+    """
+    global _enabled
+    if not _enabled:
+        return (False, 'Tracing not enabled.')
+    _enabled = False
+
+    pid = os.getpid()
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+               'args': {'name': 'pyRigPreset'}}]
+    for (tid, name) in _threads.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                       'args': {'name': name}})
+    events.extend(_events)
+    return DiagReport.write_json(_trace_file, {'traceEvents': events, 'displayTimeUnit': 'ms'}, 'Trace')
+
+
+##############################################################################
+# _Span class.
+##############################################################################
+class _Span(object):
+    """
+    Context manager used to record a single span.
+    """
+    # ------------------------------------------------------------------------
+    def __init__(self, name, cat, args):
+        self.name = str(name)
+        self.cat = cat
+        self.args = args
+        self.t_start = 0.0
+
+    # ------------------------------------------------------------------------
+    def set(self, **args):
+        """
+        Add values shown with the span.
+        """
+        self.args.update(args)
+
+    # ------------------------------------------------------------------------
+    def __enter__(self):
+        self.t_start = _now_us()
+        return self
+
+    # ------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args['error'] = str(exc_value)
+        _add_event({
+            'name': self.name,
+            'cat': self.cat,
+            'ph': 'X',
+            'ts': round(self.t_start, 1),
+            'dur': round(_now_us() - self.t_start, 1),
+            'args': self.args,
+        })
+        return False
+
+
+##############################################################################
+# _NullSpan class.
+##############################################################################
+class _NullSpan(object):
+    """
+    Context manager that does nothing.  Used when tracing is disabled.
+    """
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_null_span = _NullSpan()
+
+
+##############################################################################
+# Main program.
+##############################################################################
+if __name__ == "__main__":
+    print('Tracer test program.')
+    init([sys.argv[0], TRACE_ARG])
+    with span('outer', 'ui'):
+        with span('inner', 'cat', cmd='FREQA 14074000') as s:
+            time.sleep(0.01)
+            s.set(resp='OK')
+    instant('done')
+    finish()
@@ -54,8 +54,10 @@ import _env_init
 
 # Local packages.
 import globals
-from src.DlgConfigCat import DlgConfigCat
+from src.DlgConfigCat import get_dlg_config_cat
 from src.CatPresetStore import CatPresetStore
+from src.RigCat import select_cat_preset
+from src import Tracer
 
 
 ##############################################################################
@@ -161,30 +163,15 @@ class WidgetCatPreset(object):
         """
         pnum = self.value.get()
         #print('Left click, value = {}'.format(pnum))
-        
-        # Read the preset values.
-        section = 'CAT_PRESET{:03d}'.format(pnum)
-        if not globals.config.has_section(section):
-            globals.config.add_section(section)
-        rig = str(globals.config.get(section, 'RIG'))
-        port = str(globals.config.get(section, 'PORT'))
-        baud = str(globals.config.get(section, 'BAUD'))
-        data = str(globals.config.get(section, 'DATA'))
-        parity = str(globals.config.get(section, 'PARITY'))
-        stop = str(globals.config.get(section, 'STOP'))
-        
-        # Write them to the current CAT selection.
-        section = 'CAT'
-        if not globals.config.has_section(section):
-            globals.config.add_section(section)
-        globals.config.set(section, 'PRESET', pnum)
-        globals.config.set(section, 'RIG', rig)
-        globals.config.set(section, 'PORT', port)
-        globals.config.set(section, 'BAUD', baud)
-        globals.config.set(section, 'DATA', data)
-        globals.config.set(section, 'PARITY', parity)
-        globals.config.set(section, 'STOP', stop)
-        globals.config.write()
+        with Tracer.span('WidgetCatPreset click', 'ui', preset=pnum):
+            self._select_preset(pnum)
+
+    # ------------------------------------------------------------------------
+    def _select_preset(self, pnum):
+        """
+        Copy a CAT preset to the current CAT selection.
+        """
+        select_cat_preset(pnum)
 
     # ------------------------------------------------------------------------
     def _on_right_click(self, pnum):
@@ -193,8 +180,7 @@ class WidgetCatPreset(object):
         Opens a dilog box to configure the preset.
         """
         #print('Right click, pnum = {}'.format(pnum))
-        dlg = DlgConfigCat(self.parent, pnum)
-        self.frame.wait_window(dlg.dlg_config_cat)
+        get_dlg_config_cat(self.parent).show(pnum)
         self._set_label(pnum)
 
 
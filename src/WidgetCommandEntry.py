@@ -45,12 +45,14 @@ import os
 
 # Tkinter packages.
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk
 
 # Local packages.
 import globals
-from src.RigCat import init_rig_cat, send_rig_cat_cmd, close_rig_cat
+from src import AppLog
+from src.pyRigPresetUtils import get_font
+from src.PresetEngine import send_command
+from src import Tracer
 
 
 ##############################################################################
@@ -106,7 +108,7 @@ class WidgetCommandEntry(object):
         """
         lbl = tk.Label(self.frame, 
             text='Command:',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=0, 
             column=0,
@@ -117,7 +119,7 @@ class WidgetCommandEntry(object):
             width=20,
             textvariable=self.command_text,
             validate='key', 
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         self.tb_cmd.grid(
             row=0, 
             column=1,
@@ -133,11 +135,18 @@ class WidgetCommandEntry(object):
         """
         #print(event)
         cmd = self.command_text.get().strip()
-        if init_rig_cat():
-            resp = send_rig_cat_cmd(cmd)
-        close_rig_cat()
+        with Tracer.span('WidgetCommandEntry enter', 'ui', cmd=cmd):
+            send_command(cmd, callback=lambda resp: self._on_response(cmd, resp))
         self.tb_cmd.delete(0, tk.END)
 
+    # ------------------------------------------------------------------------
+    def _on_response(self, cmd, resp):
+        """
+        Called with the transceiver response once the command completes.
+        """
+        if ('ERROR' in str(resp)):
+            AppLog.log.error('Command "{}" failed: {}'.format(cmd, resp))
+
 
 ##############################################################################
 # Main program.
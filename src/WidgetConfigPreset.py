@@ -46,14 +46,16 @@ import os
 
 # Tkinter packages.
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk
 
 # Local packages.
 import globals
-from src.DlgConfigPreset import DlgConfigPreset
+from src import AppLog
+from src.pyRigPresetUtils import get_font
+from src.DlgConfigPreset import get_dlg_config_preset
 from src.ConfigPresetStore import ConfigPresetStore
-from src.RigCat import init_rig_cat, send_rig_cat_cmd, close_rig_cat
+from src.PresetEngine import apply_config_preset
+from src import Tracer
 
 
 ##############################################################################
@@ -119,7 +121,7 @@ class WidgetConfigPreset(object):
             width=10,
             textvariable=self.name_text,
             command=self._on_left_click,
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         btn.bind('<Button-3>', self._on_right_click)
         btn.grid(
             row=0,
@@ -147,12 +149,16 @@ class WidgetConfigPreset(object):
         Send commands to the transceiver.
         """
         #print('Configuration preset {} left button clicked.'.format(self.id))
-        if init_rig_cat():
-            for idx in range(globals.NUM_CONFIG_COMMANDS):
-                cmd = self.config.get_config_cmd(idx).strip()
-                if (len(cmd) > 0):
-                    resp = send_rig_cat_cmd(cmd)
-        close_rig_cat()
+        with Tracer.span('WidgetConfigPreset click', 'ui', id=self.id):
+            apply_config_preset(self.config, callback=self._on_applied)
+
+    # ------------------------------------------------------------------------
+    def _on_applied(self, status):
+        """
+        Called with the status once the preset commands have been sent.
+        """
+        if not status:
+            AppLog.log.error('Configuration preset {} failed'.format(self.id))
 
     # ------------------------------------------------------------------------
     def _on_right_click(self, event):
@@ -162,8 +168,7 @@ class WidgetConfigPreset(object):
         #print('Configuration preset {} right button clicked.'.format(self.id))
         
         # Open the configuration dialog window and wait for it to complete.
-        dlg = DlgConfigPreset(self.parent, self.config)
-        self.frame.wait_window(dlg.dlg_config_preset)
+        get_dlg_config_preset(self.parent).show(self.config)
         
         # Update the button text.
         self._set_name()
@@ -45,12 +45,14 @@ import os
 
 # Tkinter packages.
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk
 
 # Local packages.
 import globals
-from src.RigCat import init_rig_cat, send_rig_cat_cmd, close_rig_cat
+from src import AppLog
+from src.pyRigPresetUtils import get_font
+from src.PresetEngine import set_frequency
+from src import Tracer
 
 
 ##############################################################################
@@ -106,7 +108,7 @@ class WidgetFrequencyEntry(object):
         validateFloatCommand = self.frame.register(self._validate_float)
         lbl = tk.Label(self.frame, 
             text='VFO-A frequency (MHz):',
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         lbl.grid(
             row=0, 
             column=0,
@@ -118,7 +120,7 @@ class WidgetFrequencyEntry(object):
             textvariable=self.freq_mhz_text,
             validate='key', 
             validatecommand=(validateFloatCommand, '%d', '%i', '%S', '%P'),
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         tb.grid(
             row=0, 
             column=1,
@@ -136,10 +138,16 @@ class WidgetFrequencyEntry(object):
         freq_str = self.freq_mhz_text.get().strip()
         if (len(freq_str) > 0):
             freq_hz = int(float(freq_str) * 1E6)
-            if init_rig_cat():
-                cmd = 'FREQA {}'.format(freq_hz)
-                resp = send_rig_cat_cmd(cmd)
-            close_rig_cat()
+            with Tracer.span('WidgetFrequencyEntry enter', 'ui', freq_hz=freq_hz):
+                set_frequency(freq_hz, callback=lambda status: self._on_set(freq_hz, status))
+
+    # ------------------------------------------------------------------------
+    def _on_set(self, freq_hz, status):
+        """
+        Called with the status once the frequency has been set.
+        """
+        if not status:
+            AppLog.log.error('Setting frequency {} Hz failed'.format(freq_hz))
 
     # ------------------------------------------------------------------------
     def _validate_float(self, why, where, what, all):
@@ -46,14 +46,16 @@ import os
 
 # Tkinter packages.
 import tkinter as tk
-import tkinter.font as tkFont
 from tkinter import ttk
 
 # Local packages.
 import globals
-from src.DlgMemoryPreset import DlgMemoryPreset
+from src import AppLog
+from src.pyRigPresetUtils import get_font
+from src.DlgMemoryPreset import get_dlg_memory_preset
 from src.MemoryPresetStore import MemoryPresetStore
-from src.RigCat import init_rig_cat, send_rig_cat_cmd, setup_split, close_rig_cat
+from src.PresetEngine import apply_memory_preset
+from src import Tracer
 
 
 ##############################################################################
@@ -119,6 +121,14 @@ class WidgetMemoryPreset(object):
         """
         Update the widget UI fields.
         """
+        with Tracer.span('WidgetMemoryPreset.update_widget', 'ui', id=self.id):
+            self._update_fields()
+
+    # ------------------------------------------------------------------------
+    def _update_fields(self):
+        """
+        Internal method to set the UI field values.
+        """
         desc = self.config.get_preset_desc()
         self.desc_text.set(desc)
         split = self.config.get_split()
@@ -140,7 +150,7 @@ class WidgetMemoryPreset(object):
         
         lbl = tk.Label(self.frame, 
             textvariable=self.desc_text,
-            font=tkFont.Font(size=10),
+            font=get_font(size=10),
             width=DESCRIPTION_WIDTH,
             anchor='w',
             padx=3,
@@ -158,7 +168,7 @@ class WidgetMemoryPreset(object):
         
         lbl = tk.Label(self.frame, 
             textvariable=self.freq_text,
-            font=tkFont.Font(size=10),
+            font=get_font(size=10),
             width=FREQUENCY_WIDTH,
             anchor='e',
             padx=3,
@@ -178,7 +188,7 @@ class WidgetMemoryPreset(object):
             width=BUTTON_WIDTH,
             text='M{}'.format(self.id),
             command=self._on_left_click,
-            font=tkFont.Font(size=10))
+            font=get_font(size=10))
         btn.bind('<Button-3>', self._on_right_click)
         btn.grid(
             row=0,
@@ -190,54 +200,22 @@ class WidgetMemoryPreset(object):
         # Update the widget fields.
         self.update_widget()
     
-    # ------------------------------------------------------------------------
-    def _send_cat_cmd(self, cmd):
-        """
-        Send a CAT command to the transceiver.
-        """
-        if (len(cmd) > 0):
-            print(cmd)
-            resp = send_rig_cat_cmd(cmd)
-            if 'ERROR' in resp: 
-                print('Command: "{}" Response: "{}"'.format(cmd, resp))
-
     # ------------------------------------------------------------------------
     def _on_left_click(self):
         """
         Preset widget left click handler.
         """
         #print('Memory preset {} left button clicked.'.format(self.id))
-        if init_rig_cat():
-        
-            # Use a single command to configure VFO, mode and split.
-            vfoa_hz = int(self.config.get_vfoa_freq_mhz() * 1E6)
-            vfob_hz = int(self.config.get_vfob_freq_mhz() * 1E6)
-            resp = setup_split(
-                vfoa_hz, 
-                self.config.get_modea(), 
-                self.config.get_split(), 
-                vfob_hz, 
-                self.config.get_modeb())
-            if (resp != 'OK'):
-                print('Error setting VFO and split parameters')
-
-            # Set CTCSS config and tone.
-            ctcss = self.config.get_ctcss_config()
-            cmd = 'TONE ' + ctcss
-            if (ctcss != 'OFF'):
-                tone = str(self.config.get_ctcss_tone())
-                cmd += (' ' + tone)
-            self._send_cat_cmd(cmd)
-
-            # Send commands 1 - 6.
-            self._send_cat_cmd(self.config.get_command1())
-            self._send_cat_cmd(self.config.get_command2())
-            self._send_cat_cmd(self.config.get_command3())
-            self._send_cat_cmd(self.config.get_command4())
-            self._send_cat_cmd(self.config.get_command5())
-            self._send_cat_cmd(self.config.get_command6())
+        with Tracer.span('WidgetMemoryPreset click', 'ui', id=self.id):
+            apply_memory_preset(self.config, callback=self._on_applied)
 
-        close_rig_cat()
+    # ------------------------------------------------------------------------
+    def _on_applied(self, status):
+        """
+        Called with the status once the preset has been applied.
+        """
+        if not status:
+            AppLog.log.error('Memory preset {} failed'.format(self.id))
 
     # ------------------------------------------------------------------------
     def _on_right_click(self, event):
@@ -247,8 +225,7 @@ class WidgetMemoryPreset(object):
         #print('Memory preset {} right button clicked.'.format(self.id))
         
         # Open the configuration dialog window and wait for it to complete.
-        dlg = DlgMemoryPreset(self.parent, self.config)
-        self.frame.wait_window(dlg.dlg_config_preset)
+        get_dlg_memory_preset(self.parent).show(self.config)
         
         # Update the widget fields.
         self.update_widget()
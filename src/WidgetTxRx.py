@@ -50,7 +50,10 @@ from tkinter import ttk
 
 # Local packages.
 import globals
-from src.RigCat import init_rig_cat, send_rig_cat_cmd, close_rig_cat
+from src import AppLog
+from src.pyRigPresetUtils import get_font
+from src.PresetEngine import set_ptt
+from src import Tracer
 
 
 ##############################################################################
@@ -105,7 +108,7 @@ class WidgetTxRx(object):
             text='TX',
             fg='red',
             command=self._ptt_on,
-            font=tkFont.Font(size=10, weight=tkFont.BOLD))
+            font=get_font(size=10, weight=tkFont.BOLD))
         tx_btn.grid(
             row=0, 
             column=0,
@@ -117,7 +120,7 @@ class WidgetTxRx(object):
             text='RX',
             fg='green',
             command=self._ptt_off,
-            font=tkFont.Font(size=10, weight=tkFont.BOLD))
+            font=get_font(size=10, weight=tkFont.BOLD))
         rx_btn.grid(
             row=0, 
             column=1,
@@ -130,26 +133,25 @@ class WidgetTxRx(object):
         """
         Event handler used to turn PTT on.
         """
-        self._send_cmd('PTT ON')
+        with Tracer.span('WidgetTxRx TX', 'ui'):
+            set_ptt(True, callback=self._on_ptt)
         
     # ------------------------------------------------------------------------
     def _ptt_off(self):
         """
         Event handler used to turn PTT off.
         """
-        self._send_cmd('PTT OFF')
-    
+        with Tracer.span('WidgetTxRx RX', 'ui'):
+            set_ptt(False, callback=self._on_ptt)
+
     # ------------------------------------------------------------------------
-    def _send_cmd(self, cmd):
+    def _on_ptt(self, status):
         """
-        Send a command to the transceiver.
+        Called with the status once the PTT command completes.
         """
-        if init_rig_cat(read_timeout=0.1):
-            print(cmd)
-            resp = send_rig_cat_cmd(cmd)
-            if 'ERROR' in resp:
-                print('Command: "{}" Response: "{}"'.format(cmd, resp))
-        close_rig_cat()
+        if not status:
+            AppLog.log.error('PTT command failed')
+
 
 ##############################################################################
 # Main program.
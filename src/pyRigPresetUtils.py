@@ -42,8 +42,8 @@
 # System level packages.
 import os
 
-# Tkinter packages.
-import tkinter.messagebox as messagebox
+# Tkinter packages are imported by the functions that use them, so that the
+# headless engine and command line interface do not load tkinter.
 
 # Local packages.
 import globals
@@ -53,6 +53,8 @@ import globals
 # Globals.
 ##############################################################################
 
+# Shared font objects, keyed by (size, weight).
+_fonts = {}
 
 ##############################################################################
 # Functions.
@@ -72,6 +74,7 @@ def app_close():
     -------
     None.  The root window, and hence the application, is closed.
     """
+    import tkinter.messagebox as messagebox
     global APP_NAME
     global root
     if messagebox.askokcancel(title='Exit ' + globals.APP_NAME, 
@@ -110,7 +113,7 @@ def set_geometry(window, new_width=0, new_height=0, x_offset=0, y_offset=0):
     -------
     None.
     """
-    window.update() # Update window to get required width and height
+    window.update_idletasks() # Compute the required width and height
     
     sw = window.winfo_screenwidth()
     sh = window.winfo_screenheight()
@@ -125,6 +128,34 @@ def set_geometry(window, new_width=0, new_height=0, x_offset=0, y_offset=0):
         y_offset = int(sh/2 - new_height/2) # Center Y
     window.geometry(f'{new_width}x{new_height}+{x_offset}+{y_offset}')
 
+# ------------------------------------------------------------------------
+def get_font(size=10, weight='normal'):
+    """
+    Return a shared font object.
+    Fonts are created once per size and weight and reused by every widget,
+    rather than creating a new font object for each widget.
+    
+    Parameters
+    ----------
+    size : int
+        The font size.
+
+    weight : str
+        The font weight, tkFont.NORMAL (default) or tkFont.BOLD.
+        
+    Returns
+    -------
+    font : tkFont.Font
+        The shared font object.
+    """
+    key = (size, weight)
+    font = _fonts.get(key)
+    if font is None:
+        import tkinter.font as tkFont
+        font = tkFont.Font(size=size, weight=weight)
+        _fonts[key] = font
+    return font
+
 # ------------------------------------------------------------------------
 def to_int(val):
     n = 0